@@ -0,0 +1,60 @@
+"""
+Measures building the "also liked" co-occurrence matrix and picking the
+top neighbours of every object from synthetic upvotes.
+
+Usage::
+
+    python benchmarks/also_liked.py [--votes=N] [--users=N] [--objects=N]
+                                    [--top=K] [--seed=N]
+
+Object popularity follows a Zipf-like distribution, so a few objects
+collect most of the upvotes, as on a real site. The database is not
+touched; this times the NumPy and SciPy work done by
+``voting.recommend``.
+"""
+import os
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting.tests.settings')
+
+import numpy
+
+from voting.recommend import cooccurrence_matrix, top_neighbours
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--votes', type='int', default=1000000)
+    parser.add_option('--users', type='int', default=100000)
+    parser.add_option('--objects', type='int', default=20000)
+    parser.add_option('--top', type='int', default=10)
+    parser.add_option('--seed', type='int', default=0)
+    options, args = parser.parse_args()
+
+    random = numpy.random.RandomState(options.seed)
+    weights = 1.0 / numpy.arange(1, options.objects + 1)
+    weights /= weights.sum()
+    user_ids = random.randint(0, options.users, options.votes)
+    object_ids = random.choice(options.objects, options.votes, p=weights)
+
+    start = time.time()
+    matrix = cooccurrence_matrix(user_ids, object_ids, options.objects)
+    built = time.time()
+    count = 0
+    for row, neighbours in top_neighbours(matrix, options.top):
+        count += len(neighbours)
+    finished = time.time()
+
+    print '%d upvotes by %d users on %d objects:' % (
+        options.votes, options.users, options.objects)
+    print '  co-occurrence matrix: %.2fs, %d non-zero pairs, %.1f MB' % (
+        built - start, matrix.nnz,
+        (matrix.data.nbytes + matrix.indices.nbytes +
+         matrix.indptr.nbytes) / 1048576.0)
+    print '  top %d neighbours:    %.2fs, %d recommendations' % (
+        options.top, finished - built, count)
+
+if __name__ == '__main__':
+    main()
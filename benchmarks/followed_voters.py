@@ -0,0 +1,135 @@
+"""
+Compares finding which of a viewer's followees upvoted each object on a
+page with ``get_followed_voters_in_bulk`` against calling
+``get_voters`` per object and intersecting with the followees in
+Python.
+
+Usage::
+
+    python benchmarks/followed_voters.py [--users=N] [--followees=N] [--votes=N] [--page=N] [--runs=N]
+
+A temporary SQLite database is filled with ``--users`` users, of whom
+the viewer follows ``--followees``, and ``--votes`` votes skewed
+towards the first objects, which make up the page.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+
+def setup(path):
+    settings.configure(
+        DATABASE_ENGINE='sqlite3',
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3',
+                               'NAME': path}},
+        INSTALLED_APPS=('django.contrib.auth', 'django.contrib.contenttypes',
+                        'voting', 'voting.tests'),
+        VOTING_MODELS=('tests.Item',),
+        VOTING_FOLLOWEES='voting.tests.models.get_followees',
+    )
+    from django.core.management import call_command
+    call_command('syncdb', interactive=False, verbosity=0)
+
+def fill(options):
+    from django.contrib.contenttypes.models import ContentType
+    from django.db import connection, transaction
+    from voting.tests.models import Item
+    cursor = connection.cursor()
+    cursor.executemany(
+        'INSERT INTO auth_user (username, first_name, last_name, email, '
+        'password, is_staff, is_active, is_superuser, last_login, '
+        'date_joined) VALUES (%s, "", "", "", "", 0, 1, 0, %s, %s)',
+        [('user%d' % i, '2012-01-01', '2012-01-01')
+         for i in range(options.users + 1)])
+    cursor.executemany('INSERT INTO tests_item (name) VALUES (%s)',
+                       [('item%d' % i,) for i in range(1, 10001)])
+    viewer = options.users + 1
+    cursor.executemany(
+        'INSERT INTO tests_follow (follower_id, followee_id) VALUES (%s, %s)',
+        [(viewer, followee) for followee in
+         random.sample(xrange(1, options.users + 1), options.followees)])
+    content_type_id = ContentType.objects.get_for_model(Item).id
+    rows = set()
+    while len(rows) < options.votes:
+        object_id = min(int(random.paretovariate(1.0)), 10000)
+        rows.add((random.randint(1, options.users), object_id))
+    cursor.executemany(
+        'INSERT INTO votes (user_id, content_type_id, object_id, vote, '
+        'created, updated) VALUES (%s, %s, %s, %s, %s, %s)',
+        [(user_id, content_type_id, object_id, random.choice((1, 1, -1)),
+          '2012-01-01 00:00:00', '2012-01-01 00:00:00')
+         for user_id, object_id in rows])
+    cursor.execute('ANALYZE')
+    transaction.commit_unless_managed()
+    return viewer
+
+def timed(func, runs):
+    timings = []
+    for i in range(runs):
+        start = time.time()
+        func()
+        timings.append(time.time() - start)
+    return min(timings)
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--users', type='int', default=20000)
+    parser.add_option('--followees', type='int', default=3000)
+    parser.add_option('--votes', type='int', default=100000)
+    parser.add_option('--page', type='int', default=20)
+    parser.add_option('--runs', type='int', default=5)
+    options, args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        setup(os.path.join(directory, 'votes.db'))
+        from django.contrib.auth.models import User
+        from voting import following
+        from voting.models import Vote
+        from voting.tests.models import Item
+        random.seed(0)
+        viewer = User.objects.get(pk=fill(options))
+        page = list(Item.objects.filter(pk__lte=options.page))
+
+        def per_object():
+            followees = set(following.get_followees(viewer))
+            result = {}
+            for item in page:
+                voters = [user for user in
+                          Vote.objects.get_voters(item)['voters']
+                          if user.id in followees]
+                result[item.id] = voters
+            return result
+
+        followee_ids = frozenset(following.get_followees(viewer))
+        joined = timed(lambda: Vote.objects.get_followed_voters_in_bulk(
+            page, viewer), options.runs)
+        cached = timed(lambda: Vote.objects.get_followed_voters_in_bulk(
+            page, viewer, followees=followee_ids), options.runs)
+        # One run is enough: each voter is loaded with a query of its own.
+        naive = timed(per_object, 1)
+        counts = Vote.objects.get_followed_voters_in_bulk(page, viewer)
+        upvoted = dict([(item.id, set(Vote.objects.filter(
+            object_id=item.id, vote=1).values_list('user', flat=True)))
+            for item in page])
+        assert all([followed['count'] == len(upvoted[item_id] & followee_ids)
+                    for item_id, followed in counts.items()])
+
+        print 'A page of %d objects, viewer following %d of %d users, ' \
+              '%d votes:' % (options.page, options.followees, options.users,
+                             options.votes)
+        print '  get_voters per object:  %7.1fms' % (naive * 1000)
+        print '  joined followees:       %7.1fms' % (joined * 1000)
+        print '  cached followee ids:    %7.1fms' % (cached * 1000)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
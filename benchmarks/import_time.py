@@ -0,0 +1,60 @@
+"""
+Measures how long a fresh process takes to import ``voting.views``, and
+checks that none of the optional integrations are imported with it.
+
+Usage::
+
+    python benchmarks/import_time.py [--runs=N] [--settings=module]
+
+Each run imports the views in a new interpreter, so the numbers include
+Django's own start-up but nothing cached from earlier runs.
+"""
+import os
+import subprocess
+import sys
+from optparse import OptionParser
+
+OPTIONAL_MODULES = ('mezzanine', 'actstream', 'imagestore', 'userProfile',
+                    'follow', 'django.contrib.comments')
+
+SCRIPT = """
+import sys, time
+start = time.time()
+import voting.views
+elapsed = time.time() - start
+loaded = [name for name in %r if name in sys.modules]
+print elapsed, ','.join(loaded)
+""" % (OPTIONAL_MODULES,)
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--runs', type='int', default=20)
+    parser.add_option('--settings', default='voting.tests.settings')
+    options, args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['DJANGO_SETTINGS_MODULE'] = options.settings
+    env['PYTHONPATH'] = os.pathsep.join(
+        [root] + filter(None, [env.get('PYTHONPATH')]))
+
+    timings, loaded = [], set()
+    for i in range(options.runs):
+        output = subprocess.Popen([sys.executable, '-c', SCRIPT], env=env,
+                                  stdout=subprocess.PIPE).communicate()[0]
+        elapsed, modules = (output.strip().split(' ') + [''])[:2]
+        timings.append(float(elapsed))
+        loaded.update(filter(None, modules.split(',')))
+
+    timings.sort()
+    print 'import voting.views over %d runs:' % options.runs
+    print '  min    %.1f ms' % (timings[0] * 1000)
+    print '  median %.1f ms' % (timings[len(timings) // 2] * 1000)
+    print '  max    %.1f ms' % (timings[-1] * 1000)
+    if loaded:
+        print 'optional modules imported: %s' % ', '.join(sorted(loaded))
+        sys.exit(1)
+    print 'no optional modules imported'
+
+if __name__ == '__main__':
+    main()
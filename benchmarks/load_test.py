@@ -0,0 +1,295 @@
+"""
+Drives ``xmlhttprequest_vote_on_object`` from many concurrent workers
+against a local database, to reproduce the lock contention and
+duplicate vote errors seen when many users vote on the same object at
+once.
+
+Usage::
+
+    python benchmarks/load_test.py [--workers=N] [--processes] [--requests=N]
+        [--users=N] [--objects=N] [--skew=S] [--mix=UP:DOWN:CLEAR]
+        [--double-submit=P] [--payload=BYTES] [--settings=module]
+
+Each worker builds POST requests with ``RequestFactory`` and calls the
+view directly, as the test client would without its middleware.
+Workers are threads, or processes with ``--processes``. Objects are
+picked with a Zipf-like skew - ``--skew=0`` is uniform, higher values
+concentrate votes on the first few objects - and directions in the
+proportions given by ``--mix``. ``--double-submit`` is the chance that
+a vote is sent twice at once, as by a double click, and ``--payload``
+pads each request with a field of that many bytes.
+
+Users are divided between workers, so each user's votes are sent in a
+known order and their final votes are known. Afterwards the report
+gives throughput, latency percentiles and errors by type, and checks
+that:
+
+    * each object's score equals the sum of the final votes sent for it,
+      leaving out users whose last request failed;
+    * no user has more than one vote on an object;
+    * each object's daily vote bucket agrees with its votes.
+
+By default a temporary SQLite database is used, where concurrent
+writers mostly fail with "database is locked". ``--settings`` names a
+settings module - one installing ``voting.tests`` and registering
+``tests.Item`` for voting, e.g. for PostgreSQL - against which a test
+database is created and destroyed. SQLite test databases need a
+``TEST_NAME``, as in-memory ones aren't shared between threads.
+"""
+import bisect
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+
+DIRECTIONS = (('up', 1), ('down', -1), ('clear', 0))
+
+def setup(options, directory):
+    if options.settings:
+        os.environ['DJANGO_SETTINGS_MODULE'] = options.settings
+        from django.db import connection
+        name = settings.DATABASES['default']['NAME']
+        connection.creation.create_test_db(verbosity=0)
+        return lambda: connection.creation.destroy_test_db(name, verbosity=0)
+    settings.configure(
+        DATABASE_ENGINE='sqlite3',
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3',
+                               'NAME': os.path.join(directory, 'votes.db')}},
+        INSTALLED_APPS=('django.contrib.auth', 'django.contrib.contenttypes',
+                        'voting', 'voting.tests'),
+        VOTING_MODELS=('tests.Item',),
+    )
+    from django.core.management import call_command
+    call_command('syncdb', interactive=False, verbosity=0)
+    return None
+
+def fill(options):
+    from django.contrib.auth.models import User
+    from voting.tests.models import Item
+    User.objects.bulk_create([User(username='user%d' % i)
+                              for i in range(options.users)])
+    Item.objects.bulk_create([Item(name='item%d' % i)
+                              for i in range(options.objects)])
+    return (list(User.objects.order_by('pk').values_list('pk', flat=True)),
+            list(Item.objects.order_by('pk').values_list('pk', flat=True)))
+
+def cumulative_weights(weights):
+    total, cumulative = 0.0, []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+def pick(rng, values, cumulative):
+    return values[bisect.bisect(cumulative, rng.random() * cumulative[-1])]
+
+def run_worker(worker, options, user_ids, object_ids):
+    """
+    Send this worker's share of the requests, returning ``(latencies,
+    errors, final_votes, failed)``: the latency of each request, a
+    dictionary counting errors by message, the last vote sent by each
+    user on each object, and the ``(user, object)`` pairs whose last
+    request failed.
+    """
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.client import RequestFactory
+    from django.utils import simplejson
+    from voting.tests.models import Item
+    from voting.views import xmlhttprequest_vote_on_object
+
+    rng = random.Random(options.seed + worker)
+    users = list(User.objects.filter(
+        pk__in=user_ids[worker::options.workers]))
+    object_weights = cumulative_weights(
+        [1.0 / (rank ** options.skew) for rank in range(1, len(object_ids) + 1)])
+    direction_weights = cumulative_weights(options.mix)
+    factory = RequestFactory()
+    data = options.payload and {'payload': 'x' * options.payload} or {}
+    lock = threading.Lock()
+    latencies, errors, final_votes, failed = [], defaultdict(int), {}, set()
+
+    def send(user, object_id, direction, twin=False):
+        request = factory.post('/vote/', data)
+        request.user = user
+        start = time.time()
+        try:
+            response = xmlhttprequest_vote_on_object(
+                request, Item, direction, object_id=object_id)
+            result = simplejson.loads(response.content)
+            error = not result['success'] and result['error_message']
+        except Exception, e:
+            error = '%s: %s' % (e.__class__.__name__, str(e).split('\n')[0])
+        finally:
+            if twin:
+                connection.close()
+        with lock:
+            latencies.append(time.time() - start)
+            if error:
+                errors[error] += 1
+        return not error
+
+    for i in range(options.requests // options.workers):
+        user = rng.choice(users)
+        object_id = pick(rng, object_ids, object_weights)
+        direction, vote = pick(rng, DIRECTIONS, direction_weights)
+        if rng.random() < options.double_submit:
+            twin_ok = []
+            twin = threading.Thread(target=lambda: twin_ok.append(
+                send(user, object_id, direction, twin=True)))
+            twin.start()
+            ok = send(user, object_id, direction)
+            twin.join()
+            ok = ok and twin_ok[0]
+        else:
+            ok = send(user, object_id, direction)
+        key = (user.pk, object_id)
+        final_votes[key] = vote
+        if ok:
+            failed.discard(key)
+        else:
+            failed.add(key)
+    connection.close()
+    return latencies, dict(errors), final_votes, failed
+
+def run_process(worker, options, user_ids, object_ids, queue):
+    queue.put(run_worker(worker, options, user_ids, object_ids))
+
+def run(options, user_ids, object_ids):
+    results = []
+    if options.processes:
+        import multiprocessing
+        from django.db import connection
+        connection.close()
+        queue = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=run_process, args=(
+            worker, options, user_ids, object_ids, queue))
+            for worker in range(options.workers)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            results.append(queue.get())
+        for process in workers:
+            process.join()
+    else:
+        def run_thread(worker):
+            results.append(run_worker(worker, options, user_ids, object_ids))
+        workers = [threading.Thread(target=run_thread, args=(worker,))
+                   for worker in range(options.workers)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    return results
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def check(object_ids, final_votes, failed):
+    """
+    Compare the stored votes with the final votes sent, returning
+    counts of objects whose score is wrong, duplicated votes and
+    buckets which disagree with the votes.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from django.db.models import Count, Sum
+    from voting.models import Vote, VoteBucket
+    from voting.tests.models import Item
+    ctype_id = ContentType.objects.get_for_model(Item).id
+    votes = Vote.objects.filter(content_type__pk=ctype_id)
+
+    stored = dict([((user_id, object_id), vote) for user_id, object_id, vote
+                   in votes.values_list('user', 'object_id', 'vote')])
+    expected, actual = defaultdict(int), defaultdict(int)
+    for (user_id, object_id), vote in final_votes.items():
+        if (user_id, object_id) not in failed:
+            expected[object_id] += vote
+            actual[object_id] += stored.get((user_id, object_id), 0)
+    wrong_scores = len([object_id for object_id in object_ids
+                        if expected[object_id] != actual[object_id]])
+
+    duplicates = votes.values('user', 'object_id').annotate(
+        num=Count('id')).filter(num__gt=1).count()
+
+    totals = dict([(row[0], row[1:]) for row in votes.values_list(
+        'object_id').annotate(Sum('vote'), Count('id'))])
+    buckets = dict([(row[0], row[1:]) for row in VoteBucket.objects.filter(
+        content_type__pk=ctype_id, period='d').values_list(
+        'object_id').annotate(Sum('score'), Sum('num_votes'))])
+    wrong_buckets = len([object_id for object_id in object_ids
+                         if tuple(totals.get(object_id, (0, 0))) !=
+                         tuple(buckets.get(object_id, (0, 0)))])
+    return wrong_scores, duplicates, wrong_buckets
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--workers', type='int', default=8)
+    parser.add_option('--processes', action='store_true', default=False)
+    parser.add_option('--requests', type='int', default=2000)
+    parser.add_option('--users', type='int', default=200)
+    parser.add_option('--objects', type='int', default=50)
+    parser.add_option('--skew', type='float', default=1.2)
+    parser.add_option('--mix', default='6:2:2')
+    parser.add_option('--double-submit', type='float', default=0.05)
+    parser.add_option('--payload', type='int', default=0)
+    parser.add_option('--seed', type='int', default=0)
+    parser.add_option('--settings')
+    options, args = parser.parse_args()
+    options.mix = [float(weight) for weight in options.mix.split(':')]
+    if len(options.mix) != len(DIRECTIONS):
+        parser.error('--mix takes three weights, for up, down and clear.')
+
+    directory = tempfile.mkdtemp()
+    teardown = None
+    try:
+        teardown = setup(options, directory)
+        user_ids, object_ids = fill(options)
+
+        start = time.time()
+        results = run(options, user_ids, object_ids)
+        elapsed = time.time() - start
+
+        latencies, errors, final_votes, failed = [], defaultdict(int), {}, set()
+        for worker_latencies, worker_errors, worker_votes, worker_failed \
+                in results:
+            latencies.extend(worker_latencies)
+            for error, count in worker_errors.items():
+                errors[error] += count
+            final_votes.update(worker_votes)
+            failed.update(worker_failed)
+        latencies.sort()
+        wrong_scores, duplicates, wrong_buckets = check(object_ids,
+                                                        final_votes, failed)
+
+        print '%d requests from %d %s in %.2fs: %.0f requests/s' % (
+            len(latencies), options.workers,
+            options.processes and 'processes' or 'threads', elapsed,
+            len(latencies) / elapsed)
+        print '  latency p50 %.1fms, p90 %.1fms, p99 %.1fms, max %.1fms' % (
+            percentile(latencies, 0.5) * 1000,
+            percentile(latencies, 0.9) * 1000,
+            percentile(latencies, 0.99) * 1000, latencies[-1] * 1000)
+        print '  %d errors' % sum(errors.values())
+        for error, count in sorted(errors.items(), key=lambda item: -item[1]):
+            print '    %6d  %s' % (count, error)
+        print '  %d of %d objects with a score other than the sum of the ' \
+              'final votes sent' % (wrong_scores, len(object_ids))
+        print '  %d duplicated votes' % duplicates
+        print '  %d objects whose daily bucket disagrees with their votes' % (
+            wrong_buckets)
+    finally:
+        if teardown is not None:
+            teardown()
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Compares vote aggregates for a small content type whose votes share the
+votes table with a heavily voted one against the same aggregates read
+from a table of its own, as set up by ``VOTING_PARTITIONS``.
+
+Usage::
+
+    python benchmarks/partitions.py [--big=N] [--small=N] [--runs=N]
+
+A temporary SQLite database is filled with ``--big`` votes on items and
+``--small`` votes on photos. The photo votes are written both to the
+votes table and to the photos' own table, and the queries behind
+``get_top`` and ``get_scores_in_bulk`` are timed against each.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+
+def setup(path):
+    settings.configure(
+        DATABASE_ENGINE='sqlite3',
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3',
+                               'NAME': path}},
+        INSTALLED_APPS=('django.contrib.auth', 'django.contrib.contenttypes',
+                        'voting', 'voting.tests'),
+        VOTING_MODELS=('tests.Item', 'tests.Photo'),
+        VOTING_PARTITIONS=('tests.Photo',),
+    )
+    from django.core.management import call_command
+    call_command('syncdb', interactive=False, verbosity=0)
+
+def fill(table, content_type_id, num_votes, num_users, num_objects):
+    from django.db import connection, transaction
+    rows = set()
+    while len(rows) < num_votes:
+        rows.add((random.randint(1, num_users), random.randint(1, num_objects)))
+    cursor = connection.cursor()
+    cursor.executemany(
+        'INSERT INTO %s (user_id, content_type_id, object_id, vote, created, '
+        'updated) VALUES (%%s, %%s, %%s, %%s, %%s, %%s)' % table,
+        [(user_id, content_type_id, object_id, random.choice((1, 1, -1)),
+          '2012-01-01 00:00:00', '2012-01-01 00:00:00')
+         for user_id, object_id in rows])
+    transaction.commit_unless_managed()
+
+def timed(func, runs):
+    timings = []
+    for i in range(runs):
+        start = time.time()
+        func()
+        timings.append(time.time() - start)
+    return min(timings)
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--big', type='int', default=1000000)
+    parser.add_option('--small', type='int', default=10000)
+    parser.add_option('--runs', type='int', default=5)
+    options, args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        setup(os.path.join(directory, 'votes.db'))
+        from django.contrib.contenttypes.models import ContentType
+        from voting.models import PARTITION_MODELS, Vote
+        from voting.tests.models import Item, Photo
+        PhotoVote = PARTITION_MODELS['tests.Photo']
+        item_ctype_id = ContentType.objects.get_for_model(Item).id
+        photo_ctype_id = ContentType.objects.get_for_model(Photo).id
+
+        random.seed(0)
+        fill('votes', item_ctype_id, options.big, 200000, 100000)
+        random.seed(1)
+        fill('votes', photo_ctype_id, options.small, 20000, 2000)
+        random.seed(1)
+        fill(PhotoVote._meta.db_table, photo_ctype_id, options.small, 20000,
+             2000)
+        from django.db import connection
+        connection.cursor().execute('ANALYZE')
+        page = range(1, 51)
+
+        print '%d item votes and %d photo votes:' % (options.big,
+                                                     options.small)
+        for name, manager in (('shared votes table', Vote.objects),
+                              ('own table', PhotoVote.objects)):
+            top = timed(lambda: manager._top_scores(photo_ctype_id, 10, False),
+                        options.runs)
+            bulk = timed(lambda: manager._scores_for_ids(photo_ctype_id, page),
+                         options.runs)
+            print '  %-20s top 10: %6.1fms   scores for 50: %6.1fms' % (
+                name, top * 1000, bulk * 1000)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Measures scoring vote totals with ``voting.ranking.compute_rankings``
+against scoring them one object at a time in Python.
+
+Usage::
+
+    python benchmarks/ranking.py [--objects=N] [--chunk-size=N]
+
+The database is not touched; this times the scoring of synthetic
+``(up, down, first_vote)`` columns, in chunks as ``rerank`` reads them.
+"""
+import datetime
+import math
+import os
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting.tests.settings')
+
+import numpy
+
+from voting.ranking import compute_rankings
+
+def score_in_python(up, down, hours, gravity=1.8, z=1.96):
+    n = up + down
+    if n:
+        p = float(up) / n
+        wilson = (p + z * z / (2 * n) - z * math.sqrt(
+            (p * (1 - p) + z * z / (4 * n)) / n)) / (1 + z * z / n)
+    else:
+        p = wilson = 0.0
+    return up - down, p, wilson, (up - down) / math.pow(hours + 2, gravity)
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--objects', type='int', default=2000000)
+    parser.add_option('--chunk-size', type='int', default=10000)
+    parser.add_option('--seed', type='int', default=0)
+    options, args = parser.parse_args()
+
+    random = numpy.random.RandomState(options.seed)
+    at = datetime.datetime(2012, 1, 1)
+    up = random.poisson(20, options.objects)
+    down = random.poisson(5, options.objects)
+    first_votes = numpy.datetime64(at, 'us') - random.randint(
+        0, 90 * 24 * 3600, options.objects).astype('timedelta64[s]')
+
+    start = time.time()
+    for i in range(0, options.objects, options.chunk_size):
+        chunk = slice(i, i + options.chunk_size)
+        compute_rankings(up[chunk], down[chunk], first_votes[chunk], at)
+    vectorized = time.time() - start
+
+    sample = min(options.objects, 100000)
+    hours = ((numpy.datetime64(at, 'us') - first_votes[:sample]) /
+             numpy.timedelta64(1, 'h')).tolist()
+    up_list, down_list = up[:sample].tolist(), down[:sample].tolist()
+    start = time.time()
+    for i in range(sample):
+        score_in_python(up_list[i], down_list[i], hours[i])
+    per_object = (time.time() - start) * options.objects / sample
+
+    print 'Scoring %d objects in chunks of %d:' % (options.objects,
+                                                  options.chunk_size)
+    print '  vectorized:        %.2fs' % vectorized
+    print '  one at a time:     %.2fs (extrapolated from %d)' % (per_object,
+                                                                 sample)
+
+if __name__ == '__main__':
+    main()
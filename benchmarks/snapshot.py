@@ -0,0 +1,107 @@
+"""
+Compares loading votes into an offline job through the ORM against
+memory-mapping them from a snapshot written by ``voting.snapshot``.
+
+Usage::
+
+    python benchmarks/snapshot.py [--votes=N]
+
+A temporary SQLite database is filled with ``--votes`` votes. Both
+approaches then compute the score of every voted object: one by
+iterating over ``Vote`` instances, the other with ``numpy.bincount``
+over the mapped columns. Peak memory is reported from ``getrusage``, so
+the snapshot is read first.
+"""
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+
+def setup(path):
+    settings.configure(
+        DATABASE_ENGINE='sqlite3',
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3',
+                               'NAME': path}},
+        INSTALLED_APPS=('django.contrib.auth', 'django.contrib.contenttypes',
+                        'voting', 'voting.tests'),
+        VOTING_MODELS=('tests.Item',),
+    )
+    from django.core.management import call_command
+    call_command('syncdb', interactive=False, verbosity=0)
+
+def fill(content_type_id, num_votes, num_users, num_objects):
+    from django.db import connection, transaction
+    rows = set()
+    while len(rows) < num_votes:
+        rows.add((random.randint(1, num_users), random.randint(1, num_objects)))
+    cursor = connection.cursor()
+    cursor.executemany(
+        'INSERT INTO votes (user_id, content_type_id, object_id, vote, '
+        'created, updated) VALUES (%s, %s, %s, %s, %s, %s)',
+        [(user_id, content_type_id, object_id, random.choice((1, 1, -1)),
+          '2012-01-01 00:00:00', '2012-01-01 00:00:00')
+         for user_id, object_id in rows])
+    transaction.commit_unless_managed()
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--votes', type='int', default=1000000)
+    options, args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        setup(os.path.join(directory, 'votes.db'))
+        import numpy
+        from django.contrib.contenttypes.models import ContentType
+        from voting import snapshot
+        from voting.models import Vote
+        from voting.tests.models import Item
+        random.seed(0)
+        fill(ContentType.objects.get_for_model(Item).id, options.votes,
+             200000, 100000)
+        path = os.path.join(directory, 'votes.snap')
+
+        start = time.time()
+        snapshot.export_snapshot(path)
+        exported = time.time() - start
+        baseline = peak_mb()
+
+        start = time.time()
+        votes = snapshot.load_snapshot(path)
+        loaded = time.time() - start
+        start = time.time()
+        scores = numpy.bincount(votes.object_id, weights=votes.vote)
+        mapped = time.time() - start
+        mapped_peak = peak_mb() - baseline
+
+        start = time.time()
+        orm_scores = {}
+        for vote in Vote.objects.all():
+            orm_scores[vote.object_id] = (orm_scores.get(vote.object_id, 0) +
+                                          vote.vote)
+        orm = time.time() - start
+        orm_peak = peak_mb() - baseline
+        assert all([scores[object_id] == score
+                    for object_id, score in orm_scores.items()])
+
+        print 'Scoring objects from %d votes:' % options.votes
+        print '  export snapshot:   %6.2fs' % exported
+        print '  snapshot:          %6.3fs load, %6.3fs score, +%.0fMB' % (
+            loaded, mapped, mapped_peak)
+        print '  ORM instances:     %6.2fs, +%.0fMB' % (orm, orm_peak)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,104 @@
 from django.contrib import admin
-from voting.models import Vote
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
 
-admin.site.register(Vote)
+from voting.managers import prefetch_objects
+from voting.models import PARTITION_MODELS, Vote
+
+# Tables estimated to hold fewer rows than this are counted exactly.
+ESTIMATE_THRESHOLD = 100000
+
+def estimate_count(queryset):
+    """
+    Count the rows of an unfiltered queryset from the database's table
+    statistics on PostgreSQL and MySQL, rather than with a full
+    ``COUNT(*)``. Filtered querysets, small tables and other databases
+    are counted exactly.
+    """
+    if queryset.query.where:
+        return queryset.count()
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    estimate = None
+    if connection.vendor == 'postgresql':
+        cursor = connection.cursor()
+        cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s',
+                       [table])
+        row = cursor.fetchone()
+        estimate = row and row[0]
+    elif connection.vendor == 'mysql':
+        cursor = connection.cursor()
+        cursor.execute('SHOW TABLE STATUS LIKE %s', [table])
+        row = cursor.fetchone()
+        estimate = row and row[4]
+    if estimate is None or estimate < ESTIMATE_THRESHOLD:
+        return queryset.count()
+    return int(estimate)
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator which estimates the number of objects in unfiltered
+    querysets using ``estimate_count``.
+    """
+    def _get_count(self):
+        if self._count is None:
+            self._count = estimate_count(self.object_list)
+        return self._count
+    count = property(_get_count)
+
+class VoteChangeList(ChangeList):
+    """
+    A change list which estimates the unfiltered total instead of
+    counting every vote, and resolves the voted objects of the listed
+    page with one query per content type.
+    """
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.query_set,
+                                                   self.list_per_page)
+        result_count = paginator.count
+        if not self.query_set.query.where:
+            full_result_count = result_count
+        else:
+            full_result_count = estimate_count(self.root_query_set)
+
+        can_show_all = result_count <= self.list_max_show_all
+        multi_page = result_count > self.list_per_page
+        if (self.show_all and can_show_all) or not multi_page:
+            result_list = self.query_set._clone()
+        else:
+            try:
+                result_list = paginator.page(self.page_num+1).object_list
+            except InvalidPage:
+                raise IncorrectLookupParameters
+
+        self.result_count = result_count
+        self.full_result_count = full_result_count
+        self.result_list = prefetch_objects(result_list)
+        self.can_show_all = can_show_all
+        self.multi_page = multi_page
+        self.paginator = paginator
+
+class VoteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'vote', 'content_type', 'object_id',
+                    'voted_object', 'created')
+    list_filter = ('content_type', 'vote')
+    list_select_related = True
+    raw_id_fields = ('user',)
+    readonly_fields = ('created', 'updated')
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+
+    def get_changelist(self, request, **kwargs):
+        return VoteChangeList
+
+    def voted_object(self, vote):
+        if vote.object is None:
+            return u'(deleted)'
+        return vote.object
+    voted_object.short_description = 'object'
+
+admin.site.register(Vote, VoteAdmin)
+for model in PARTITION_MODELS.values():
+    admin.site.register(model, VoteAdmin)
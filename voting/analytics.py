@@ -0,0 +1,234 @@
+"""
+Approximate unique-voter counts from HyperLogLog sketches.
+
+Voters are counted in one sketch per content type per day, and in one
+sketch per author per day - the author of an object being the user
+named by its ``settings.VOTING_AUTHOR_FIELD`` field (default
+``'user'``); objects of models without that field have no author.
+Sketches are built offline from the votes tables by ``build_sketches``,
+not as votes are recorded, and a day's voters are the users holding a
+vote first cast or last changed during it. Sketches of past days are
+left as they were built, so rebuild only the last day or two.
+
+Sketches are kept in the ``VoterSketch`` table as compact blobs, and
+merged to count the unique voters over any range of days. With the
+default precision of 12 bits, each sketch holds 4096 one-byte registers
+and counts have a standard error of ``1.04 / sqrt(4096)``, about 1.6%;
+roughly 95% of counts fall within 3.3% of the true count, and
+practically all within 5%. Counts up to a few thousand voters are
+usually far closer than that.
+"""
+import base64
+import datetime
+import hashlib
+import math
+import struct
+import zlib
+
+from django.conf import settings
+from django.db.models import FieldDoesNotExist, Q
+
+from voting import registry
+from voting.utils import floor_day, now
+
+PRECISION = 12
+
+# Sketch kinds, as stored in ``VoterSketch.kind``.
+CONTENT_TYPE = 'c'
+AUTHOR = 'a'
+
+class HyperLogLog(object):
+    """
+    A HyperLogLog sketch estimating the number of distinct values added
+    to it, using ``2 ** precision`` registers.
+    """
+    def __init__(self, precision=PRECISION, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError('Precision must be between 4 and 16.')
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is None:
+            registers = bytearray(self.size)
+        self.registers = registers
+
+    def add(self, value):
+        hashed = struct.unpack('>Q', hashlib.sha1(str(value)).digest()[:8])[0]
+        index = hashed >> (64 - self.precision)
+        width = 64 - self.precision
+        rank = width - (hashed & ((1 << width) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """
+        Fold another sketch of the same precision into this one, so it
+        counts the union of the values added to either.
+        """
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches of different precision.')
+        registers = self.registers
+        for index, rank in enumerate(other.registers):
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def count(self):
+        """
+        Estimate the number of distinct values added.
+        """
+        size = self.size
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(
+            [2.0 ** -rank for rank in self.registers])
+        zeros = self.registers.count('\0')
+        if estimate <= 2.5 * size and zeros:
+            # Linear counting is more accurate for small cardinalities.
+            estimate = size * math.log(float(size) / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    def to_bytes(self):
+        """
+        Serialize the sketch as a compressed binary string.
+        """
+        return chr(self.precision) + zlib.compress(str(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        precision = ord(data[0])
+        registers = bytearray(zlib.decompress(data[1:]))
+        if len(registers) != 1 << precision:
+            raise ValueError('Corrupt sketch.')
+        return cls(precision, registers)
+
+    def to_text(self):
+        """
+        Serialize the sketch as an ASCII string, for text columns.
+        """
+        return base64.b64encode(self.to_bytes())
+
+    @classmethod
+    def from_text(cls, data):
+        return cls.from_bytes(base64.b64decode(data))
+
+def build_sketches(since, until, chunk_size=10000):
+    """
+    Rebuild the sketches for the days from ``since`` until, but not
+    including, ``until`` from the votes first cast or last changed
+    during each day, replacing those already stored. Votes are read
+    ``chunk_size`` at a time. Returns the number of sketches written.
+    """
+    from voting.models import VoterSketch, get_vote_models
+    written = 0
+    today = now()
+    day = since
+    while day < until:
+        start = floor_day(today) - datetime.timedelta(
+            days=(today.date() - day).days)
+        end = start + datetime.timedelta(days=1)
+        sketches = {}
+        for model in get_vote_models():
+            votes = model._default_manager.reader().filter(
+                Q(created__gte=start, created__lt=end) |
+                Q(updated__gte=start, updated__lt=end)).order_by('id')
+            last_id = 0
+            while True:
+                rows = list(votes.filter(id__gt=last_id).values_list(
+                    'id', 'content_type', 'object_id', 'user')[:chunk_size])
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                _add_voters(sketches, rows)
+        written += VoterSketch.objects.replace_day(day, sketches)
+        day += datetime.timedelta(days=1)
+    return written
+
+def _add_voters(sketches, rows):
+    """
+    Add the voters of ``(id, content_type_id, object_id, user_id)``
+    rows to a dictionary of sketches keyed by ``(kind, key)``.
+    """
+    by_object = {}
+    for id, content_type_id, object_id, user_id in rows:
+        sketch = sketches.get((CONTENT_TYPE, content_type_id))
+        if sketch is None:
+            sketch = sketches[(CONTENT_TYPE, content_type_id)] = HyperLogLog()
+        sketch.add(user_id)
+        by_object.setdefault((content_type_id, object_id), set()).add(user_id)
+    for content_type_id, authors in _get_authors(by_object.keys()).items():
+        for object_id, author_id in authors.items():
+            sketch = sketches.get((AUTHOR, author_id))
+            if sketch is None:
+                sketch = sketches[(AUTHOR, author_id)] = HyperLogLog()
+            sketch.update(by_object[(content_type_id, object_id)])
+
+def _get_authors(pairs):
+    """
+    Get a dictionary mapping content type ids to dictionaries mapping
+    the given object ids to their authors' user ids.
+    """
+    field_name = getattr(settings, 'VOTING_AUTHOR_FIELD', 'user')
+    object_ids = {}
+    for content_type_id, object_id in pairs:
+        object_ids.setdefault(content_type_id, []).append(object_id)
+    authors = {}
+    for content_type_id, ids in object_ids.items():
+        try:
+            model, manager = registry.site.resolve(content_type_id)
+        except registry.NotRegistered:
+            continue
+        try:
+            field = model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            continue
+        authors[content_type_id] = dict(
+            [(pk, author_id) for pk, author_id in manager.filter(
+                pk__in=ids).values_list('pk', field.attname)
+             if author_id is not None])
+    return authors
+
+def count_voters(model, since=None, until=None):
+    """
+    Estimate the number of users who voted on objects of a registered
+    model, or model instance, from the day ``since`` until, but not
+    including, the day ``until``.
+    """
+    from voting.models import VoterSketch
+    content_type_id = registry.site.get_content_type_id(model)
+    return VoterSketch.objects.get_sketch(CONTENT_TYPE, content_type_id,
+                                          since, until).count()
+
+def count_author_voters(user, since=None, until=None):
+    """
+    Estimate the number of users who voted on objects authored by a
+    user from the day ``since`` until, but not including, ``until``.
+    """
+    from voting.models import VoterSketch
+    return VoterSketch.objects.get_sketch(AUTHOR, user.pk, since,
+                                          until).count()
+
+def voter_series(model, since, until, days=1):
+    """
+    Get a list of ``(start, count)`` tuples estimating the users who
+    voted on objects of a registered model in each period of ``days``
+    days from ``since`` until ``until``.
+    """
+    from voting.models import VoterSketch
+    content_type_id = registry.site.get_content_type_id(model)
+    return VoterSketch.objects.get_series(CONTENT_TYPE, content_type_id,
+                                          since, until, days)
+
+def author_voter_series(user, since, until, days=1):
+    """
+    Get a list of ``(start, count)`` tuples estimating the users who
+    voted on objects authored by a user in each period of ``days`` days
+    from ``since`` until ``until``.
+    """
+    from voting.models import VoterSketch
+    return VoterSketch.objects.get_series(AUTHOR, user.pk, since, until,
+                                          days)
@@ -0,0 +1,131 @@
+"""
+Auditing of the like and dislike counters kept by
+``voting.plugins.counters``.
+
+Counters drift from the votes they count when they were kept by
+earlier versions of the counters plugin, which didn't undo clearing an
+upvote and casting a downvote symmetrically and wrote counts read in
+Python back, or when votes change without the plugin being called. The
+auditor recomputes each author's counters from the votes table - the
+upvotes and downvotes currently held by the objects they authored -
+and reports, and optionally repairs, those which differ.
+
+Authors are those named by the ``settings.VOTING_AUTHOR_FIELD`` field
+(default ``'user'``) of registered models, and are audited in chunks
+in primary key order, each chunk with one aggregate query per voted
+model and no locks taken. Each query finds the chunk's objects through
+the index on their author field, and their votes through the index on
+``(content_type_id, object_id)`` of the votes table, so a chunk costs
+the same however far into the audit it is. A repair only overwrites
+counters which are unchanged since they were read, so counts adjusted
+by votes recorded in the meantime are left for the next run.
+"""
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import FieldDoesNotExist
+
+from voting import registry
+from voting.models import Vote
+
+COUNTER_FIELDS = ('num_likes', 'num_dislikes')
+
+def get_counted_models():
+    """
+    Get a dictionary mapping the models which hold counters to lists of
+    ``(model, field)`` tuples for the registered models they author.
+    """
+    field_name = getattr(settings, 'VOTING_AUTHOR_FIELD', 'user')
+    counted = {}
+    for model in registry.site.get_models():
+        try:
+            field = model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            continue
+        holder = getattr(field.rel, 'to', None)
+        if holder is None:
+            continue
+        try:
+            for name in COUNTER_FIELDS:
+                holder._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        counted.setdefault(holder, []).append((model, field))
+    return counted
+
+def iter_counter_diffs(holder, chunk_size=1000, after_id=0, using=None):
+    """
+    Compare the counters of every instance of ``holder`` with the votes
+    on the objects they authored, yielding a ``(last_id, num_checked,
+    diffs)`` tuple per chunk of ``chunk_size`` instances.
+
+    ``diffs`` lists ``(id, num_likes, expected_likes, num_dislikes,
+    expected_dislikes)`` tuples for the instances whose counters are
+    wrong. Auditing can be resumed after the last chunk seen by passing
+    its ``last_id`` as ``after_id``.
+    """
+    authored = get_counted_models()[holder]
+    if using is None:
+        using = router.db_for_write(holder)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    queries = []
+    for model, field in authored:
+        content_type_id = registry.site.get_content_type_id(model)
+        votes = Vote.objects.for_content_type(content_type_id).model
+        queries.append(("""
+        SELECT o.%(author)s,
+               SUM(CASE WHEN v.vote > 0 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN v.vote < 0 THEN 1 ELSE 0 END)
+        FROM %(objects)s o
+        INNER JOIN %(votes)s v ON v.content_type_id = %%s
+          AND v.object_id = o.%(pk)s
+        WHERE o.%(author)s > %%s AND o.%(author)s <= %%s
+        GROUP BY o.%(author)s""" % {
+            'author': qn(field.column),
+            'votes': qn(votes._meta.db_table),
+            'objects': qn(model._meta.db_table),
+            'pk': qn(model._meta.pk.column),
+        }, content_type_id))
+
+    holders = holder._default_manager.db_manager(using).order_by('pk')
+    last_id = after_id
+    while True:
+        rows = list(holders.filter(pk__gt=last_id).values_list(
+            'pk', *COUNTER_FIELDS)[:chunk_size])
+        if not rows:
+            break
+        expected = {}
+        cursor = connection.cursor()
+        for query, content_type_id in queries:
+            cursor.execute(query, [content_type_id, last_id, rows[-1][0]])
+            for author_id, up, down in cursor.fetchall():
+                likes, dislikes = expected.get(author_id, (0, 0))
+                expected[author_id] = (likes + int(up), dislikes + int(down))
+        diffs = []
+        for pk, num_likes, num_dislikes in rows:
+            likes, dislikes = expected.get(pk, (0, 0))
+            if (num_likes, num_dislikes) != (likes, dislikes):
+                diffs.append((pk, num_likes, likes, num_dislikes, dislikes))
+        last_id = rows[-1][0]
+        yield last_id, len(rows), diffs
+        if len(rows) < chunk_size:
+            break
+
+def repair_counters(holder, diffs, batch_size=500, using=None):
+    """
+    Set the counters listed in ``diffs``, as yielded by
+    ``iter_counter_diffs``, to their expected values, committing every
+    ``batch_size`` updates. Returns the number of instances repaired.
+    """
+    if using is None:
+        using = router.db_for_write(holder)
+    holders = holder._default_manager.db_manager(using)
+    repaired = 0
+    for i in range(0, len(diffs), batch_size):
+        with transaction.commit_on_success(using=using):
+            for pk, num_likes, likes, num_dislikes, dislikes \
+                    in diffs[i:i + batch_size]:
+                repaired += holders.filter(
+                    pk=pk, num_likes=num_likes, num_dislikes=num_dislikes,
+                ).update(num_likes=likes, num_dislikes=dislikes)
+    return repaired
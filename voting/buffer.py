@@ -0,0 +1,206 @@
+"""
+Write-behind buffering of vote bucket updates.
+
+If ``settings.VOTING_WRITE_BEHIND`` is ``True``, the bucket updates
+caused by recording votes are accumulated in memory instead of being
+written straight away - votes themselves are still written immediately.
+Updates to the same bucket are merged, and the buffer is flushed with
+one ``UPDATE`` per bucket by a background thread - every
+``settings.VOTING_FLUSH_INTERVAL`` seconds (default ``5``), or as soon
+as it holds more than ``settings.VOTING_FLUSH_SIZE`` buckets (default
+``1000``) - and when the process exits. Changes are only buffered once
+the votes causing them have been committed, and flushes run in
+transactions of their own, never in the transaction of a request.
+
+Windowed score queries add the pending updates of the current process
+to what they read from the database, including those being flushed
+until their transaction commits. Updates pending in other processes
+become visible once those processes flush.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, router, transaction
+
+logger = logging.getLogger('voting.buffer')
+
+
+class DeltaBuffer(object):
+    """
+    A thread-safe buffer of score and vote count changes keyed by
+    ``(content_type_id, object_id, period, start)`` bucket keys.
+    """
+    def __init__(self, interval=5, size=1000):
+        self.interval = interval
+        self.size = size
+        self._deltas = {}
+        # Changes being written by a flush, until its transaction commits.
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def add(self, buckets):
+        """
+        Merge bucket changes into the buffer, waking the background
+        thread to flush it straight away if it has grown beyond its size
+        limit.
+        """
+        self._lock.acquire()
+        try:
+            self._merge(buckets)
+            if len(self._deltas) >= self.size:
+                if self._timer is None or self._timer.interval:
+                    if self._timer is not None:
+                        self._timer.cancel()
+                    self._start_timer(0)
+            elif self._timer is None:
+                self._start_timer(self.interval)
+        finally:
+            self._lock.release()
+
+    def _merge(self, buckets):
+        for key, (score, num_votes) in buckets.items():
+            previous = self._deltas.get(key, (0, 0))
+            self._deltas[key] = (previous[0] + score, previous[1] + num_votes)
+
+    def _start_timer(self, interval):
+        self._timer = threading.Timer(interval, self._timed_flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _timed_flush(self):
+        self._lock.acquire()
+        try:
+            # A timer replaced by an earlier wake-up leaves its successor.
+            if self._timer is threading.current_thread():
+                self._timer = None
+        finally:
+            self._lock.release()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Error flushing buffered vote buckets')
+        finally:
+            # Each timer runs in a thread of its own, whose connections
+            # would otherwise never be closed.
+            for connection in connections.all():
+                connection.close()
+
+    def flush(self):
+        """
+        Write all buffered changes to the database in a transaction of
+        their own, so it must not be called from within another one. If
+        writing fails, the changes are put back into the buffer and the
+        error raised.
+
+        Returns the number of buckets written.
+        """
+        from voting.models import VoteBucket
+        self._flush_lock.acquire()
+        try:
+            self._lock.acquire()
+            try:
+                deltas, self._deltas = self._deltas, {}
+                self._flushing = deltas
+            finally:
+                self._lock.release()
+            if not deltas:
+                return 0
+            using = router.db_for_write(VoteBucket)
+            with transaction.commit_manually(using=using):
+                try:
+                    VoteBucket.objects.db_manager(using).apply_bucket_deltas(
+                        deltas)
+                    # Readers see the changes either as pending or in the
+                    # database, never both or neither.
+                    self._lock.acquire()
+                    try:
+                        transaction.commit(using=using)
+                        self._flushing = {}
+                    finally:
+                        self._lock.release()
+                except:
+                    transaction.rollback(using=using)
+                    self._lock.acquire()
+                    try:
+                        self._flushing = {}
+                        self._merge(deltas)
+                    finally:
+                        self._lock.release()
+                    raise
+            return len(deltas)
+        finally:
+            self._flush_lock.release()
+
+    def close(self):
+        """
+        Stop the background flush timer and write all buffered changes.
+        Called when the process exits.
+        """
+        self._lock.acquire()
+        try:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        finally:
+            self._lock.release()
+        self.flush()
+
+    def pending(self, content_type_id, object_ids=None):
+        """
+        Get the buffered changes for objects of the given content type,
+        or only the given object ids, as a dictionary keyed like the
+        buffer itself.
+        """
+        self._lock.acquire()
+        try:
+            pending = {}
+            for deltas in (self._flushing, self._deltas):
+                for key, (score, num_votes) in deltas.items():
+                    if key[0] == content_type_id and \
+                            (object_ids is None or key[1] in object_ids):
+                        previous = pending.get(key, (0, 0))
+                        pending[key] = (previous[0] + score,
+                                        previous[1] + num_votes)
+            return pending
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._deltas)
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+def is_enabled():
+    return getattr(settings, 'VOTING_WRITE_BEHIND', False)
+
+def get_buffer():
+    """
+    Get the process-wide buffer, creating it on the first call.
+    """
+    global _buffer
+    if _buffer is None:
+        _buffer_lock.acquire()
+        try:
+            if _buffer is None:
+                _buffer = DeltaBuffer(
+                    getattr(settings, 'VOTING_FLUSH_INTERVAL', 5),
+                    getattr(settings, 'VOTING_FLUSH_SIZE', 1000))
+                atexit.register(_buffer.close)
+        finally:
+            _buffer_lock.release()
+    return _buffer
+
+def pending(content_type_id, object_ids=None):
+    """
+    Get the changes buffered in this process for the given content type
+    and, optionally, object ids - an empty dictionary if write-behind
+    buffering is off.
+    """
+    if _buffer is None:
+        return {}
+    return _buffer.pending(content_type_id, object_ids)
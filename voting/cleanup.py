@@ -0,0 +1,108 @@
+"""
+Removal of votes whose objects no longer exist.
+
+Because ``Vote.object`` is a generic relation, deleting an object
+leaves its votes behind. The functions here find such orphaned votes
+with an anti-join against the voted model's table, and either delete
+them or move them into the ``ArchivedVote`` table, along with their
+vote buckets.
+"""
+from django.conf import settings
+from django.db import connections, transaction
+
+from voting import registry
+from voting.models import ArchivedVote, Vote, VoteBucket
+
+
+def find_orphaned_votes(model, after_id=0, limit=1000):
+    """
+    Get up to ``limit`` ids of votes on objects of ``model`` which no
+    longer exist, in primary key order, starting after ``after_id``.
+    """
+    content_type_id = registry.site.get_content_type_id(model)
+    votes = Vote.objects.for_content_type(content_type_id)
+    db = votes.writer().db
+    qn = connections[db].ops.quote_name
+    query = """
+    SELECT v.id
+    FROM %(votes)s v
+    LEFT OUTER JOIN %(target)s t ON t.%(pk)s = v.object_id
+    WHERE v.content_type_id = %%s AND v.id > %%s AND t.%(pk)s IS NULL
+    ORDER BY v.id
+    LIMIT %%s""" % {
+        'votes': qn(votes.model._meta.db_table),
+        'target': qn(model._meta.db_table),
+        'pk': qn(model._meta.pk.column),
+    }
+    cursor = connections[db].cursor()
+    cursor.execute(query, [content_type_id, after_id, limit])
+    return [row[0] for row in cursor.fetchall()]
+
+def purge_votes(vote_ids, archive=False, vote_model=Vote):
+    """
+    Delete the given votes, along with the vote buckets of the objects
+    they were cast on, copying the votes into ``ArchivedVote`` first if
+    ``archive`` is ``True``. ``vote_model`` is the model of the table
+    the votes are in.
+
+    Returns the number of votes removed.
+    """
+    if not vote_ids:
+        return 0
+    manager = vote_model._default_manager.writer()
+    with transaction.commit_on_success(using=manager.db):
+        votes = manager.filter(id__in=vote_ids)
+        rows = list(votes.values_list('content_type', 'object_id', 'user',
+                                      'vote', 'created', 'updated'))
+        if archive:
+            ArchivedVote.objects.bulk_create([
+                ArchivedVote(content_type_id=content_type_id,
+                             object_id=object_id, user_id=user_id,
+                             vote=vote, created=created, updated=updated)
+                for content_type_id, object_id, user_id, vote, created,
+                    updated in rows])
+        votes.delete()
+        objects = {}
+        for row in rows:
+            objects.setdefault(row[0], set()).add(row[1])
+        for content_type_id, object_ids in objects.items():
+            VoteBucket.objects.filter(content_type__pk=content_type_id,
+                                      object_id__in=object_ids).delete()
+    return len(rows)
+
+def purge_orphaned_votes(model, archive=False, batch_size=1000):
+    """
+    Remove all votes on deleted objects of ``model``, one batch at a
+    time, archiving them if ``archive`` is ``True``.
+
+    Returns the number of votes removed.
+    """
+    vote_model = Vote.objects.for_content_type(
+        registry.site.get_content_type_id(model)).model
+    total, after_id = 0, 0
+    while True:
+        vote_ids = find_orphaned_votes(model, after_id, batch_size)
+        if not vote_ids:
+            break
+        total += purge_votes(vote_ids, archive, vote_model)
+        after_id = vote_ids[-1]
+    return total
+
+def purge_votes_on_delete(sender, instance, **kwargs):
+    """
+    ``post_delete`` handler which removes the votes on deleted objects
+    of registered models, archiving them if
+    ``settings.VOTING_CLEANUP_ON_DELETE`` is ``'archive'``.
+    """
+    if sender in (Vote, VoteBucket, ArchivedVote) or \
+            not registry.site.is_registered(sender):
+        return
+    content_type_id = registry.site.get_content_type_id(sender)
+    votes = Vote.objects.for_content_type(content_type_id).writer()
+    vote_ids = list(votes.filter(
+        content_type__pk=content_type_id,
+        object_id=instance._get_pk_val(),
+    ).values_list('id', flat=True))
+    purge_votes(vote_ids,
+                getattr(settings, 'VOTING_CLEANUP_ON_DELETE', False) == 'archive',
+                votes.model)
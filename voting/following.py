@@ -0,0 +1,67 @@
+"""
+Followee lookups for "liked by people you follow".
+
+The voting app doesn't define a follow relation of its own.
+``settings.VOTING_FOLLOWEES`` names a function taking a user and
+returning the ids of the users they follow - preferably as a
+``values_list('...', flat=True)`` ``QuerySet``, so the lookup runs as a
+subquery joined to the votes in one indexed query. For example, with
+django-relationships::
+
+    def get_followees(user):
+        return user.relationships.following().values_list('pk', flat=True)
+
+If ``settings.VOTING_FOLLOWEES_CACHE_TIMEOUT`` is set, followee ids are
+instead cached as a set for that many seconds, and votes are matched
+against the cached set. Call ``clear_followees`` when a user follows or
+unfollows someone to drop their cached set early.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.importlib import import_module
+
+FOLLOWEES_KEY = 'voting:followees:%s'
+
+_function = None
+
+def _get_function():
+    global _function
+    if _function is None:
+        path = getattr(settings, 'VOTING_FOLLOWEES', None)
+        if not path:
+            raise ImproperlyConfigured('VOTING_FOLLOWEES must name a '
+                                       'function to look up followees.')
+        module_name, function_name = path.rsplit('.', 1)
+        try:
+            module = import_module(module_name)
+        except ImportError, e:
+            raise ImproperlyConfigured('Error importing followee lookup '
+                                       '%s: "%s"' % (path, e))
+        try:
+            _function = getattr(module, function_name)
+        except AttributeError:
+            raise ImproperlyConfigured('Module %s does not define %s.'
+                                       % (module_name, function_name))
+    return _function
+
+def get_followees(user):
+    """
+    Get the ids of the users ``user`` follows, as returned by the
+    ``VOTING_FOLLOWEES`` function or as a cached ``frozenset``.
+    """
+    timeout = getattr(settings, 'VOTING_FOLLOWEES_CACHE_TIMEOUT', None)
+    if timeout is None:
+        return _get_function()(user)
+    key = FOLLOWEES_KEY % user.pk
+    followees = cache.get(key)
+    if followees is None:
+        followees = frozenset(_get_function()(user))
+        cache.set(key, followees, timeout)
+    return followees
+
+def clear_followees(user):
+    """
+    Drop the cached followee ids of ``user``.
+    """
+    cache.delete(FOLLOWEES_KEY % user.pk)
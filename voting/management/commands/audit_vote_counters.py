@@ -0,0 +1,73 @@
+import json
+import os
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voting import audit, schema
+from voting.models import get_vote_models
+
+
+class Command(BaseCommand):
+    help = ('Compares the num_likes and num_dislikes counters of the '
+            'authors of voted objects with the votes table, reporting and '
+            'optionally repairing those which differ.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--repair', action='store_true', dest='repair',
+                    default=False, help='Correct the counters which differ.'),
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=1000,
+                    help='Number of authors to audit per query.'),
+        make_option('--batch-size', dest='batch_size', type='int',
+                    default=500,
+                    help='Number of counters to repair per transaction.'),
+        make_option('--checkpoint', dest='checkpoint',
+                    help='File recording progress, so an interrupted audit '
+                         'resumes where it stopped.'),
+    )
+
+    def handle(self, *args, **options):
+        counted = audit.get_counted_models()
+        if not counted:
+            raise CommandError('No registered model has an author with '
+                               'num_likes and num_dislikes fields.')
+        for model in get_vote_models():
+            if schema.get_missing_indexes(model):
+                raise CommandError('%s lacks the indexes auditing relies on; '
+                                   'run upgrade_votes first.'
+                                   % model._meta.db_table)
+        checkpoint = options['checkpoint']
+        progress = {}
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                progress = json.load(f)
+        verbosity = int(options['verbosity'])
+
+        for holder in sorted(counted, key=lambda model: model._meta.db_table):
+            label = '%s.%s' % (holder._meta.app_label,
+                               holder._meta.object_name)
+            checked = differ = repaired = 0
+            for last_id, num_checked, diffs in audit.iter_counter_diffs(
+                    holder, options['chunk_size'], progress.get(label, 0)):
+                checked += num_checked
+                differ += len(diffs)
+                if verbosity > 0:
+                    for pk, num_likes, likes, num_dislikes, dislikes in diffs:
+                        self.stdout.write(
+                            '%s %s: likes %d -> %d, dislikes %d -> %d\n' % (
+                                label, pk, num_likes, likes, num_dislikes,
+                                dislikes))
+                if options['repair']:
+                    repaired += audit.repair_counters(holder, diffs,
+                                                      options['batch_size'])
+                if checkpoint:
+                    progress[label] = last_id
+                    with open(checkpoint, 'w') as f:
+                        json.dump(progress, f)
+            summary = '%s: %d checked, %d differ' % (label, checked, differ)
+            if options['repair']:
+                summary += ', %d repaired' % repaired
+            self.stdout.write(summary + '\n')
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
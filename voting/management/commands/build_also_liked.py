@@ -0,0 +1,53 @@
+import datetime
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voting import registry, recommend
+from voting.management.utils import get_model_for_label
+
+
+class Command(BaseCommand):
+    help = ('Builds the "also liked" recommendations for the given models '
+            'or all models registered for voting.')
+    args = '[app_label.ModelName ...]'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--incremental', action='store_true', dest='incremental',
+                    default=False,
+                    help='Only recount the users who voted since the last '
+                         'run. Requires VOTING_ALSO_LIKED_DIR.'),
+        make_option('--max-age', dest='max_age', type='float', default=None,
+                    help='With --incremental, rebuild from scratch if the '
+                         'last full build is older than this many days.'),
+        make_option('--top', dest='top', type='int', default=10,
+                    help='Number of recommendations to keep per object.'),
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=50000,
+                    help='Number of votes to read per query.'),
+    )
+
+    def handle(self, *labels, **options):
+        if recommend.numpy is None or recommend.sparse is None:
+            raise CommandError('NumPy and SciPy are required to build '
+                               'recommendations.')
+        if labels:
+            models = [get_model_for_label(label) for label in labels]
+        else:
+            models = registry.site.get_models()
+
+        for model in models:
+            started = time.time()
+            index = recommend.AlsoLikedIndex(model, options['top'],
+                                             options['chunk_size'])
+            if options['incremental']:
+                max_age = options['max_age']
+                if max_age is not None:
+                    max_age = datetime.timedelta(days=max_age)
+                count = index.update(max_age)
+            else:
+                count = index.build()
+            self.stdout.write('%s.%s: %d objects indexed in %.1fs\n' % (
+                model._meta.app_label, model._meta.object_name, count,
+                time.time() - started))
@@ -0,0 +1,38 @@
+import datetime
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voting import analytics
+from voting.management.utils import parse_datetime_option
+from voting.utils import now
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the unique voter sketches for a range of days from '
+            'the votes cast or changed during them, by default yesterday '
+            'and today.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--since', dest='since',
+                    help='First day to rebuild, as YYYY-MM-DD.'),
+        make_option('--until', dest='until',
+                    help='Day to stop before, as YYYY-MM-DD. Defaults to '
+                         'tomorrow.'),
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=10000,
+                    help='Number of votes to read per query.'),
+    )
+
+    def handle(self, *args, **options):
+        today = now().date()
+        since = parse_datetime_option(options['since'], 'since')
+        until = parse_datetime_option(options['until'], 'until')
+        since = since and since.date() or today - datetime.timedelta(days=1)
+        until = until and until.date() or today + datetime.timedelta(days=1)
+        if since >= until:
+            raise CommandError('--since must be before --until.')
+        count = analytics.build_sketches(since, until, options['chunk_size'])
+        if int(options['verbosity']) > 0:
+            self.stdout.write('%d sketches written for %s to %s.\n' % (
+                count, since, until - datetime.timedelta(days=1)))
@@ -0,0 +1,56 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from voting import registry
+from voting.cleanup import find_orphaned_votes, purge_orphaned_votes
+from voting.management.utils import get_model_for_label
+
+
+class Command(BaseCommand):
+    help = ('Removes votes on objects which have been deleted, for the '
+            'given models or all models registered for voting.')
+    args = '[app_label.ModelName ...]'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--archive', action='store_true', dest='archive',
+                    default=False,
+                    help='Move orphaned votes into the archive table '
+                         'instead of deleting them.'),
+        make_option('--dry-run', action='store_true', dest='dry_run',
+                    default=False,
+                    help='Only count orphaned votes.'),
+        make_option('--batch-size', dest='batch_size', type='int',
+                    default=1000,
+                    help='Number of votes to remove per transaction.'),
+    )
+
+    def handle(self, *labels, **options):
+        if labels:
+            models = [get_model_for_label(label) for label in labels]
+        else:
+            models = registry.site.get_models()
+
+        total = 0
+        for model in models:
+            if options['dry_run']:
+                count, after_id = 0, 0
+                while True:
+                    vote_ids = find_orphaned_votes(model, after_id,
+                                                   options['batch_size'])
+                    if not vote_ids:
+                        break
+                    count += len(vote_ids)
+                    after_id = vote_ids[-1]
+            else:
+                count = purge_orphaned_votes(model, options['archive'],
+                                             options['batch_size'])
+            total += count
+            self.stdout.write('%s.%s: %d orphaned votes\n' % (
+                model._meta.app_label, model._meta.object_name, count))
+        if options['dry_run']:
+            self.stdout.write('%d orphaned votes found.\n' % total)
+        elif options['archive']:
+            self.stdout.write('%d orphaned votes archived.\n' % total)
+        else:
+            self.stdout.write('%d orphaned votes deleted.\n' % total)
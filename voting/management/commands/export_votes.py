@@ -0,0 +1,62 @@
+import csv
+import json
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voting.management.utils import get_content_type_ids, open_stream, \
+    parse_datetime_option
+from voting.models import Vote
+
+COLUMNS = ('id', 'content_type_id', 'object_id', 'user_id', 'vote', 'created')
+
+
+class Command(BaseCommand):
+    help = ('Streams votes to a CSV or JSON Lines file, reading them in '
+            'chunks so memory use stays flat however large the table is.')
+    args = '[app_label.ModelName ...]'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format', dest='format', default='csv',
+                    help='Output format: "csv" or "jsonl".'),
+        make_option('--output', dest='output', default='-',
+                    help='File to write to, or "-" for standard output.'),
+        make_option('--gzip', action='store_true', dest='gzip',
+                    default=False, help='Gzip compress the output.'),
+        make_option('--user', dest='user', type='int',
+                    help='Only export votes made by the user with this id.'),
+        make_option('--since', dest='since',
+                    help='Only export votes cast at or after this time.'),
+        make_option('--until', dest='until',
+                    help='Only export votes cast before this time.'),
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=1000,
+                    help='Number of votes to read per query.'),
+    )
+
+    def handle(self, *labels, **options):
+        if options['format'] not in ('csv', 'jsonl'):
+            raise CommandError('--format must be "csv" or "jsonl".')
+        rows = Vote.objects.iter_votes(
+            content_type_ids=get_content_type_ids(labels),
+            user=options['user'],
+            since=parse_datetime_option(options['since'], 'since'),
+            until=parse_datetime_option(options['until'], 'until'),
+            chunk_size=options['chunk_size'],
+        )
+
+        stream = open_stream(options['output'], 'wb', options['gzip'])
+        try:
+            if options['format'] == 'csv':
+                writer = csv.writer(stream)
+                writer.writerow(COLUMNS)
+                for row in rows:
+                    writer.writerow(row[:-1] + (row[-1].isoformat(),))
+            else:
+                for row in rows:
+                    record = dict(zip(COLUMNS, row))
+                    record['created'] = record['created'].isoformat()
+                    stream.write(json.dumps(record, sort_keys=True) + '\n')
+        finally:
+            if options['output'] != '-' or options['gzip']:
+                stream.close()
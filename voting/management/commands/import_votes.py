@@ -0,0 +1,67 @@
+import csv
+import json
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from voting.management.utils import open_stream
+from voting.models import Vote
+
+
+class Command(BaseCommand):
+    help = ('Streams votes from a CSV or JSON Lines file, as written by '
+            'export_votes, into the votes table in batches.')
+    args = '<file>'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format', dest='format', default='csv',
+                    help='Input format: "csv" or "jsonl".'),
+        make_option('--gzip', action='store_true', dest='gzip',
+                    default=False, help='Read gzip compressed input.'),
+        make_option('--batch-size', dest='batch_size', type='int',
+                    default=500,
+                    help='Number of votes to write per transaction.'),
+    )
+
+    def handle(self, path='-', **options):
+        if options['format'] not in ('csv', 'jsonl'):
+            raise CommandError('--format must be "csv" or "jsonl".')
+        stream = open_stream(path, 'rb', options['gzip'] or
+                             path.endswith('.gz'))
+        try:
+            if options['format'] == 'csv':
+                records = csv.DictReader(stream)
+            else:
+                records = (json.loads(line) for line in stream
+                           if line.strip())
+            total, changed = 0, 0
+            batch = []
+            for record in records:
+                try:
+                    batch.append((
+                        int(record['content_type_id']),
+                        int(record['object_id']),
+                        int(record['user_id']),
+                        int(record['vote']),
+                        parse_datetime(record.get('created') or '') or None,
+                    ))
+                except (KeyError, ValueError), e:
+                    raise CommandError('Invalid vote record %d: %s'
+                                       % (total + len(batch) + 1, e))
+                if len(batch) >= options['batch_size']:
+                    changed += self.write(batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                changed += self.write(batch)
+                total += len(batch)
+        finally:
+            if path != '-':
+                stream.close()
+        self.stdout.write('Imported %d votes, %d of which changed existing '
+                          'data.\n' % (total, changed))
+
+    def write(self, batch):
+        results = Vote.objects.record_votes_in_bulk(batch)
+        return len([1 for old_vote, vote in results if old_vote != vote])
@@ -0,0 +1,105 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+
+from voting import registry
+from voting.management.utils import get_model_for_label
+from voting.models import PARTITION_MODELS, Vote, VoteBucket
+
+
+class Command(BaseCommand):
+    help = ('Moves the votes on the given models, or all models listed in '
+            'VOTING_PARTITIONS, out of the votes table into their own '
+            'tables. Run syncdb first to create the tables.')
+    args = '[app_label.ModelName ...]'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--reverse', action='store_true', dest='reverse',
+                    default=False,
+                    help='Move votes from their own tables back into the '
+                         'votes table, before removing the models from '
+                         'VOTING_PARTITIONS.'),
+        make_option('--batch-size', dest='batch_size', type='int',
+                    default=1000,
+                    help='Number of votes to move per transaction.'),
+    )
+
+    def handle(self, *labels, **options):
+        if not labels:
+            labels = PARTITION_MODELS.keys()
+        for label in labels:
+            get_model_for_label(label)
+            if label not in PARTITION_MODELS:
+                raise CommandError('%s is not listed in VOTING_PARTITIONS.'
+                                   % label)
+        for label in labels:
+            source, target = Vote, PARTITION_MODELS[label]
+            if options['reverse']:
+                source, target = target, source
+            ctype_id = registry.site.get_content_type_id(
+                get_model_for_label(label))
+            count = move_votes(source, target, ctype_id,
+                               options['batch_size'])
+            self.stdout.write('%s: %d votes moved from %s to %s\n' % (
+                label, count, source._meta.db_table, target._meta.db_table))
+
+def move_votes(source, target, content_type_id, batch_size):
+    """
+    Move the votes on a content type from the table of vote model
+    ``source`` to that of ``target``, one batch per transaction.
+    Returns the number of votes moved.
+
+    Votes are routed to ``target`` as soon as the model is listed in
+    ``VOTING_PARTITIONS``, so a user may have voted again in ``target``
+    on an object whose vote hasn't been moved yet. Of two such votes the
+    more recently updated is kept, and the other one's score taken back
+    out of the buckets, where both were counted.
+    """
+    db = source._default_manager.writer().db
+    # Every column but the primary key, written as is, so that the
+    # auto_now ``updated`` column keeps its value.
+    fields = [f for f in target._meta.local_fields
+              if not isinstance(f, models.AutoField)]
+    votes = source._default_manager.db_manager(db).filter(
+        content_type__pk=content_type_id).order_by('id')
+    targets = target._default_manager.db_manager(db).filter(
+        content_type__pk=content_type_id)
+    total = 0
+    while True:
+        with transaction.commit_on_success(using=db):
+            batch = list(votes[:batch_size])
+            if not batch:
+                break
+            existing = dict([((v.user_id, v.object_id), v) for v in
+                             targets.filter(
+                                 object_id__in=set([v.object_id for v in batch]),
+                                 user__pk__in=set([v.user_id for v in batch]))])
+            moves, dropped, replaced = [], [], []
+            for vote in batch:
+                other = existing.get((vote.user_id, vote.object_id))
+                if other is None:
+                    moves.append(vote)
+                elif other.updated >= vote.updated:
+                    dropped.append(vote)
+                else:
+                    moves.append(vote)
+                    dropped.append(other)
+                    replaced.append(other.id)
+            if replaced:
+                targets.filter(id__in=replaced).delete()
+            if moves:
+                target._base_manager._insert(
+                    [target(**dict([(f.attname, getattr(vote, f.attname))
+                                    for f in fields])) for vote in moves],
+                    fields=fields, using=db, raw=True)
+            source._default_manager.db_manager(db).filter(
+                id__in=[vote.id for vote in batch]).delete()
+            deltas = {}
+            for vote in dropped:
+                key = (content_type_id, vote.object_id, vote.created)
+                score, num_votes = deltas.get(key, (0, 0))
+                deltas[key] = (score - vote.vote, num_votes - 1)
+            VoteBucket.objects.db_manager(db).record_deltas(deltas)
+        total += len(batch)
+    return total
@@ -0,0 +1,50 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voting import ranking, registry
+from voting.management.utils import get_model_for_label
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the net, ratio, Wilson and decayed rankings of every '
+            'voted object of the given models, or all models registered '
+            'for voting.')
+    args = '[app_label.ModelName ...]'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=10000,
+                    help='Number of objects to read and score at a time.'),
+        make_option('--batch-size', dest='batch_size', type='int',
+                    default=1000,
+                    help='Number of rankings to write per transaction.'),
+        make_option('--gravity', dest='gravity', type='float', default=1.8,
+                    help='How quickly the decayed ranking falls with age.'),
+    )
+
+    def handle(self, *labels, **options):
+        if ranking.numpy is None:
+            raise CommandError('NumPy is required to compute rankings.')
+        if labels:
+            models = [get_model_for_label(label) for label in labels]
+        else:
+            models = registry.site.get_models()
+        verbosity = int(options['verbosity'])
+
+        for model in models:
+            name = '%s.%s' % (model._meta.app_label, model._meta.object_name)
+            started = time.time()
+
+            def progress(count):
+                if verbosity > 1:
+                    self.stdout.write('%s: %d objects ranked (%.1fs)\n' % (
+                        name, count, time.time() - started))
+
+            count = ranking.rerank(model, options['chunk_size'],
+                                   options['batch_size'], options['gravity'],
+                                   progress=progress)
+            if verbosity > 0:
+                self.stdout.write('%s: %d objects ranked in %.1fs\n' % (
+                    name, count, time.time() - started))
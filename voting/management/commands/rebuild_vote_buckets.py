@@ -0,0 +1,102 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+
+from voting import buffer
+from voting.management.utils import get_content_type_ids
+from voting.models import Vote, VoteBucket, get_vote_models
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the hourly and daily vote buckets used for '
+            'time-windowed scores from the votes table.')
+    args = '[app_label.ModelName ...]'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=500,
+                    help='Number of objects rebuilt per transaction.'),
+    )
+
+    def handle(self, *labels, **options):
+        chunk_size = options['chunk_size']
+        ctype_ids = get_content_type_ids(labels)
+        if buffer.is_enabled():
+            # Deltas still buffered for votes already in the table would
+            # otherwise be applied on top of the rebuilt buckets.
+            buffer.get_buffer().flush()
+
+        using = router.db_for_write(VoteBucket)
+        buckets = VoteBucket.objects.db_manager(using)
+        if not ctype_ids:
+            ctype_ids = set(buckets.order_by().values_list(
+                'content_type', flat=True).distinct())
+            for vote_model in get_vote_models():
+                ctype_ids.update(vote_model._default_manager.db_manager(
+                    using).order_by().values_list(
+                    'content_type', flat=True).distinct())
+        total = 0
+        for ctype_id in sorted(ctype_ids):
+            votes = Vote.objects.for_content_type(ctype_id).db_manager(
+                using).filter(content_type__pk=ctype_id)
+            last_id = None
+            while True:
+                object_ids = votes.order_by('object_id').values_list(
+                    'object_id', flat=True).distinct()
+                if last_id is not None:
+                    object_ids = object_ids.filter(object_id__gt=last_id)
+                object_ids = list(object_ids[:chunk_size])
+                # The last chunk is open ended, so it also clears the
+                # buckets of objects beyond the last one voted on.
+                if len(object_ids) < chunk_size:
+                    next_id = None
+                else:
+                    next_id = object_ids[-1]
+                total += self.rebuild_range(using, ctype_id, votes, last_id,
+                                            next_id)
+                if int(options['verbosity']) > 1:
+                    self.stdout.write('%d votes processed\n' % total)
+                if next_id is None:
+                    break
+                last_id = next_id
+        self.stdout.write('Rebuilt buckets from %d votes.\n' % total)
+
+    def rebuild_range(self, using, ctype_id, votes, after_id, until_id):
+        """
+        Delete and rebuild the buckets of the objects of a content type
+        with ids after ``after_id`` up to ``until_id`` - either may be
+        ``None`` for no bound - from ``votes``, returning the number of
+        votes counted.
+
+        Each range is rebuilt in a transaction of its own, holding a
+        lock which record_vote waits for before applying its deltas, so
+        votes cast meanwhile are counted once: by the rebuild if they
+        were committed before the range was read, otherwise by
+        record_vote. Votes are only held up while one range is rebuilt.
+        """
+        with transaction.commit_on_success(using=using):
+            connection = connections[using]
+            if connection.vendor == 'postgresql':
+                connection.cursor().execute(
+                    'LOCK TABLE %s IN SHARE ROW EXCLUSIVE MODE'
+                    % connection.ops.quote_name(VoteBucket._meta.db_table))
+            buckets = VoteBucket.objects.db_manager(using).filter(
+                content_type__pk=ctype_id)
+            if after_id is not None:
+                buckets = buckets.filter(object_id__gt=after_id)
+                votes = votes.filter(object_id__gt=after_id)
+            if until_id is not None:
+                buckets = buckets.filter(object_id__lte=until_id)
+                votes = votes.filter(object_id__lte=until_id)
+            buckets.delete()
+
+            deltas, count = {}, 0
+            for object_id, vote, created in votes.values_list(
+                    'object_id', 'vote', 'created').iterator():
+                key = (ctype_id, object_id, created)
+                score, num_votes = deltas.get(key, (0, 0))
+                deltas[key] = (score + vote, num_votes + 1)
+                count += 1
+            VoteBucket.objects.db_manager(using).record_deltas(deltas)
+        return count
@@ -0,0 +1,41 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voting import snapshot
+from voting.management.utils import get_content_type_ids, \
+    parse_datetime_option
+
+
+class Command(BaseCommand):
+    help = ('Writes votes to a columnar binary snapshot which offline jobs '
+            'can memory-map with voting.snapshot.load_snapshot.')
+    args = '[app_label.ModelName ...]'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--output', dest='output',
+                    help='File to write the snapshot to.'),
+        make_option('--since', dest='since',
+                    help='Only include votes cast at or after this time.'),
+        make_option('--until', dest='until',
+                    help='Only include votes cast before this time.'),
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=10000,
+                    help='Number of votes to read per query.'),
+    )
+
+    def handle(self, *labels, **options):
+        if not options['output']:
+            raise CommandError('--output is required.')
+        started = time.time()
+        count = snapshot.export_snapshot(
+            options['output'],
+            content_type_ids=get_content_type_ids(labels),
+            since=parse_datetime_option(options['since'], 'since'),
+            until=parse_datetime_option(options['until'], 'until'),
+            chunk_size=options['chunk_size'],
+        )
+        if int(options['verbosity']) > 0:
+            self.stdout.write('%d votes written to %s in %.1fs\n' % (
+                count, options['output'], time.time() - started))
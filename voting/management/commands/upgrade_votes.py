@@ -0,0 +1,70 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from voting import schema
+from voting.management.utils import parse_datetime_option
+from voting.models import VoteRanking, get_vote_models
+from voting.utils import now
+
+
+class Command(BaseCommand):
+    help = ('Adds the created and updated columns, and the indexes missing '
+            'from tables created by earlier versions of the voting app.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--timestamp', dest='timestamp',
+                    help='Time to give existing votes; defaults to now.'),
+        make_option('--batch-size', dest='batch_size', type='int',
+                    default=10000,
+                    help='Number of votes to fill in per transaction.'),
+        make_option('--print-sql', action='store_true', dest='print_sql',
+                    default=False,
+                    help='Print the SQL instead of running it.'),
+    )
+
+    def handle(self, *args, **options):
+        timestamp = parse_datetime_option(options['timestamp'],
+                                          'timestamp') or now()
+        verbosity = int(options['verbosity'])
+        for model in get_vote_models() + [VoteRanking]:
+            table = model._meta.db_table
+            columns = []
+            if model is not VoteRanking:
+                columns = schema.get_missing_columns(model)
+            if columns:
+                self.add_columns(model, columns, timestamp, options)
+            indexes = schema.get_missing_indexes(model)
+            if indexes:
+                if options['print_sql']:
+                    for name, statement in indexes:
+                        self.stdout.write('%s;\n' % statement)
+                else:
+                    schema.create_indexes(model)
+            if verbosity > 0 and not options['print_sql']:
+                added = columns + [name for name, statement in indexes]
+                if added:
+                    self.stdout.write('%s: added %s\n' % (table,
+                                                          ', '.join(added)))
+                else:
+                    self.stdout.write('%s: up to date\n' % table)
+
+    def add_columns(self, model, columns, timestamp, options):
+        if options['print_sql']:
+            add, fill, finish = schema.get_upgrade_sql(model, columns)
+            for statement in add:
+                self.stdout.write('%s;\n' % statement)
+            for statement in fill:
+                self.stdout.write('%s;\n' % (
+                    statement % ("'%s'" % timestamp.isoformat(' '),)))
+            for statement in finish:
+                self.stdout.write('%s;\n' % statement)
+            return
+
+        def progress(last_id):
+            if int(options['verbosity']) > 1:
+                self.stdout.write('%s: filled up to id %d\n' % (
+                    model._meta.db_table, last_id))
+
+        schema.upgrade_votes(model, timestamp, options['batch_size'],
+                             progress=progress)
@@ -0,0 +1,67 @@
+import datetime
+import gzip
+import sys
+
+from django.core.management.base import CommandError
+from django.db import models
+from django.utils.dateparse import parse_date, parse_datetime
+
+from voting import registry
+
+
+def get_model_for_label(label):
+    """
+    Get the model class for an ``app_label.ModelName`` label, raising
+    ``CommandError`` if there is no such model.
+    """
+    try:
+        app_label, model_name = label.split('.')
+    except ValueError:
+        raise CommandError('Expected app_label.ModelName, got %r.' % label)
+    model = models.get_model(app_label, model_name)
+    if model is None:
+        raise CommandError('Unknown model %r.' % label)
+    return model
+
+def get_content_type_ids(labels):
+    """
+    Get the content type ids for a list of ``app_label.ModelName``
+    labels, raising ``CommandError`` if any model isn't registered for
+    voting.
+    """
+    try:
+        return [registry.site.get_content_type_id(get_model_for_label(label))
+                for label in labels]
+    except registry.NotRegistered, e:
+        raise CommandError(str(e))
+
+def parse_datetime_option(value, name):
+    """
+    Parse an ISO 8601 date or datetime given for option ``name``.
+    """
+    if value is None:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        parsed = parse_date(value)
+        if parsed is not None:
+            parsed = datetime.datetime.combine(parsed, datetime.time())
+    if parsed is None:
+        raise CommandError('--%s must be an ISO 8601 date or datetime, got '
+                           '%r.' % (name, value))
+    return parsed
+
+def open_stream(path, mode, compress=False):
+    """
+    Open ``path`` for reading or writing, using standard input or
+    output for ``'-'``, and transparently gzip compressing the stream
+    if ``compress`` is ``True``.
+    """
+    if path == '-':
+        stream = 'r' in mode and sys.stdin or sys.stdout
+        if compress:
+            return gzip.GzipFile(fileobj=stream, mode=mode)
+        return stream
+    if compress:
+        return gzip.open(path, mode)
+    return open(path, mode)
@@ -1,5 +1,10 @@
+import datetime
+
 from django.conf import settings
-from django.db import connection, models
+from django.db import IntegrityError, connections, models, router, \
+    transaction
+from django.db.models import F, Q, Sum
+from django.db.models.query import QuerySet
 
 try:
     from django.db.models.sql.aggregates import Aggregate
@@ -8,7 +13,10 @@ except ImportError:
 else:
     supports_aggregates = True
 
-from django.contrib.contenttypes.models import ContentType
+from voting import analytics, buffer, following, recent, registry, \
+    replicas
+from voting.utils import bump_vote_version, ceil_day, floor_day, \
+    floor_hour, now
 
 if supports_aggregates:
     class CoalesceWrapper(Aggregate):
@@ -35,35 +43,111 @@ if supports_aggregates:
         sql_function = 'COUNT'
 
 
+# Fields of each row yielded by ``VoteManager.iter_votes``.
+EXPORT_FIELDS = ('id', 'content_type', 'object_id', 'user', 'vote', 'created')
+
+# Maximum number of rows written by a single query when writing votes
+# in bulk.
+BULK_CHUNK_SIZE = 100
+
+def _score_dict(score, num_votes):
+    score, num_votes = int(score), int(num_votes)
+    return {
+        'score': score,
+        'num_votes': num_votes,
+        'num_up_votes': (num_votes+score)/2,
+        'num_down_votes': (-1)*(num_votes-score)/2,
+    }
+
+
+def vote_delta(old_vote, new_vote):
+    """
+    Get the ``(score, num_votes)`` change caused by replacing
+    ``old_vote`` with ``new_vote``, where ``0`` stands for no vote.
+    """
+    return new_vote - old_vote, int(new_vote != 0) - int(old_vote != 0)
+
+
+def _change_deltas(changes):
+    """
+    Sum the ``(score, num_votes)`` changes of ``_votes_changed`` style
+    vote changes by ``(content_type_id, object_id, created)``.
+    """
+    deltas = {}
+    for content_type_id, object_id, user_id, old_vote, new_vote, \
+            created in changes:
+        key = (content_type_id, object_id, created)
+        score, num_votes = vote_delta(old_vote, new_vote)
+        previous = deltas.get(key, (0, 0))
+        deltas[key] = (previous[0] + score, previous[1] + num_votes)
+    return deltas
+
+
 class VoteManager(models.Manager):
-    def get_score(self, obj):
+    def reader(self, user=None):
+        """
+        Get a manager which reads from the database vote reads made on
+        behalf of ``user`` should go to - a read replica if one is
+        configured and the user hasn't voted very recently.
+        """
+        if self._db is not None:
+            return self
+        return self.db_manager(replicas.get_read_database(self.model, user))
+
+    def writer(self):
+        """
+        Get a manager which reads from the database votes are written
+        to, for reads which must not lag behind writes.
+        """
+        if self._db is not None:
+            return self
+        return self.db_manager(router.db_for_write(self.model))
+
+    def for_content_type(self, content_type_id):
+        """
+        Get a manager for the table holding the votes on the given
+        content type - its own table if it is listed in
+        ``settings.VOTING_PARTITIONS``, otherwise the votes table -
+        reading from the same database as this one.
+        """
+        from voting.models import get_vote_model
+        model = get_vote_model(content_type_id)
+        if model is self.model:
+            return self
+        return model._default_manager.db_manager(self._db)
+
+    def get_score(self, obj, since=None, until=None):
         """
         Get a dictionary containing the total score for ``obj`` and
         the number of votes it's received.
+
+        If ``since`` or ``until`` are given, only votes first cast
+        within that window are counted. Windows are read from hourly
+        and daily vote buckets, to a resolution of one hour.
         """
-        ctype = ContentType.objects.get_for_model(obj)
-        result = self.filter(object_id=obj._get_pk_val(),
-                             content_type=ctype).extra(
+        ctype_id = registry.site.get_content_type_id(obj)
+        reader = self.for_content_type(ctype_id).reader()
+        if since is not None or until is not None:
+            scores = reader._window_scores(ctype_id, [obj._get_pk_val()],
+                                           since, until)
+            return _score_dict(*scores.get(obj._get_pk_val(), (0, 0)))
+        result = reader.filter(object_id=obj._get_pk_val(),
+                               content_type__pk=ctype_id).extra(
             select={
                 'score': 'COALESCE(SUM(vote), 0)',
                 'num_votes': 'COALESCE(COUNT(vote), 0)',
         }).values_list('score', 'num_votes')[0]
 
-        return {
-            'score': int(result[0]),
-            'num_votes': int(result[1]),
-            'num_up_votes': (int(result[1])+int(result[0]))/2,
-            'num_down_votes': (-1)*(int(result[1])-int(result[0]))/2,
-        }
+        return _score_dict(result[0], result[1])
 
     def get_voters(self, obj):
         """
         Get a dictionary containing the total score for ``obj`` and
         the number of votes it's received.
         """
-        ctype = ContentType.objects.get_for_model(obj)
-        result = self.filter(object_id=obj._get_pk_val(),
-                             content_type=ctype)
+        ctype_id = registry.site.get_content_type_id(obj)
+        result = self.for_content_type(ctype_id).reader().filter(
+            object_id=obj._get_pk_val(), content_type__pk=ctype_id)
         voters =[] 
         for voteObject in result:
            voters.append(voteObject.user)
@@ -77,9 +161,10 @@ class VoteManager(models.Manager):
         Get a dictionary containing the total score for ``obj`` and
         the number of votes it's received.
         """
-        ctype = ContentType.objects.get_for_model(obj)
-        result = self.filter(object_id=obj._get_pk_val(),
-                             content_type=ctype).order_by('-id')
+        ctype_id = registry.site.get_content_type_id(obj)
+        result = self.for_content_type(ctype_id).reader().filter(
+            object_id=obj._get_pk_val(),
+            content_type__pk=ctype_id).order_by('-id')
         
         voteObjs = result[sIndex:lIndex]
 
@@ -91,21 +176,113 @@ class VoteManager(models.Manager):
             'voters':voters,
         }
 
-    def get_scores_in_bulk(self, objects):
+    def get_recent_voters_in_bulk(self, objects):
+        """
+        Get a dictionary mapping object ids to lists of ``{'id': ...,
+        'username': ...}`` dictionaries for the most recent upvoters of
+        each object, most recent first, as kept by ``voting.recent``.
+        """
+        if not objects:
+            return {}
+        ctype_id = registry.site.get_content_type_id(objects[0])
+        previews = recent.get_recent_voters(
+            [(ctype_id, obj._get_pk_val()) for obj in objects])
+        return dict([(object_id, preview) for (_, object_id), preview
+                     in previews.items()])
+
+    def get_followed_voters_in_bulk(self, objects, viewer, limit=3,
+                                    followees=None):
+        """
+        Get a dictionary mapping object ids to ``{'count': ...,
+        'voters': [...]}`` dictionaries giving, for each object, the
+        number of users ``viewer`` follows who upvoted it and up to
+        ``limit`` of them as ``{'id': ..., 'username': ...}``
+        dictionaries, most recent first.
+
+        ``followees`` is a ``QuerySet`` or collection of the ids of the
+        users ``viewer`` follows, looked up through ``voting.following``
+        by default. A ``QuerySet`` is joined to the votes as a subquery,
+        so one query is made for the whole list of objects.
+        """
+        if not objects:
+            return {}
+        result = dict([(obj._get_pk_val(), {'count': 0, 'voters': []})
+                       for obj in objects])
+        if followees is None:
+            followees = following.get_followees(viewer)
+        ctype_id = registry.site.get_content_type_id(objects[0])
+        queryset = self.for_content_type(ctype_id).reader(viewer).filter(
+            content_type__pk=ctype_id, object_id__in=result.keys(), vote=1)
+        if isinstance(followees, QuerySet):
+            # The follow relation is read from the same database.
+            followees = followees.using(queryset.db)
+        elif not followees:
+            return result
+        rows = queryset.filter(user__in=followees).order_by(
+            '-updated', '-id').values_list('object_id', 'user__id',
+                                           'user__username')
+        for object_id, user_id, username in rows:
+            followed = result[object_id]
+            followed['count'] += 1
+            if len(followed['voters']) < limit:
+                followed['voters'].append({'id': user_id,
+                                           'username': username})
+        return result
+
+    def get_scores_in_bulk(self, objects, since=None, until=None):
         """
         Get a dictionary mapping object ids to total score and number
         of votes for each object.
+
+        ``since`` and ``until`` restrict the votes counted as for
+        ``get_score``.
         """
         object_ids = [o._get_pk_val() for o in objects]
         if not object_ids:
             return {}
         
-        ctype = ContentType.objects.get_for_model(objects[0])
-        
+        ctype_id = registry.site.get_content_type_id(objects[0])
+        if since is not None or until is not None:
+            scores = self._window_scores(ctype_id, object_ids, since, until)
+            return dict([(object_id, _score_dict(score, num_votes))
+                         for object_id, (score, num_votes) in scores.items()
+                         if num_votes])
+        return self._scores_for_ids(ctype_id, object_ids)
+
+    def _window_scores(self, content_type_id, object_ids, since, until):
+        """
+        Get a dictionary mapping the given object ids of a single
+        content type to ``(score, num_votes)`` tuples counting the votes
+        first cast from ``since`` until ``until``, including changes
+        still held in the write-behind buffer.
+        """
+        from voting.models import VoteBucket
+        buckets = VoteBucket.objects.db_manager(self.reader().db)
+        queryset = buckets.window(since, until).filter(
+            content_type__pk=content_type_id,
+            object_id__in=object_ids,
+        ).values('object_id').annotate(score=Sum('score'),
+                                       num_votes=Sum('num_votes'))
+        scores = dict([(row['object_id'], (row['score'], row['num_votes']))
+                       for row in queryset])
+        ranges = window_ranges(since, until)
+        pending = buffer.pending(content_type_id, set(object_ids))
+        for (_, object_id, period, start), delta in pending.items():
+            if in_window(period, start, ranges):
+                score, num_votes = scores.get(object_id, (0, 0))
+                scores[object_id] = (score + delta[0], num_votes + delta[1])
+        return scores
+
+    def _scores_for_ids(self, content_type_id, object_ids):
+        """
+        Get a dictionary mapping the given object ids of a single
+        content type to their score details, using one aggregate query.
+        """
+        reader = self.for_content_type(content_type_id).reader()
         if supports_aggregates:
-            queryset = self.filter(
+            queryset = reader.filter(
                 object_id__in = object_ids,
-                content_type = ctype,
+                content_type__pk = content_type_id,
             ).values(
                 'object_id',
             ).annotate(
@@ -113,9 +290,9 @@ class VoteManager(models.Manager):
                 num_votes = CoalesceCount('vote', default='0'),
             )
         else:
-            queryset = self.filter(
+            queryset = reader.filter(
                 object_id__in = object_ids,
-                content_type = ctype,
+                content_type__pk = content_type_id,
                 ).extra(
                     select = {
                         'score': 'COALESCE(SUM(vote), 0)',
@@ -123,16 +300,28 @@ class VoteManager(models.Manager):
                     }
                 ).values('object_id', 'score', 'num_votes')
             queryset.query.group_by.append('object_id')
-        
+
         vote_dict = {}
         for row in queryset:
-            vote_dict[row['object_id']] = {
-                'score': int(row['score']),
-                'num_votes': int(row['num_votes']),
-                'num_up_votes': (int(row['num_votes'])+int(row['score']))/2,
-                'num_down_votes': (-1)*(int(row['num_votes'])-int(row['score']))/2,
-            }
-        
+            vote_dict[row['object_id']] = _score_dict(row['score'],
+                                                      row['num_votes'])
+        return vote_dict
+
+    def get_scores_for_pairs(self, pairs):
+        """
+        Get a dictionary mapping ``(content_type_id, object_id)`` pairs
+        to score details, for objects of any number of content types.
+
+        Issues one aggregate query per distinct content type. Objects
+        which have not been voted on are given a zero score.
+        """
+        reader = self.reader()
+        vote_dict = {}
+        for content_type_id, object_ids in _group_pairs(pairs).items():
+            scores = reader._scores_for_ids(content_type_id, object_ids)
+            for object_id in object_ids:
+                vote_dict[(content_type_id, object_id)] = scores.get(
+                    object_id, _score_dict(0, 0))
         return vote_dict
 
     def record_vote(self, obj, user, vote):
@@ -141,30 +330,359 @@ class VoteManager(models.Manager):
         to vote once, though that vote may be changed.
 
         A zero vote indicates that any existing vote should be removed.
+        Returns the user's previous vote, ``0`` if they hadn't voted.
         """
         if vote not in (+1, 0, -1):
             raise ValueError('Invalid vote (must be +1/0/-1)')
-        ctype = ContentType.objects.get_for_model(obj)
-        try:
-            v = self.get(user=user, content_type=ctype,
-                         object_id=obj._get_pk_val())
+        ctype_id = registry.site.get_content_type_id(obj)
+        object_id = obj._get_pk_val()
+        manager = self.for_content_type(ctype_id).writer()
+        # The vote and its bucket deltas are committed together, so that
+        # rebuild_vote_buckets counts each vote exactly once.
+        with transaction.commit_on_success(using=manager.db):
+            old_vote, created = manager._write_vote(ctype_id, object_id,
+                                                    user, vote)
+            if old_vote != vote:
+                self._votes_changed([
+                    (ctype_id, object_id, user.id, old_vote, vote, created),
+                ])
+        if old_vote != vote:
+            self._votes_committed([
+                (ctype_id, object_id, user.id, old_vote, vote, created),
+            ], {user.id: user.username})
+        replicas.pin_user(user)
+        return old_vote
+
+    def _write_vote(self, content_type_id, object_id, user, vote):
+        """
+        Replace a user's vote on an object with ``vote``, returning the
+        ``(old_vote, created)`` of the vote replaced.
+
+        Votes are only changed if they still hold the vote read, so that
+        when the same user's vote is sent twice at once only one of the
+        requests sees - and applies bucket deltas for - the change. The
+        other reads the vote again and finds nothing left to do.
+        """
+        while True:
+            try:
+                v = self.get(user=user, content_type__pk=content_type_id,
+                             object_id=object_id)
+            except models.ObjectDoesNotExist:
+                if vote == 0:
+                    return 0, None
+                sid = transaction.savepoint(using=self.db)
+                try:
+                    created = self.create(
+                        user=user, content_type_id=content_type_id,
+                        object_id=object_id, vote=vote).created
+                except IntegrityError:
+                    # Another request cast the user's vote first.
+                    transaction.savepoint_rollback(sid, using=self.db)
+                    continue
+                transaction.savepoint_commit(sid, using=self.db)
+                return 0, created
+            if v.vote == vote:
+                return vote, v.created
             if vote == 0:
-                v.delete()
+                changed = self._delete_vote(v.pk, v.vote)
             else:
-                v.vote = vote
-                v.save()
-        except models.ObjectDoesNotExist:
-            if vote != 0:
-                self.create(user=user, content_type=ctype,
-                            object_id=obj._get_pk_val(), vote=vote)
+                changed = self.filter(pk=v.pk, vote=v.vote).update(
+                    vote=vote, updated=now())
+            if changed:
+                return v.vote, v.created
+
+    def _delete_vote(self, id, vote):
+        """
+        Delete the vote with the given id if it still holds ``vote``,
+        returning the number of rows deleted.
+        """
+        connection = connections[self.db]
+        cursor = connection.cursor()
+        cursor.execute('DELETE FROM %s WHERE id = %%s AND vote = %%s' %
+                       connection.ops.quote_name(self.model._meta.db_table),
+                       [id, vote])
+        return cursor.rowcount
+
+    def record_votes_in_bulk(self, items):
+        """
+        Record many votes at once, with the same semantics as
+        ``record_vote``.
+
+        ``items`` is a sequence of ``(content_type_id, object_id,
+        user_id, vote)`` tuples, optionally followed by the ``created``
+        time to give new votes. Existing votes are read with one query
+        per content type and written with bulk inserts, updates and
+        deletes inside a single transaction, which must therefore span
+        only one database.
+
+        Returns a list holding an ``(old_vote, new_vote)`` tuple for
+        each item, where ``0`` stands for no vote.
+        """
+        items = list(items)
+        for item in items:
+            if item[3] not in (+1, 0, -1):
+                raise ValueError('Invalid vote (must be +1/0/-1)')
+
+        with transaction.commit_on_success(using=self.writer().db):
+            # Current state of every (content_type_id, object_id,
+            # user_id) key in the batch, as [id, stored vote, vote,
+            # created, unsaved Vote]. The query may return other pairs
+            # of the same objects and users, which are left alone.
+            keys = set([item[:3] for item in items])
+            state = {}
+            for content_type_id, object_ids in _group_pairs(
+                    [item[:2] for item in items]).items():
+                user_ids = set([item[2] for item in items
+                                if item[0] == content_type_id])
+                existing = self.for_content_type(
+                    content_type_id).writer().filter(
+                    content_type__pk=content_type_id,
+                    object_id__in=set(object_ids),
+                    user__pk__in=user_ids,
+                ).values_list('id', 'object_id', 'user', 'vote', 'created')
+                for id, object_id, user_id, vote, created in existing:
+                    key = (content_type_id, object_id, user_id)
+                    if key in keys:
+                        state[key] = [id, vote, vote, created, None]
+
+            timestamp = now()
+            results, changes = [], []
+            for item in items:
+                key, vote = item[:3], item[3]
+                created = len(item) > 4 and item[4] or timestamp
+                current = state.setdefault(key, [None, 0, 0, created, None])
+                old_vote = current[2]
+                results.append((old_vote, vote))
+                if old_vote == vote:
+                    continue
+                changes.append(key + (old_vote, vote, current[3]))
+                current[2] = vote
+                if current[0] is None and current[4] is None:
+                    model = self.for_content_type(key[0]).model
+                    current[4] = model(content_type_id=key[0],
+                                       object_id=key[1], user_id=key[2],
+                                       vote=vote, created=current[3])
+                elif current[4] is not None:
+                    current[4].vote = vote
 
-    def get_top(self, Model, limit=10, reversed=False):
+            # Only votes which end up different from the stored ones are
+            # written. Writes are grouped by vote model, as content types
+            # listed in VOTING_PARTITIONS keep their votes in tables of
+            # their own.
+            creates, updates, deletes = {}, {}, {}
+            for key, (id, stored, vote, created, unsaved) in state.items():
+                model = self.for_content_type(key[0]).model
+                if unsaved is not None:
+                    if vote != 0:
+                        creates.setdefault(model, []).append(unsaved)
+                elif vote == stored:
+                    continue
+                elif vote == 0:
+                    deletes.setdefault(model, []).append(id)
+                else:
+                    updates.setdefault((model, vote), []).append(id)
+            for model, objs in creates.items():
+                manager = model._default_manager.db_manager(self._db)
+                for i in range(0, len(objs), BULK_CHUNK_SIZE):
+                    manager.bulk_create(objs[i:i + BULK_CHUNK_SIZE])
+            for (model, vote), ids in updates.items():
+                manager = model._default_manager.db_manager(self._db)
+                for i in range(0, len(ids), BULK_CHUNK_SIZE):
+                    manager.filter(id__in=ids[i:i + BULK_CHUNK_SIZE]).update(
+                        vote=vote, updated=timestamp)
+            for model, ids in deletes.items():
+                manager = model._default_manager.db_manager(self._db)
+                for i in range(0, len(ids), BULK_CHUNK_SIZE):
+                    manager.filter(id__in=ids[i:i + BULK_CHUNK_SIZE]).delete()
+            self._votes_changed(changes)
+        self._votes_committed(changes)
+        for user_id in set([item[2] for item in items]):
+            replicas.pin_user(user_id)
+        return results
+
+    def _votes_changed(self, changes):
+        """
+        Bring the buckets up to date after votes changed, in the
+        transaction which changed them. If write-behind buffering is on,
+        the changes are buffered by ``_votes_committed`` instead, once
+        that transaction commits.
+
+        ``changes`` is a list of ``(content_type_id, object_id,
+        user_id, old_vote, new_vote, created)`` tuples, where
+        ``created`` is the time the vote was first cast.
+        """
+        from voting.models import VoteBucket
+        if not buffer.is_enabled():
+            VoteBucket.objects.record_deltas(_change_deltas(changes))
+
+    def _votes_committed(self, changes, usernames=None):
+        """
+        Buffer the bucket changes of votes which have been committed, if
+        write-behind buffering is on, bump the versions of the objects
+        voted on and update their recent upvoter previews, using the
+        ``usernames`` of the voters where given.
+        """
+        recent.votes_committed(changes, usernames or {})
+        if buffer.is_enabled():
+            buffer.get_buffer().add(bucket_deltas(_change_deltas(changes)))
+        for content_type_id, object_id in set([change[:2]
+                                               for change in changes]):
+            bump_vote_version(content_type_id, object_id)
+
+    def iter_votes(self, content_type_ids=None, user=None, since=None,
+                   until=None, after_id=0, chunk_size=1000):
+        """
+        Stream votes in primary key order as ``(id, content_type_id,
+        object_id, user_id, vote, created)`` tuples, optionally limited
+        to some content types, one user, or votes first cast from
+        ``since`` until ``until``.
+
+        Rows are read in fixed size chunks by keyset pagination on the
+        primary key, or through a server-side cursor on PostgreSQL, so
+        memory use doesn't grow with the size of the table. Streaming
+        can be resumed from the id of the last row seen by passing it as
+        ``after_id``.
+
+        Votes on content types listed in ``settings.VOTING_PARTITIONS``
+        are streamed from their own tables, one table after another, so
+        ids are only ordered - and ``after_id`` only meaningful - when
+        the content types streamed share a table.
+        """
+        if content_type_ids:
+            models = []
+            for content_type_id in content_type_ids:
+                model = self.for_content_type(content_type_id).model
+                if model not in models:
+                    models.append(model)
+        else:
+            from voting.models import get_vote_models
+            models = get_vote_models()
+        for model in models:
+            manager = model._default_manager.db_manager(self._db)
+            for row in manager._iter_table(content_type_ids, user, since,
+                                           until, after_id, chunk_size):
+                yield row
+
+    def _iter_table(self, content_type_ids, user, since, until, after_id,
+                    chunk_size):
+        """
+        Stream votes from this manager's table, as for ``iter_votes``.
+        """
+        queryset = self.reader(user).all()
+        if content_type_ids:
+            queryset = queryset.filter(content_type__pk__in=content_type_ids)
+        if user is not None:
+            queryset = queryset.filter(user__pk=getattr(user, 'pk', user))
+        if since is not None:
+            queryset = queryset.filter(created__gte=since)
+        if until is not None:
+            queryset = queryset.filter(created__lt=until)
+        queryset = queryset.order_by('id').values_list(*EXPORT_FIELDS)
+
+        db_connection = connections[queryset.db]
+        if db_connection.vendor == 'postgresql':
+            sql, params = queryset.filter(id__gt=after_id).query.sql_with_params()
+            db_connection.cursor()  # Make sure the connection is open.
+            cursor = db_connection.connection.cursor(
+                name='voting_iter_votes_%d' % id(queryset))
+            cursor.itersize = chunk_size
+            try:
+                cursor.execute(sql, params)
+                for row in cursor:
+                    yield row
+            finally:
+                cursor.close()
+            return
+
+        while True:
+            rows = list(queryset.filter(id__gt=after_id)[:chunk_size])
+            for row in rows:
+                yield row
+            if len(rows) < chunk_size:
+                break
+            after_id = rows[-1][0]
+
+    def get_top(self, Model, limit=10, reversed=False, since=None, until=None):
         """
         Get the top N scored objects for a given model.
 
+        If ``since`` or ``until`` are given, objects are ranked on the
+        votes first cast within that window, as for ``get_score``.
+
         Yields (object, score) tuples.
         """
-        ctype = ContentType.objects.get_for_model(Model)
+        ctype_id = registry.site.get_content_type_id(Model)
+        reader = self.for_content_type(ctype_id).reader()
+        if since is not None or until is not None:
+            results = reader._window_top_scores(ctype_id, limit, reversed,
+                                                since, until)
+        else:
+            results = reader._top_scores(ctype_id, limit, reversed)
+
+        # Use in_bulk() to avoid O(limit) db hits.
+        objects = Model.objects.in_bulk([id for id, score in results])
+
+        # Yield each object, score pair. Because of the lazy nature of generic
+        # relations, missing objects are silently ignored.
+        for id, score in results:
+            if id in objects:
+                yield objects[id], int(score)
+
+    def _window_top_scores(self, content_type_id, limit, reversed, since,
+                           until):
+        """
+        Get ``(object_id, score)`` rows for the top (or bottom, if
+        ``reversed``) scored objects of a content type, counting the
+        votes first cast from ``since`` until ``until``.
+        """
+        from voting.models import VoteBucket
+        ranges = window_ranges(since, until)
+        pending = {}
+        for (_, object_id, period, start), delta in \
+                buffer.pending(content_type_id).items():
+            if in_window(period, start, ranges):
+                pending[object_id] = pending.get(object_id, 0) + delta[0]
+
+        # Buffered changes can move at most len(pending) objects ahead of
+        # the others, so reading that many more rows keeps the result
+        # exact.
+        buckets = VoteBucket.objects.db_manager(self.reader().db)
+        queryset = buckets.window(since, until).filter(
+            content_type__pk=content_type_id,
+        ).values('object_id').annotate(total=Sum('score'))
+        if reversed:
+            queryset = queryset.filter(total__lt=0).order_by('total')
+        else:
+            queryset = queryset.filter(total__gt=0).order_by('-total')
+        results = list(queryset.values_list('object_id', 'total')[
+            :limit + len(pending)])
+        if not pending:
+            return results
+
+        scores = dict(results)
+        missing = set(pending) - set(scores)
+        if missing:
+            scores.update(buckets.window(since, until).filter(
+                content_type__pk=content_type_id,
+                object_id__in=missing,
+            ).values('object_id').annotate(total=Sum('score')).values_list(
+                'object_id', 'total'))
+        for object_id, delta in pending.items():
+            scores[object_id] = scores.get(object_id, 0) + delta
+        if reversed:
+            results = sorted([(id, score) for id, score in scores.items()
+                              if score < 0], key=lambda row: (row[1], row[0]))
+        else:
+            results = sorted([(id, score) for id, score in scores.items()
+                              if score > 0], key=lambda row: (-row[1], row[0]))
+        return results[:limit]
+
+    def _top_scores(self, content_type_id, limit, reversed):
+        """
+        Get ``(object_id, score)`` rows for the top (or bottom, if
+        ``reversed``) scored objects of a content type.
+        """
+        connection = connections[self.db]
         query = """
         SELECT object_id, SUM(vote) as %s
         FROM %s
@@ -190,26 +708,17 @@ class VoteManager(models.Manager):
         }
 
         cursor = connection.cursor()
-        cursor.execute(query, [ctype.id, limit])
-        results = cursor.fetchall()
+        cursor.execute(query, [content_type_id, limit])
+        return cursor.fetchall()
 
-        # Use in_bulk() to avoid O(limit) db hits.
-        objects = Model.objects.in_bulk([id for id, score in results])
-
-        # Yield each object, score pair. Because of the lazy nature of generic
-        # relations, missing objects are silently ignored.
-        for id, score in results:
-            if id in objects:
-                yield objects[id], int(score)
-
-    def get_bottom(self, Model, limit=10):
+    def get_bottom(self, Model, limit=10, since=None, until=None):
         """
         Get the bottom (i.e. most negative) N scored objects for a given
         model.
 
         Yields (object, score) tuples.
         """
-        return self.get_top(Model, limit, True)
+        return self.get_top(Model, limit, True, since, until)
 
     def get_for_user(self, obj, user):
         """
@@ -218,10 +727,11 @@ class VoteManager(models.Manager):
         """
         if not user.is_authenticated():
             return None
-        ctype = ContentType.objects.get_for_model(obj)
+        ctype_id = registry.site.get_content_type_id(obj)
         try:
-            vote = self.get(content_type=ctype, object_id=obj._get_pk_val(),
-                            user=user)
+            vote = self.for_content_type(ctype_id).reader(user).get(
+                content_type__pk=ctype_id, object_id=obj._get_pk_val(),
+                user=user)
         except models.ObjectDoesNotExist:
             vote = None
         return vote
@@ -233,10 +743,331 @@ class VoteManager(models.Manager):
         """
         vote_dict = {}
         if len(objects) > 0:
-            ctype = ContentType.objects.get_for_model(objects[0])
-            votes = list(self.filter(content_type__pk=ctype.id,
-                                     object_id__in=[obj._get_pk_val() \
-                                                    for obj in objects],
-                                     user__pk=user.id))
+            ctype_id = registry.site.get_content_type_id(objects[0])
+            votes = list(self.for_content_type(ctype_id).reader(user).filter(
+                content_type__pk=ctype_id,
+                object_id__in=[obj._get_pk_val() for obj in objects],
+                user__pk=user.id))
             vote_dict = dict([(vote.object_id, vote) for vote in votes])
         return vote_dict
+
+    def get_for_user_for_pairs(self, pairs, user):
+        """
+        Get a dictionary mapping ``(content_type_id, object_id)`` pairs
+        to the vote made on the corresponding object by the given user.
+        Pairs the user has not voted on are omitted.
+
+        Issues one query per distinct content type.
+        """
+        vote_dict = {}
+        if not user.is_authenticated():
+            return vote_dict
+        reader = self.reader(user)
+        for content_type_id, object_ids in _group_pairs(pairs).items():
+            votes = reader.for_content_type(content_type_id).filter(
+                content_type__pk=content_type_id, object_id__in=object_ids,
+                user__pk=user.id).values_list('object_id', 'vote')
+            for object_id, vote in votes:
+                vote_dict[(content_type_id, object_id)] = vote
+        return vote_dict
+
+    def get_objects_voted_by(self, user, vote=+1, before=None, limit=20,
+                             Model=None):
+        """
+        Get a page of the votes made by the given user, most recent
+        first, with the voted objects already attached, so accessing
+        ``vote.object`` doesn't query the database. Only votes of the
+        given ``vote`` value are included, or all votes if it is
+        ``None``.
+
+        Pages are read by keyset pagination on ``(created, id)``: pass
+        the ``created`` time and id of the last vote of one page as
+        ``before`` to get the next. Votes on objects which have been
+        deleted are left out, so a page may hold fewer than ``limit``
+        votes.
+
+        If ``Model`` is given, only votes on its objects are listed.
+        Otherwise a page is read from each table listed votes may be in
+        - the votes table and those of the models listed in
+        ``settings.VOTING_PARTITIONS`` - and the pages are merged.
+        """
+        if Model is not None:
+            ctype_id = registry.site.get_content_type_id(Model)
+            querysets = [self.for_content_type(ctype_id).reader(user).filter(
+                content_type__pk=ctype_id)]
+        else:
+            from voting.models import get_vote_models
+            querysets = [model._default_manager.db_manager(self._db).reader(
+                user).all() for model in get_vote_models()]
+        votes = []
+        for queryset in querysets:
+            queryset = queryset.filter(user__pk=user.id)
+            if vote is not None:
+                queryset = queryset.filter(vote=vote)
+            if before is not None:
+                created, id = before
+                queryset = queryset.filter(Q(created__lt=created) |
+                                           Q(created=created, id__lt=id))
+            votes.extend(queryset.order_by('-created', '-id')[:limit])
+        votes.sort(key=lambda v: (v.created, v.id), reverse=True)
+        return [v for v in prefetch_objects(votes[:limit])
+                if v.object is not None]
+
+
+def prefetch_objects(votes):
+    """
+    Resolve the voted objects of a list of votes with one ``in_bulk``
+    query per content type, caching each on its vote's ``object``
+    attribute. Votes on objects which no longer exist get ``None``.
+
+    Returns the votes as a list, in their original order.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    votes = list(votes)
+    objects = {}
+    for content_type_id, object_ids in _group_pairs(
+            [(v.content_type_id, v.object_id) for v in votes]).items():
+        try:
+            model = registry.site.get_model(content_type_id)
+        except registry.NotRegistered:
+            model = ContentType.objects.get_for_id(
+                content_type_id).model_class()
+        if model is None:
+            continue
+        for object_id, obj in model._default_manager.in_bulk(
+                object_ids).items():
+            objects[(content_type_id, object_id)] = obj
+    cache_attr = votes and votes[0].__class__.object.cache_attr
+    for v in votes:
+        setattr(v, cache_attr, objects.get((v.content_type_id, v.object_id)))
+    return votes
+
+def _group_pairs(pairs):
+    """
+    Group ``(content_type_id, object_id)`` pairs into a dictionary
+    mapping each content type id to a list of object ids.
+    """
+    groups = {}
+    for content_type_id, object_id in pairs:
+        groups.setdefault(content_type_id, []).append(object_id)
+    return groups
+
+
+def window_ranges(since=None, until=None):
+    """
+    Get the ``(period, start, end)`` bucket ranges covering votes cast
+    from ``since`` until ``until``, where ``None`` stands for an open
+    bound.
+
+    Whole days inside the window are covered by daily buckets and the
+    partial days at either end by hourly buckets. ``since`` is rounded
+    down to the start of its hour; a bucket is included if it starts
+    before ``until``.
+    """
+    start = since is not None and floor_hour(since) or None
+    if start is not None and until is not None and \
+            ceil_day(start) >= floor_day(until):
+        # The window doesn't span a whole day.
+        return [('h', start, until)]
+    ranges = []
+    first_day = None
+    if start is not None:
+        first_day = ceil_day(start)
+        ranges.append(('h', start, first_day))
+    if until is not None:
+        last_day = floor_day(until)
+        ranges.append(('d', first_day, last_day))
+        ranges.append(('h', last_day, until))
+    else:
+        ranges.append(('d', first_day, None))
+    return ranges
+
+def in_window(period, start, ranges):
+    """
+    Determine whether the bucket for ``period`` starting at ``start``
+    falls within the given ``window_ranges``.
+    """
+    for range_period, range_start, range_end in ranges:
+        if period == range_period and \
+                (range_start is None or start >= range_start) and \
+                (range_end is None or start < range_end):
+            return True
+    return False
+
+def bucket_deltas(deltas):
+    """
+    Spread score and vote count changes keyed by ``(content_type_id,
+    object_id, created)`` over the hourly and daily buckets they fall
+    in, keyed by ``(content_type_id, object_id, period, start)``.
+    """
+    buckets = {}
+    for (content_type_id, object_id, created), delta in deltas.items():
+        for period, start in (('h', floor_hour(created)),
+                              ('d', floor_day(created))):
+            key = (content_type_id, object_id, period, start)
+            score, num_votes = buckets.get(key, (0, 0))
+            buckets[key] = (score + delta[0], num_votes + delta[1])
+    return buckets
+
+
+class VoteBucketManager(models.Manager):
+    def window(self, since=None, until=None):
+        """
+        Get a ``QuerySet`` of the buckets covering votes cast from
+        ``since`` until ``until``, either of which may be ``None`` for
+        an open-ended window. See ``window_ranges``.
+        """
+        q = Q()
+        for period, start, end in window_ranges(since, until):
+            range_q = Q(period=period)
+            if start is not None:
+                range_q &= Q(start__gte=start)
+            if end is not None:
+                range_q &= Q(start__lt=end)
+            q |= range_q
+        return self.filter(q)
+
+    def record_deltas(self, deltas):
+        """
+        Apply score and vote count changes to the hourly and daily
+        buckets of the affected objects.
+
+        ``deltas`` maps ``(content_type_id, object_id, created)`` keys
+        to ``(score, num_votes)`` changes, where ``created`` is the
+        time the votes were first cast.
+        """
+        self.apply_bucket_deltas(bucket_deltas(deltas))
+
+    def apply_bucket_deltas(self, buckets):
+        """
+        Apply score and vote count changes keyed by ``(content_type_id,
+        object_id, period, start)`` to the corresponding buckets,
+        creating any which don't exist yet.
+        """
+        for (content_type_id, object_id, period, start), (score, num_votes) \
+                in buckets.items():
+            if not score and not num_votes:
+                continue
+            lookup = dict(content_type__pk=content_type_id,
+                          object_id=object_id, period=period, start=start)
+            updated = self.filter(**lookup).update(
+                score=F('score') + score, num_votes=F('num_votes') + num_votes)
+            if updated:
+                continue
+            sid = transaction.savepoint()
+            try:
+                self.create(content_type_id=content_type_id,
+                            object_id=object_id, period=period, start=start,
+                            score=score, num_votes=num_votes)
+                transaction.savepoint_commit(sid)
+            except IntegrityError:
+                # Another process created the bucket first.
+                transaction.savepoint_rollback(sid)
+                self.filter(**lookup).update(
+                    score=F('score') + score,
+                    num_votes=F('num_votes') + num_votes)
+
+class VoterSketchManager(models.Manager):
+    def replace_day(self, day, sketches):
+        """
+        Replace the sketches for the given day with a dictionary of
+        ``HyperLogLog`` sketches keyed by ``(kind, key)``, in one
+        transaction. Returns the number of sketches written.
+        """
+        using = self._db or router.db_for_write(self.model)
+        with transaction.commit_on_success(using=using):
+            self.db_manager(using).filter(day=day).delete()
+            rows = [self.model(kind=kind, key=key, day=day,
+                               sketch=sketch.to_text())
+                    for (kind, key), sketch in sketches.items()]
+            for i in range(0, len(rows), BULK_CHUNK_SIZE):
+                self.db_manager(using).bulk_create(
+                    rows[i:i + BULK_CHUNK_SIZE])
+        return len(rows)
+
+    def get_sketch(self, kind, key, since=None, until=None):
+        """
+        Get a ``HyperLogLog`` merging the sketches for the given kind and
+        key for the days from ``since`` until, but not including,
+        ``until``, either of which may be ``None`` for an open range.
+        """
+        sketches = self.filter(kind=kind, key=key)
+        if since is not None:
+            sketches = sketches.filter(day__gte=since)
+        if until is not None:
+            sketches = sketches.filter(day__lt=until)
+        merged = analytics.HyperLogLog()
+        for text in sketches.values_list('sketch', flat=True).iterator():
+            merged.merge(analytics.HyperLogLog.from_text(text))
+        return merged
+
+    def get_series(self, kind, key, since, until, days=1):
+        """
+        Get a list of ``(start, count)`` tuples estimating the unique
+        voters for the given kind and key in consecutive periods of
+        ``days`` days from ``since`` until ``until``, e.g. ``days=7``
+        for weekly counts. The last period may be cut short by
+        ``until``.
+        """
+        sketches = {}
+        for day, text in self.filter(kind=kind, key=key, day__gte=since,
+                                     day__lt=until).values_list('day',
+                                                                'sketch'):
+            sketches[day] = analytics.HyperLogLog.from_text(text)
+        series = []
+        start = since
+        while start < until:
+            end = min(start + datetime.timedelta(days=days), until)
+            merged = analytics.HyperLogLog()
+            for day, sketch in sketches.items():
+                if start <= day < end:
+                    merged.merge(sketch)
+            series.append((start, merged.count()))
+            start = end
+        return series
+
+class AlsoLikedManager(models.Manager):
+    def get_also_liked(self, obj, limit=10):
+        """
+        Get the objects most often upvoted by the users who upvoted
+        ``obj``, as precomputed by ``voting.recommend``.
+
+        Yields (object, count) tuples, where count is the number of
+        users who upvoted both objects.
+        """
+        ctype_id = registry.site.get_content_type_id(obj)
+        rows = list(self.db_manager(
+            replicas.get_read_database(self.model)).filter(
+            content_type__pk=ctype_id, object_id=obj._get_pk_val(),
+        ).order_by('rank').values_list('similar_object_id', 'count')[:limit])
+        objects = obj.__class__._default_manager.in_bulk(
+            [id for id, count in rows])
+        # Objects deleted since the index was built are skipped.
+        for id, count in rows:
+            if id in objects:
+                yield objects[id], count
+
+# Columns of ``VoteRanking`` which objects can be ranked by.
+RANKINGS = ('score', 'ratio', 'wilson', 'decayed')
+
+class VoteRankingManager(models.Manager):
+    def get_ranked(self, Model, by='wilson', limit=10, offset=0):
+        """
+        Get a page of objects of a given model in descending order of
+        one of the rankings computed by ``voting.ranking``.
+
+        Yields (object, value) tuples.
+        """
+        if by not in RANKINGS:
+            raise ValueError('Unknown ranking %r; expected one of %s.'
+                             % (by, ', '.join(RANKINGS)))
+        ctype_id = registry.site.get_content_type_id(Model)
+        rows = list(self.db_manager(
+            replicas.get_read_database(self.model)).filter(
+            content_type__pk=ctype_id,
+        ).order_by('-' + by, 'object_id').values_list(
+            'object_id', by)[offset:offset + limit])
+        objects = Model._default_manager.in_bulk([id for id, value in rows])
+        for id, value in rows:
+            if id in objects:
+                yield objects[id], value
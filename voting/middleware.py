@@ -0,0 +1,27 @@
+from voting import replicas
+
+
+class VotingReplicaMiddleware(object):
+    """
+    Makes the requesting user the current user for read-your-writes
+    stickiness, so vote reads made while handling the request stay on
+    the primary database shortly after the user has voted.
+
+    Requests which record a vote set a cookie lasting as long as the
+    stickiness, and the user is only looked up for requests carrying
+    it.
+    """
+    def process_request(self, request):
+        replicas.clear_current_user()
+        if replicas.PINNED_COOKIE in request.COOKIES:
+            replicas.set_current_user(getattr(request, 'user', None))
+
+    def process_response(self, request, response):
+        if replicas.is_thread_pinned():
+            response.set_cookie(replicas.PINNED_COOKIE, '1',
+                                max_age=replicas.get_sticky_seconds())
+        replicas.clear_current_user()
+        return response
+
+    def process_exception(self, request, exception):
+        replicas.clear_current_user()
@@ -1,29 +1,40 @@
+import sys
+
 from django.contrib.contenttypes import generic
 from django.contrib.contenttypes.models import ContentType
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.signals import post_delete, post_syncdb
 
-from voting.managers import VoteManager
+from voting.managers import AlsoLikedManager, VoteBucketManager, \
+    VoteManager, VoteRankingManager, VoterSketchManager
+from voting.schema import create_indexes_on_syncdb
+from voting.utils import now
 
 SCORES = (
     (u'+1', +1),
     (u'-1', -1),
 )
 
-class Vote(models.Model):
+class VoteBase(models.Model):
     """
-    A vote on an object by a User.
+    The fields and behaviour shared by the votes table and the tables
+    holding the votes on content types listed in
+    ``settings.VOTING_PARTITIONS``. Subclasses define ``object_id`` and
+    the ``object`` relation.
     """
-    user         = models.ForeignKey(User)
-    content_type = models.ForeignKey(ContentType)
-    object_id    = models.PositiveIntegerField()
-    object       = generic.GenericForeignKey('content_type', 'object_id')
+    user         = models.ForeignKey(User, related_name='%(class)s_set')
+    content_type = models.ForeignKey(ContentType,
+                                     related_name='%(class)s_set')
     vote         = models.SmallIntegerField(choices=SCORES)
+    created      = models.DateTimeField(default=now, db_index=True)
+    updated      = models.DateTimeField(auto_now=True, db_index=True)
 
     objects = VoteManager()
 
     class Meta:
-        db_table = 'votes'
+        abstract = True
         # One vote per user per object
         unique_together = (('user', 'content_type', 'object_id'),)
 
@@ -35,3 +46,212 @@ class Vote(models.Model):
 
     def is_downvote(self):
         return self.vote == -1
+
+class Vote(VoteBase):
+    """
+    A vote on an object by a User.
+    """
+    object_id = models.PositiveIntegerField()
+    object    = generic.GenericForeignKey('content_type', 'object_id')
+
+    class Meta(VoteBase.Meta):
+        db_table = 'votes'
+
+def _partition_model(label):
+    """
+    Create the model for the table holding the votes on the model with
+    the given ``app_label.ModelName`` label.
+    """
+    app_label, model_name = label.split('.')
+    name = '%s%sVote' % (app_label.capitalize(), model_name)
+    class Meta(VoteBase.Meta):
+        db_table = 'votes_%s_%s' % (app_label, model_name.lower())
+
+    return type(name, (VoteBase,), {
+        '__module__': __name__,
+        '__doc__': 'A vote on a %s by a User.' % label,
+        # All rows share one content type, so the object id is indexed
+        # on its own.
+        'object_id': models.PositiveIntegerField(db_index=True),
+        'object': generic.GenericForeignKey('content_type', 'object_id'),
+        'Meta': Meta,
+    })
+
+# Models for the votes on content types which have a table of their own,
+# keyed by label.
+PARTITION_MODELS = dict([
+    (label, _partition_model(label))
+    for label in getattr(settings, 'VOTING_PARTITIONS', ())])
+
+_vote_models = {}
+
+def get_vote_model(content_type_id):
+    """
+    Get the model for the table holding the votes on the given content
+    type: its partition model if it has one, otherwise ``Vote``.
+    """
+    if not PARTITION_MODELS:
+        return Vote
+    if content_type_id not in _vote_models:
+        try:
+            content_type = ContentType.objects.get_for_id(content_type_id)
+            label = '%s.%s' % (content_type.app_label,
+                               content_type.model_class()._meta.object_name)
+        except (ContentType.DoesNotExist, AttributeError):
+            label = None
+        _vote_models[content_type_id] = PARTITION_MODELS.get(label, Vote)
+    return _vote_models[content_type_id]
+
+def get_vote_models():
+    """
+    Get a list of all vote models: ``Vote`` followed by the partition
+    models.
+    """
+    return [Vote] + PARTITION_MODELS.values()
+
+BUCKET_PERIODS = (
+    ('h', u'Hourly'),
+    ('d', u'Daily'),
+)
+
+class VoteBucket(models.Model):
+    """
+    The sum and count of the votes cast on an object within one hour or
+    one day, keyed by the time each vote was first cast.
+
+    Maintained by ``VoteManager.record_vote``, so that scores over a
+    time window can be read from a handful of buckets instead of
+    scanning votes.
+    """
+    content_type = models.ForeignKey(ContentType)
+    object_id    = models.PositiveIntegerField()
+    period       = models.CharField(max_length=1, choices=BUCKET_PERIODS)
+    start        = models.DateTimeField(db_index=True)
+    score        = models.IntegerField(default=0)
+    num_votes    = models.IntegerField(default=0)
+
+    objects = VoteBucketManager()
+
+    class Meta:
+        db_table = 'vote_buckets'
+        unique_together = (('content_type', 'object_id', 'period', 'start'),)
+
+    def __unicode__(self):
+        return u'%s bucket at %s: %s from %s votes' % (
+            self.get_period_display(), self.start, self.score, self.num_votes)
+
+class ArchivedVote(models.Model):
+    """
+    A vote on an object which has since been deleted, moved out of the
+    votes table by ``voting.cleanup``.
+    """
+    user         = models.ForeignKey(User)
+    content_type = models.ForeignKey(ContentType)
+    object_id    = models.PositiveIntegerField()
+    vote         = models.SmallIntegerField(choices=SCORES)
+    created      = models.DateTimeField(db_index=True)
+    updated      = models.DateTimeField()
+    archived     = models.DateTimeField(default=now)
+
+    class Meta:
+        db_table = 'votes_archive'
+
+    def __unicode__(self):
+        return u'%s: %s on %s #%s (archived)' % (
+            self.user_id, self.vote, self.content_type_id, self.object_id)
+
+class AlsoLiked(models.Model):
+    """
+    One of the objects most often upvoted by the users who upvoted an
+    object, precomputed by ``voting.recommend``.
+    """
+    content_type      = models.ForeignKey(ContentType)
+    object_id         = models.PositiveIntegerField()
+    similar_object_id = models.PositiveIntegerField()
+    count             = models.IntegerField()
+    rank              = models.SmallIntegerField()
+
+    objects = AlsoLikedManager()
+
+    class Meta:
+        db_table = 'votes_also_liked'
+        unique_together = (('content_type', 'object_id', 'rank'),)
+
+    def __unicode__(self):
+        return u'%s #%s: also liked #%s by %s users' % (
+            self.content_type_id, self.object_id, self.similar_object_id,
+            self.count)
+
+class VoteRanking(models.Model):
+    """
+    Ranking scores for a voted object, computed in bulk for a whole
+    content type by ``voting.ranking``.
+    """
+    content_type = models.ForeignKey(ContentType)
+    object_id    = models.PositiveIntegerField()
+    num_up       = models.IntegerField()
+    num_down     = models.IntegerField()
+    score        = models.IntegerField()
+    ratio        = models.FloatField()
+    wilson       = models.FloatField()
+    decayed      = models.FloatField()
+    computed     = models.DateTimeField(default=now)
+
+    objects = VoteRankingManager()
+
+    class Meta:
+        db_table = 'vote_rankings'
+        unique_together = (('content_type', 'object_id'),)
+
+    def __unicode__(self):
+        return u'%s #%s: %s (%s up, %s down)' % (
+            self.content_type_id, self.object_id, self.score, self.num_up,
+            self.num_down)
+
+SKETCH_KINDS = (
+    ('c', u'Content type'),
+    ('a', u'Author'),
+)
+
+class VoterSketch(models.Model):
+    """
+    A HyperLogLog sketch of the users who voted on objects of one
+    content type, or on the objects of one author, during one day.
+    Maintained by ``voting.analytics``.
+    """
+    kind   = models.CharField(max_length=1, choices=SKETCH_KINDS)
+    key    = models.PositiveIntegerField()
+    day    = models.DateField()
+    sketch = models.TextField()
+
+    objects = VoterSketchManager()
+
+    class Meta:
+        db_table = 'vote_voter_sketches'
+        unique_together = (('kind', 'key', 'day'),)
+
+    def __unicode__(self):
+        return u'%s %s voters on %s' % (
+            self.get_kind_display(), self.key, self.day)
+
+# Indexes on more than one column, which Django can't declare, keyed by
+# model. Created by ``voting.schema`` when syncdb creates the tables, and
+# by the upgrade_votes command on existing ones.
+COMPOSITE_INDEXES = {
+    # Totals per object of one content type, as read by voting.ranking
+    # and voting.audit.
+    Vote: [('content_type', 'object_id')],
+    # Pages of one content type's objects by ranking.
+    VoteRanking: [('content_type', 'score'), ('content_type', 'wilson'),
+                  ('content_type', 'decayed')],
+}
+
+post_syncdb.connect(create_indexes_on_syncdb, sender=sys.modules[__name__],
+                    dispatch_uid='voting.schema.create_indexes_on_syncdb')
+
+# Votes on deleted objects of registered models are removed, or archived
+# if this is set to 'archive', as the objects are deleted.
+if getattr(settings, 'VOTING_CLEANUP_ON_DELETE', False):
+    from voting.cleanup import purge_votes_on_delete
+    post_delete.connect(purge_votes_on_delete,
+                        dispatch_uid='voting.cleanup.purge_votes_on_delete')
@@ -0,0 +1,42 @@
+"""
+Optional side effects of votes, such as activity stream entries.
+
+Plugins are modules listed in ``settings.VOTING_PLUGINS`` which define
+a ``vote_changed(user, obj, vote, old_vote)`` function. They are only
+imported when the first vote is processed, so the voting app itself
+loads without any of the applications they integrate with.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.importlib import import_module
+
+_plugins = None
+
+def get_plugins():
+    """
+    Get the plugin modules listed in ``settings.VOTING_PLUGINS``,
+    importing them on the first call.
+    """
+    global _plugins
+    if _plugins is None:
+        plugins = []
+        for path in getattr(settings, 'VOTING_PLUGINS', ()):
+            try:
+                module = import_module(path)
+            except ImportError, e:
+                raise ImproperlyConfigured('Error importing voting plugin '
+                                           '%s: "%s"' % (path, e))
+            if not hasattr(module, 'vote_changed'):
+                raise ImproperlyConfigured('Voting plugin %s does not define '
+                                           'a vote_changed function.' % path)
+            plugins.append(module)
+        _plugins = plugins
+    return _plugins
+
+def vote_changed(user, obj, vote, old_vote):
+    """
+    Notify all plugins that ``user``'s vote on ``obj`` changed from
+    ``old_vote`` to ``vote``, where ``0`` stands for no vote.
+    """
+    for plugin in get_plugins():
+        plugin.vote_changed(user, obj, vote, old_vote)
@@ -0,0 +1,158 @@
+"""
+Activity stream and follow side effects of votes, for sites built on
+Mezzanine, django-activity-stream, imagestore, userProfile and follow.
+
+Liking an object sends an action to the activity stream and, for wishes
+and deals, follows the object; clearing or reversing the vote removes
+them again.
+"""
+from django.conf import settings
+from django.contrib.comments.models import Comment
+from django.contrib.contenttypes.models import ContentType
+
+from mezzanine.generic.models import ThreadedComment, Review
+from mezzanine.blog.models import BlogPost
+
+from actstream import action, actions
+from actstream.models import Action
+from imagestore.models import Album, Image
+from userProfile.models import GenericWish, BroadcastWish, BroadcastDeal
+from follow.models import Follow
+
+
+def vote_changed(user, obj, vote, old_vote):
+    model = obj.__class__
+    if vote==1:
+        if model.__name__=='Album':
+            action.send(user, verb=settings.ALBUM_LIKE_WISH, target=obj, batch_time_minutes=30, is_batchable=True)
+        if model.__name__=='ThreadedComment' and isinstance(Comment.objects.get(id=obj.id).content_object, Review):
+            action.send(user, verb=settings.REVIEW_COMMENT_LIKE_VERB, action_object=obj, target=Comment.objects.get(id=obj.id).content_object, batch_time_minutes=30, is_batchable=True)
+        if model.__name__=='Review' and isinstance(Comment.objects.get(id=obj.id).content_object, BlogPost):
+            action.send(user, verb=settings.REVIEW_LIKE_VERB, target=obj,  batch_time_minutes=30, is_batchable=True)
+        if model.__name__=='Image':
+            action.send(user, verb=settings.PHOTO_LIKE_VERB, target=obj, batch_time_minutes=30, is_batchable=True)
+        if model.__name__=='BroadcastWish':
+            action.send(user, verb=settings.WISH_LIKE_VERB, target=obj, batch_time_minutes=30, is_batchable=True)
+            actions.follow(user, obj, send_action=False, actor_only=False)
+            Follow.objects.get_or_create(user, obj)
+        if model.__name__=='BroadcastDeal':
+            action.send(user, verb=settings.DEAL_LIKE_VERB, target=obj, batch_time_minutes=30, is_batchable=True)
+            actions.follow(user, obj, send_action=False, actor_only=False)
+            Follow.objects.get_or_create(user, obj)
+        if model.__name__=='GenericWish':
+            action.send(user, verb=settings.POST_LIKE_VERB, target=obj, batch_time_minutes=30, is_batchable=True)
+            actions.follow(user, obj, send_action=False, actor_only=False)
+            Follow.objects.get_or_create(user, obj)
+        if model.__name__ == "ThreadedComment" and isinstance(Comment.objects.get(id=obj.id).content_object, Album):
+            action.send(user, verb=settings.ALBUM_COMMENT_LIKE_VERB, action_object=obj, target=Comment.objects.get(id=obj.id).content_object, batch_time_minutes=30, is_batchable=True)
+        if model.__name__ == "ThreadedComment" and isinstance(Comment.objects.get(id=obj.id).content_object, Image):
+            action.send(user, verb=settings.IMAGE_COMMENT_LIKE_VERB, action_object=obj, target=Comment.objects.get(id=obj.id).content_object, batch_time_minutes=30, is_batchable=True)
+        if model.__name__ == "ThreadedComment" and type(Comment.objects.get(id=obj.id).content_object) == GenericWish:
+            action.send(user, verb=settings.POST_COMMENT_LIKE_VERB, action_object=obj, target=Comment.objects.get(id=obj.id).content_object, batch_time_minutes=30, is_batchable=True)
+        if model.__name__ == "ThreadedComment" and type(Comment.objects.get(id=obj.id).content_object) == BroadcastWish:
+            contentObject = Comment.objects.get(id=obj.id).content_object
+            action.send(user, verb=settings.WISH_COMMENT_LIKE_VERB, action_object=obj, target=contentObject, batch_time_minutes=30, is_batchable=True)
+            actions.follow(user, contentObject, send_action=False, actor_only=False)
+            Follow.objects.get_or_create(user, contentObject)
+        if model.__name__ == "ThreadedComment" and type(Comment.objects.get(id=obj.id).content_object) == BroadcastDeal:
+            contentObject = Comment.objects.get(id=obj.id).content_object
+            action.send(user, verb=settings.DEAL_COMMENT_LIKE_VERB, action_object=obj, target=contentObject, batch_time_minutes=30, is_batchable=True)
+            actions.follow(user, contentObject, send_action=False, actor_only=False)
+            Follow.objects.get_or_create(user, contentObject)
+    elif vote==-1 or vote==0:
+        if model.__name__=='Album':
+            #action.send(user, verb=_('disliked the album'), target=obj)
+            ctype = ContentType.objects.get_for_model(user)
+            target_content_type = ContentType.objects.get_for_model(obj)
+            Action.objects.all().filter(actor_content_type=ctype, actor_object_id=user.id, verb=settings.ALBUM_LIKE_WISH, target_content_type=target_content_type, target_object_id = obj.id ).delete()
+        if model.__name__=='ThreadedComment' and isinstance(Comment.objects.get(id=obj.id).content_object, Review):
+            #action.send(user, verb=_('disliked the comment on the review'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)
+            target = Comment.objects.get(id=obj.id).content_object
+            ctype = ContentType.objects.get_for_model(user)
+            target_content_type = ContentType.objects.get_for_model(target)
+            action_object_content_type = ContentType.objects.get_for_model(obj)
+            Action.objects.all().filter(actor_content_type=ctype, actor_object_id=user.id, verb=settings.REVIEW_COMMENT_LIKE_VERB, action_object_content_type=action_object_content_type, action_object_object_id=obj.id, target_content_type=target_content_type, target_object_id = target.id ).delete()
+        if model.__name__=='Review':
+            #action.send(user, verb=_('disliked the review on'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)
+            ctype = ContentType.objects.get_for_model(user)
+            target_content_type = ContentType.objects.get_for_model(obj)
+            Action.objects.all().filter(actor_content_type=ctype, actor_object_id=user.id, verb=settings.REVIEW_LIKE_VERB, target_content_type=target_content_type, target_object_id = obj.id ).delete()
+        if model.__name__=='Image':
+            #action.send(user, verb=_('disliked the photo'), target=obj)
+            ctype = ContentType.objects.get_for_model(user)
+            target_content_type = ContentType.objects.get_for_model(obj)
+            Action.objects.all().filter(actor_content_type=ctype, actor_object_id=user.id, verb=settings.PHOTO_LIKE_VERB, target_content_type=target_content_type, target_object_id = obj.id ).delete()
+        if model.__name__=='BroadcastWish':
+            #action.send(user, verb=_('disliked the photo'), target=obj)
+            ctype = ContentType.objects.get_for_model(user)
+            target_content_type = ContentType.objects.get_for_model(obj)
+            Action.objects.all().filter(actor_content_type=ctype, actor_object_id=user.id, verb=settings.WISH_LIKE_VERB, target_content_type=target_content_type, target_object_id = obj.id ).delete()
+            actions.unfollow(user, obj, send_action=False)
+            follow = Follow.objects.get_follows(obj).filter(user=user)
+            if follow:
+                follow.delete()
+        if model.__name__=='BroadcastDeal':
+            #action.send(user, verb=_('disliked the photo'), target=obj)
+            ctype = ContentType.objects.get_for_model(user)
+            target_content_type = ContentType.objects.get_for_model(obj)
+            Action.objects.all().filter(actor_content_type=ctype, actor_object_id=user.id, verb=settings.DEAL_LIKE_VERB, target_content_type=target_content_type, target_object_id = obj.id ).delete()
+            actions.unfollow(user, obj, send_action=False)
+            follow = Follow.objects.get_follows(obj).filter(user=user)
+            if follow:
+                follow.delete()
+        if model.__name__=='GenericWish':
+            ctype = ContentType.objects.get_for_model(user)
+            target_content_type = ContentType.objects.get_for_model(obj)
+            Action.objects.all().filter(actor_content_type=ctype, actor_object_id=user.id, verb=settings.POST_LIKE_VERB, target_content_type=target_content_type, target_object_id = obj.id ).delete()
+
+            actions.unfollow(user, obj, send_action=False)
+            follow = Follow.objects.get_follows(obj).filter(user=user)
+            if follow:
+                follow.delete()
+
+        if model.__name__ == "ThreadedComment" and isinstance(Comment.objects.get(id=obj.id).content_object, Album):
+            #action.send(user, verb=_('disliked the comment on the album'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)
+            target = Comment.objects.get(id=obj.id).content_object
+            ctype = ContentType.objects.get_for_model(user)
+            target_content_type = ContentType.objects.get_for_model(target)
+            action_object_content_type = ContentType.objects.get_for_model(obj)
+            Action.objects.all().filter(actor_content_type=ctype, actor_object_id=user.id, verb=settings.ALBUM_COMMENT_LIKE_VERB, action_object_content_type=action_object_content_type, action_object_object_id=obj.id, target_content_type=target_content_type, target_object_id = target.id ).delete()
+        if model.__name__ == "ThreadedComment" and isinstance(Comment.objects.get(id=obj.id).content_object, Image):
+            #action.send(user, verb=_('disliked the comment on the image'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)
+            target = Comment.objects.get(id=obj.id).content_object
+            ctype = ContentType.objects.get_for_model(user)
+            target_content_type = ContentType.objects.get_for_model(target)
+            action_object_content_type = ContentType.objects.get_for_model(obj)
+            Action.objects.all().filter(actor_content_type=ctype, actor_object_id=user.id, verb=settings.IMAGE_COMMENT_LIKE_VERB, action_object_content_type=action_object_content_type, action_object_object_id=obj.id, target_content_type=target_content_type, target_object_id = target.id ).delete()
+        if model.__name__ == "ThreadedComment" and type(Comment.objects.get(id=obj.id).content_object) ==  GenericWish:
+            #action.send(user, verb=_('disliked the comment on the image'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)
+            target = Comment.objects.get(id=obj.id).content_object
+            ctype = ContentType.objects.get_for_model(user)
+            target_content_type = ContentType.objects.get_for_model(target)
+            action_object_content_type = ContentType.objects.get_for_model(obj)
+            Action.objects.all().filter(actor_content_type=ctype, actor_object_id=user.id, verb=settings.POST_COMMENT_LIKE_VERB, action_object_content_type=action_object_content_type, action_object_object_id=obj.id, target_content_type=target_content_type, target_object_id = target.id ).delete()
+            actions.unfollow(user, target, send_action=False)
+            follow = Follow.objects.get_follows(target).filter(user=user)
+            if follow:
+                follow.delete()
+        if model.__name__ == "ThreadedComment" and type(Comment.objects.get(id=obj.id).content_object) == BroadcastWish:
+            #action.send(user, verb=_('disliked the comment on the image'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)
+            target = Comment.objects.get(id=obj.id).content_object
+            ctype = ContentType.objects.get_for_model(user)
+            target_content_type = ContentType.objects.get_for_model(target)
+            action_object_content_type = ContentType.objects.get_for_model(obj)
+            Action.objects.all().filter(actor_content_type=ctype, actor_object_id=user.id, verb=settings.WISH_COMMENT_LIKE_VERB, action_object_content_type=action_object_content_type, action_object_object_id=obj.id, target_content_type=target_content_type, target_object_id = target.id ).delete()
+            actions.unfollow(user, target, send_action=False)
+            follow = Follow.objects.get_follows(target).filter(user=user)
+            if follow:
+                follow.delete()
+        if model.__name__ == "ThreadedComment" and type(Comment.objects.get(id=obj.id).content_object) == BroadcastDeal:
+            #action.send(user, verb=_('disliked the comment on the image'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)
+            target = Comment.objects.get(id=obj.id).content_object
+            ctype = ContentType.objects.get_for_model(user)
+            target_content_type = ContentType.objects.get_for_model(target)
+            action_object_content_type = ContentType.objects.get_for_model(obj)
+            Action.objects.all().filter(actor_content_type=ctype, actor_object_id=user.id, verb=settings.DEAL_COMMENT_LIKE_VERB, action_object_content_type=action_object_content_type, action_object_object_id=obj.id, target_content_type=target_content_type, target_object_id = target.id ).delete()
+            follow = Follow.objects.get_follows(target).filter(user=user)
+            if follow:
+                follow.delete()
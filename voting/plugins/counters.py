@@ -0,0 +1,23 @@
+"""
+Like and dislike counters kept on the owners of voted objects, for
+sites whose users have ``num_likes`` and ``num_dislikes`` fields.
+
+Owners are named by the ``settings.VOTING_AUTHOR_FIELD`` field (default
+``'user'``) of voted objects, as for ``voting.audit``. Each change adds
+the difference between the owner's counts under the old and the new
+vote with a single ``UPDATE``, so changing or clearing a vote undoes
+exactly what casting it did.
+"""
+from django.conf import settings
+from django.db.models import F
+
+
+def vote_changed(user, obj, vote, old_vote):
+    owner = getattr(obj, getattr(settings, 'VOTING_AUTHOR_FIELD', 'user'),
+                    None)
+    if owner is None:
+        return
+    owner.__class__._default_manager.filter(pk=owner.pk).update(
+        num_likes=F('num_likes') + (int(vote == 1) - int(old_vote == 1)),
+        num_dislikes=F('num_dislikes') + (int(vote == -1) -
+                                          int(old_vote == -1)))
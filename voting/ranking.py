@@ -0,0 +1,166 @@
+"""
+Batch ranking of every voted object of a content type.
+
+Vote totals are streamed from the votes table in chunks of
+``(object_id, up, down, first_vote)`` rows, loaded into NumPy arrays
+and scored in one go per chunk. The scores are written to the
+``VoteRanking`` table in batches, from which pages of ranked objects
+can be read with an indexed ``ORDER BY``:
+
+    * ``score`` -- upvotes less downvotes.
+    * ``ratio`` -- the fraction of votes which are upvotes.
+    * ``wilson`` -- the lower bound of the Wilson score interval for
+      that fraction, which ranks a few votes below many.
+    * ``decayed`` -- the score divided by the time since the first vote
+      raised to a gravity exponent, so newer objects rise.
+
+NumPy is required to compute rankings, but not to read them.
+"""
+from django.db import connections, router, transaction
+from django.db.backends import util
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from voting import registry
+from voting.models import Vote, VoteRanking
+from voting.utils import now
+
+def _check_dependencies():
+    if numpy is None:
+        raise ImportError('Computing vote rankings requires NumPy.')
+
+def wilson_lower_bound(up, down, z=1.96):
+    """
+    Get the lower bounds of the Wilson score intervals for arrays of
+    upvote and downvote counts, at the confidence given by ``z``.
+    Objects without votes get ``0``.
+    """
+    up = numpy.asarray(up, dtype=numpy.float64)
+    n = up + numpy.asarray(down, dtype=numpy.float64)
+    safe_n = numpy.where(n > 0, n, 1)
+    p = up / safe_n
+    z2 = z * z
+    bound = (p + z2 / (2 * safe_n) -
+             z * numpy.sqrt((p * (1 - p) + z2 / (4 * safe_n)) / safe_n)) / \
+        (1 + z2 / safe_n)
+    return numpy.where(n > 0, bound, 0.0)
+
+def compute_rankings(up, down, first_votes, at=None, gravity=1.8, z=1.96):
+    """
+    Score arrays of upvote counts, downvote counts and first vote times
+    (as ``datetime64`` values), returning a dictionary of arrays keyed
+    by ranking name.
+    """
+    _check_dependencies()
+    up = numpy.asarray(up, dtype=numpy.int64)
+    down = numpy.asarray(down, dtype=numpy.int64)
+    if at is None:
+        at = now()
+    hours = (_datetime64([at])[0] - first_votes) / numpy.timedelta64(1, 'h')
+    hours = numpy.maximum(hours, 0)
+    total = up + down
+    score = up - down
+    return {
+        'score': score,
+        'ratio': numpy.where(total > 0, up / numpy.maximum(total, 1.0), 0.0),
+        'wilson': wilson_lower_bound(up, down, z),
+        'decayed': score / numpy.power(hours + 2, gravity),
+    }
+
+def _datetime64(values):
+    """
+    Convert datetimes, or the strings some backends return for them,
+    to an array of naive ``datetime64`` values.
+    """
+    converted = []
+    for value in values:
+        if isinstance(value, basestring):
+            value = util.typecast_timestamp(value)
+        if value.tzinfo is not None:
+            value = (value - value.utcoffset()).replace(tzinfo=None)
+        converted.append(value)
+    return numpy.array(converted, dtype='datetime64[us]')
+
+def iter_vote_totals(content_type_id, chunk_size=10000, using=None):
+    """
+    Stream the vote totals of every voted object of a content type, in
+    object id order, as ``(object_ids, up, down, first_votes)`` tuples
+    of arrays holding up to ``chunk_size`` objects each.
+    """
+    _check_dependencies()
+    votes = Vote.objects.for_content_type(content_type_id)
+    if using is None:
+        using = votes.reader().db
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    query = """
+    SELECT object_id,
+           SUM(CASE WHEN vote > 0 THEN 1 ELSE 0 END),
+           SUM(CASE WHEN vote < 0 THEN 1 ELSE 0 END),
+           MIN(%s)
+    FROM %s
+    WHERE content_type_id = %%s AND object_id > %%s
+    GROUP BY object_id
+    ORDER BY object_id
+    LIMIT %%s""" % (qn('created'), qn(votes.model._meta.db_table))
+
+    last_id = 0
+    while True:
+        cursor = connection.cursor()
+        cursor.execute(query, [content_type_id, last_id, chunk_size])
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        object_ids, up, down, first_votes = zip(*rows)
+        yield (numpy.array(object_ids, dtype=numpy.int64),
+               numpy.array(up, dtype=numpy.int64),
+               numpy.array(down, dtype=numpy.int64),
+               _datetime64(first_votes))
+        if len(rows) < chunk_size:
+            break
+        last_id = rows[-1][0]
+
+def rerank(model, chunk_size=10000, batch_size=1000, gravity=1.8, z=1.96,
+           progress=None):
+    """
+    Recompute the rankings of every voted object of ``model``, replacing
+    its rows in the ``VoteRanking`` table. Rankings of objects which no
+    longer have any votes are removed.
+
+    ``progress``, if given, is called with the number of objects ranked
+    so far after each chunk. Returns the number of objects ranked.
+    """
+    _check_dependencies()
+    content_type_id = registry.site.get_content_type_id(model)
+    using = router.db_for_write(VoteRanking)
+    rankings = VoteRanking.objects.db_manager(using).filter(
+        content_type__pk=content_type_id)
+    started = now()
+    total = 0
+    for object_ids, up, down, first_votes in iter_vote_totals(
+            content_type_id, chunk_size):
+        scores = compute_rankings(up, down, first_votes, started, gravity, z)
+        columns = zip(object_ids.tolist(), up.tolist(), down.tolist(),
+                      scores['score'].tolist(), scores['ratio'].tolist(),
+                      scores['wilson'].tolist(), scores['decayed'].tolist())
+        for i in range(0, len(columns), batch_size):
+            batch = columns[i:i + batch_size]
+            with transaction.commit_on_success(using=using):
+                rankings.filter(object_id__in=[row[0] for row in batch]).delete()
+                VoteRanking.objects.db_manager(using).bulk_create([
+                    VoteRanking(content_type_id=content_type_id,
+                                object_id=object_id, num_up=num_up,
+                                num_down=num_down, score=score, ratio=ratio,
+                                wilson=wilson, decayed=decayed,
+                                computed=started)
+                    for object_id, num_up, num_down, score, ratio, wilson,
+                        decayed in batch])
+        total += len(object_ids)
+        if progress is not None:
+            progress(total)
+    with transaction.commit_on_success(using=using):
+        rankings.filter(computed__lt=started).delete()
+    return total
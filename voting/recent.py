@@ -0,0 +1,157 @@
+"""
+Bounded previews of the users who most recently upvoted each object.
+
+For "liked by A, B and 40 others" the ids and usernames of the last
+``settings.VOTING_RECENT_VOTERS`` (default ``3``) upvoters of an object
+are kept in the cache, most recent first. Set ``VOTING_RECENT_VOTERS``
+to ``0`` to turn previews off.
+
+Each object has a sequence number in the cache, incremented once each
+change to its upvoters has been committed, and its preview is stored
+with the sequence number it is current for. Recording a vote updates
+the preview in place if it was current for the number before the
+increment - a compare-and-set which no two writers can both win, as
+``incr`` hands each of them a different number. Otherwise the preview
+is left outdated, as it is when a full preview loses one of its
+upvoters, and it is rebuilt from the primary database the next time it
+is read. Rebuilds read the sequence number before the votes, so a
+preview is never current for a number incremented after a vote it
+doesn't include. Missing and outdated previews are rebuilt together,
+with one query per content type.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+RECENT_KEY = 'voting:recent:%s:%s'
+SEQUENCE_KEY = 'voting:recent-sequence:%s:%s'
+
+# Objects whose previews are read per query.
+QUERY_CHUNK_SIZE = 100
+
+def get_size():
+    return getattr(settings, 'VOTING_RECENT_VOTERS', 3)
+
+def _recent_key(content_type_id, object_id):
+    return RECENT_KEY % (content_type_id, object_id)
+
+def _sequence_key(content_type_id, object_id):
+    return SEQUENCE_KEY % (content_type_id, object_id)
+
+def _start_sequence(key):
+    """
+    Get the sequence number stored under ``key``, starting a new
+    sequence if there is none, or ``None`` if it can't be read.
+    """
+    # Sequences start from the current time in microseconds, beyond any
+    # number an evicted sequence could have been incremented to.
+    sequence = int(time.time() * 1000000)
+    if cache.add(key, sequence):
+        return sequence
+    return cache.get(key)
+
+def votes_committed(changes, usernames):
+    """
+    Bring the previews of objects whose upvoters changed up to date,
+    once the changes have been committed.
+
+    ``changes`` is a list of ``(content_type_id, object_id, user_id,
+    old_vote, new_vote, created)`` tuples and ``usernames`` maps user
+    ids to usernames; previews gaining an upvoter whose username isn't
+    given are left to be rebuilt.
+    """
+    size = get_size()
+    if not size:
+        return
+    for content_type_id, object_id, user_id, old_vote, new_vote, \
+            created in changes:
+        if (old_vote == 1) == (new_vote == 1):
+            continue
+        try:
+            sequence = cache.incr(_sequence_key(content_type_id, object_id))
+        except ValueError:
+            # No sequence, so no preview can be current.
+            continue
+        key = _recent_key(content_type_id, object_id)
+        version, preview = cache.get(key, (None, None))
+        if version != sequence - 1:
+            continue
+        voters = [voter for voter in preview if voter[0] != user_id]
+        if new_vote == 1:
+            if user_id not in usernames:
+                continue
+            voters.insert(0, (user_id, usernames[user_id]))
+        elif len(voters) < len(preview) and len(preview) >= size:
+            # The upvoter who would take its place isn't known.
+            continue
+        cache.set(key, (sequence, voters[:size]))
+
+def _read_previews(content_type_id, object_ids, size):
+    """
+    Read the ``(id, username)`` tuples of up to ``size`` most recent
+    upvoters of each of the given objects of a content type from the
+    primary database, with one query per ``QUERY_CHUNK_SIZE`` objects:
+    a ``UNION ALL`` of a limited query per object.
+    """
+    from voting.models import Vote
+    votes = Vote.objects.for_content_type(content_type_id).writer()
+    connection = connections[votes.db]
+    previews = dict([(object_id, []) for object_id in object_ids])
+    for i in range(0, len(object_ids), QUERY_CHUNK_SIZE):
+        parts, params = [], []
+        for object_id in object_ids[i:i + QUERY_CHUNK_SIZE]:
+            query = votes.filter(
+                content_type__pk=content_type_id, object_id=object_id, vote=1,
+            ).order_by('-updated', '-id').values_list(
+                'object_id', 'user__id', 'user__username')[:size].query
+            sql, query_params = query.get_compiler(votes.db).as_sql()
+            parts.append('SELECT * FROM (%s) r%d' % (sql, len(parts)))
+            params.extend(query_params)
+        cursor = connection.cursor()
+        cursor.execute(' UNION ALL '.join(parts), params)
+        for object_id, user_id, username in cursor.fetchall():
+            previews[object_id].append((user_id, username))
+    return previews
+
+def get_recent_voters(pairs):
+    """
+    Get a dictionary mapping ``(content_type_id, object_id)`` pairs to
+    lists of ``{'id': ..., 'username': ...}`` dictionaries for the most
+    recent upvoters of each object, most recent first.
+
+    Previews and sequence numbers are read from the cache with one
+    lookup; any previews which are missing or outdated are rebuilt with
+    one query per content type.
+    """
+    size = get_size()
+    if not size:
+        return dict([(pair, []) for pair in pairs])
+    keys = dict([(_recent_key(*pair), pair) for pair in pairs])
+    sequence_keys = dict([(pair, _sequence_key(*pair)) for pair in pairs])
+    cached = cache.get_many(keys.keys() + sequence_keys.values())
+    previews, missing, sequences = {}, {}, {}
+    for key, pair in keys.items():
+        sequence = cached.get(sequence_keys[pair])
+        if sequence is None:
+            sequence = _start_sequence(sequence_keys[pair])
+        version, preview = cached.get(key, (None, None))
+        if sequence is not None and version == sequence:
+            previews[pair] = preview
+        else:
+            sequences[pair] = sequence
+            missing.setdefault(pair[0], []).append(pair[1])
+    rebuilt = {}
+    for content_type_id, object_ids in missing.items():
+        for object_id, preview in _read_previews(content_type_id, object_ids,
+                                                 size).items():
+            pair = (content_type_id, object_id)
+            previews[pair] = preview
+            if sequences[pair] is not None:
+                rebuilt[_recent_key(*pair)] = (sequences[pair], preview)
+    if rebuilt:
+        cache.set_many(rebuilt)
+    return dict([(pair, [{'id': user_id, 'username': username}
+                         for user_id, username in preview])
+                 for pair, preview in previews.items()])
@@ -0,0 +1,311 @@
+"""
+"People who liked this also liked" recommendations built from upvotes.
+
+For each votable model, an item-item co-occurrence matrix - how many
+users upvoted both of two objects - is built from the votes table in a
+batch job, with upvotes read in chunks and the matrix held as a SciPy
+sparse array. The top neighbours of every object are stored in the
+``AlsoLiked`` table, from which they are served.
+
+If ``settings.VOTING_ALSO_LIKED_DIR`` names a directory, the matrix and
+the upvotes it was built from are saved there after each build, so
+later runs can recount only the users whose votes were cast or changed
+since, found by the votes' ``updated`` time. Withdrawn votes are
+deleted rather than changed, so an upvote withdrawn by a user who casts
+no other vote is only dropped by a full rebuild; ``update`` rebuilds
+once the last full build is older than its ``max_age``.
+
+NumPy and SciPy are required to build the index, but not to serve it.
+"""
+import datetime
+import os
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils.dateparse import parse_datetime
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:
+    numpy = sparse = None
+
+from voting import registry
+from voting.models import AlsoLiked, Vote
+from voting.utils import now
+
+# How far before the previous run's start to look for changed votes, so
+# votes committed by transactions which were open then aren't missed.
+# Recounting a user twice is harmless.
+CHANGES_MARGIN = datetime.timedelta(minutes=5)
+
+
+def _check_dependencies():
+    if numpy is None or sparse is None:
+        raise ImportError('Building "also liked" recommendations requires '
+                          'NumPy and SciPy.')
+
+def cooccurrence_matrix(user_ids, object_ids, num_objects=None):
+    """
+    Build a sparse item-item co-occurrence matrix from parallel arrays of
+    the users and objects (as dense indices) of upvotes.
+
+    Element ``[i, j]`` holds the number of users who upvoted both object
+    ``i`` and object ``j``; the diagonal is zero.
+    """
+    _check_dependencies()
+    if num_objects is None:
+        num_objects = len(object_ids) and int(object_ids.max()) + 1 or 0
+    users, user_index = numpy.unique(user_ids, return_inverse=True)
+    return _cooccurrences(_likes_matrix(user_index, object_ids,
+                                        (len(users), num_objects)))
+
+def _likes_matrix(user_index, object_index, shape):
+    likes = sparse.csr_matrix(
+        (numpy.ones(len(object_index), dtype=numpy.int32),
+         (user_index, object_index)), shape=shape)
+    # Duplicate upvotes would otherwise count twice.
+    likes.data[:] = 1
+    return likes
+
+def _cooccurrences(likes):
+    matrix = likes.T * likes
+    matrix = (matrix - sparse.diags(matrix.diagonal(), dtype=matrix.dtype)).tocsr()
+    matrix.eliminate_zeros()
+    return matrix
+
+def top_neighbours(matrix, k, rows=None):
+    """
+    Yield ``(row, neighbours)`` tuples giving, for each row of a sparse
+    co-occurrence matrix - or only the given rows - a list of up to
+    ``k`` ``(column, count)`` tuples, highest count first.
+    """
+    matrix = matrix.tocsr()
+    if rows is None:
+        rows = xrange(matrix.shape[0])
+    for row in rows:
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            yield row, []
+            continue
+        columns = matrix.indices[start:end]
+        counts = matrix.data[start:end]
+        order = numpy.lexsort((columns, -counts))[:k]
+        yield row, zip(columns[order].tolist(), counts[order].tolist())
+
+
+class AlsoLikedIndex(object):
+    """
+    Builds and incrementally updates the ``AlsoLiked`` neighbours of
+    one votable model.
+    """
+    def __init__(self, model, k=10, chunk_size=50000):
+        self.model = model
+        self.k = k
+        self.chunk_size = chunk_size
+        self.content_type_id = registry.site.get_content_type_id(model)
+
+    def _state_path(self):
+        directory = getattr(settings, 'VOTING_ALSO_LIKED_DIR', None)
+        if directory is None:
+            return None
+        return os.path.join(directory, 'also_liked_%s.npz'
+                            % self.content_type_id)
+
+    def _read_upvotes(self):
+        """
+        Read the upvotes on the model in chunks, returning arrays of
+        user ids and object ids.
+        """
+        user_chunks, object_chunks = [], []
+        users, objects = [], []
+        for id, content_type_id, object_id, user_id, vote, created in \
+                Vote.objects.iter_votes(content_type_ids=[self.content_type_id],
+                                        chunk_size=self.chunk_size):
+            if vote != 1:
+                continue
+            users.append(user_id)
+            objects.append(object_id)
+            if len(users) >= self.chunk_size:
+                user_chunks.append(numpy.array(users, dtype=numpy.int64))
+                object_chunks.append(numpy.array(objects, dtype=numpy.int64))
+                users, objects = [], []
+        user_chunks.append(numpy.array(users, dtype=numpy.int64))
+        object_chunks.append(numpy.array(objects, dtype=numpy.int64))
+        return numpy.concatenate(user_chunks), numpy.concatenate(object_chunks)
+
+    def build(self):
+        """
+        Rebuild the co-occurrence matrix and all neighbours of the model
+        from scratch. Returns the number of objects indexed.
+        """
+        _check_dependencies()
+        started = now()
+        user_ids, object_ids = self._read_upvotes()
+        users, user_index = numpy.unique(user_ids, return_inverse=True)
+        item_ids, item_index = numpy.unique(object_ids, return_inverse=True)
+        likes = _likes_matrix(user_index, item_index,
+                              (len(users), len(item_ids)))
+        matrix = _cooccurrences(likes)
+        self._write_neighbours(matrix, item_ids, None)
+        self._save_state(matrix, likes, users, item_ids, started, started)
+        return len(item_ids)
+
+    def update(self, max_age=None):
+        """
+        Recount the upvotes of the users whose votes on the model were
+        cast or changed since the last build or update, and rewrite the
+        neighbours of the objects whose co-occurrences changed. Returns
+        the number of objects reindexed.
+
+        Falls back to a full build if there is no saved matrix, or if
+        ``max_age`` is given and the last full build is older than that
+        ``timedelta``.
+        """
+        _check_dependencies()
+        state = self._load_state()
+        started = now()
+        if state is None or (max_age is not None and
+                             state['built'] < started - max_age):
+            return self.build()
+        matrix, likes = state['matrix'], state['likes']
+        old_user_ids, old_item_ids = state['user_ids'], state['item_ids']
+
+        votes = Vote.objects.for_content_type(self.content_type_id).reader(
+            ).filter(content_type__pk=self.content_type_id)
+        affected = sorted(set(votes.filter(
+            updated__gte=state['since'] - CHANGES_MARGIN,
+        ).values_list('user', flat=True)))
+        if not affected:
+            self._save_state(matrix, likes, old_user_ids, old_item_ids,
+                             state['built'], started)
+            return 0
+
+        # The affected users' upvotes as counted in the matrix, and now.
+        affected = numpy.array(affected, dtype=numpy.int64)
+        known = affected[numpy.in1d(affected, old_user_ids)]
+        old_likes = likes[numpy.searchsorted(old_user_ids, known)].tocoo()
+        old_users = known[old_likes.row]
+        old_objects = old_item_ids[old_likes.col]
+        new_users, new_objects = [], []
+        for i in range(0, len(affected), 500):
+            for user_id, object_id in votes.filter(
+                    vote=1, user__pk__in=affected[i:i + 500].tolist(),
+                    ).values_list('user', 'object_id'):
+                new_users.append(user_id)
+                new_objects.append(object_id)
+        new_users = numpy.array(new_users, dtype=numpy.int64)
+        new_objects = numpy.array(new_objects, dtype=numpy.int64)
+
+        item_ids = numpy.union1d(old_item_ids, new_objects)
+        matrix = _resize(matrix, old_item_ids, item_ids)
+        old_index = numpy.searchsorted(item_ids, old_objects)
+        new_index = numpy.searchsorted(item_ids, new_objects)
+        delta = cooccurrence_matrix(new_users, new_index, len(item_ids)) - \
+            cooccurrence_matrix(old_users, old_index, len(item_ids))
+        delta = delta.tocsr()
+        delta.eliminate_zeros()
+        matrix = (matrix + delta).tocsr()
+        matrix.eliminate_zeros()
+
+        # Replace the affected users' rows of the upvotes.
+        likes = likes.tocoo()
+        kept = ~numpy.in1d(old_user_ids[likes.row], affected)
+        user_ids = numpy.union1d(old_user_ids, affected)
+        likes = _likes_matrix(
+            numpy.concatenate([
+                numpy.searchsorted(user_ids, old_user_ids[likes.row[kept]]),
+                numpy.searchsorted(user_ids, new_users)]),
+            numpy.concatenate([
+                numpy.searchsorted(item_ids, old_item_ids[likes.col[kept]]),
+                new_index]),
+            (len(user_ids), len(item_ids)))
+
+        changed = numpy.unique(delta.nonzero()[0])
+        self._write_neighbours(matrix, item_ids, changed)
+        self._save_state(matrix, likes, user_ids, item_ids, state['built'],
+                         started)
+        return len(changed)
+
+    def _write_neighbours(self, matrix, item_ids, rows):
+        """
+        Replace the stored neighbours of the given matrix rows, or of
+        every object of the model if ``rows`` is ``None``.
+        """
+        existing = AlsoLiked.objects.filter(
+            content_type__pk=self.content_type_id)
+        if rows is None:
+            row_chunks = [None]
+        else:
+            rows = [int(row) for row in rows]
+            row_chunks = [rows[i:i + 500] for i in range(0, len(rows), 500)]
+        for chunk in row_chunks:
+            with transaction.commit_on_success(
+                    using=router.db_for_write(AlsoLiked)):
+                if chunk is None:
+                    existing.delete()
+                else:
+                    existing.filter(object_id__in=[int(item_ids[row])
+                                                   for row in chunk]).delete()
+                neighbours = []
+                for row, columns in top_neighbours(matrix, self.k, chunk):
+                    for rank, (column, count) in enumerate(columns):
+                        neighbours.append(AlsoLiked(
+                            content_type_id=self.content_type_id,
+                            object_id=int(item_ids[row]),
+                            similar_object_id=int(item_ids[column]),
+                            count=count, rank=rank))
+                        if len(neighbours) >= 100:
+                            AlsoLiked.objects.bulk_create(neighbours)
+                            neighbours = []
+                if neighbours:
+                    AlsoLiked.objects.bulk_create(neighbours)
+
+    def _save_state(self, matrix, likes, user_ids, item_ids, built, since):
+        path = self._state_path()
+        if path is None:
+            return
+        matrix, likes = matrix.tocsr(), likes.tocsr()
+        numpy.savez(path, data=matrix.data, indices=matrix.indices,
+                    indptr=matrix.indptr, shape=matrix.shape,
+                    likes_indices=likes.indices, likes_indptr=likes.indptr,
+                    likes_shape=likes.shape, user_ids=user_ids,
+                    item_ids=item_ids, built=built.isoformat(),
+                    since=since.isoformat())
+
+    def _load_state(self):
+        path = self._state_path()
+        if path is None or not os.path.exists(path):
+            return None
+        state = numpy.load(path)
+        if 'likes_indices' not in state.files:
+            # Saved by an earlier version, without the upvotes.
+            return None
+        likes_indices = state['likes_indices']
+        return {
+            'matrix': sparse.csr_matrix(
+                (state['data'], state['indices'], state['indptr']),
+                shape=tuple(state['shape'])),
+            'likes': sparse.csr_matrix(
+                (numpy.ones(len(likes_indices), dtype=numpy.int32),
+                 likes_indices, state['likes_indptr']),
+                shape=tuple(state['likes_shape'])),
+            'user_ids': state['user_ids'],
+            'item_ids': state['item_ids'],
+            'built': parse_datetime(str(state['built'])),
+            'since': parse_datetime(str(state['since'])),
+        }
+
+def _resize(matrix, old_ids, new_ids):
+    """
+    Re-index a square co-occurrence matrix whose rows and columns
+    correspond to the sorted ``old_ids`` so they correspond to the
+    sorted superset ``new_ids``.
+    """
+    if len(old_ids) == len(new_ids):
+        return matrix
+    positions = numpy.searchsorted(new_ids, old_ids)
+    matrix = matrix.tocoo()
+    return sparse.csr_matrix(
+        (matrix.data, (positions[matrix.row], positions[matrix.col])),
+        shape=(len(new_ids), len(new_ids)))
@@ -0,0 +1,178 @@
+import threading
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+
+class AlreadyRegistered(Exception):
+    pass
+
+
+class NotRegistered(Exception):
+    pass
+
+
+class VotingRegistry(object):
+    """
+    Keeps track of the models which may be voted on, and maps them to
+    and from their content type ids without hitting the database once
+    the map has been populated.
+
+    Models are registered by listing ``'app_label.ModelName'`` labels
+    in ``settings.VOTING_MODELS``, or by calling ``register``.
+    """
+    def __init__(self):
+        self._models = set()
+        self._ctype_ids = {}
+        self._by_ctype_id = {}
+        self._populated = False
+        self._lock = threading.RLock()
+
+    def register(self, model_or_iterable):
+        """
+        Register the given model, or iterable of models, as votable.
+        """
+        if isinstance(model_or_iterable, models.base.ModelBase):
+            model_or_iterable = [model_or_iterable]
+        self._lock.acquire()
+        try:
+            for model in model_or_iterable:
+                if model in self._models:
+                    raise AlreadyRegistered('The model %s is already '
+                                            'registered for voting.'
+                                            % model.__name__)
+                self._models.add(model)
+            self.clear_cache()
+        finally:
+            self._lock.release()
+
+    def unregister(self, model_or_iterable):
+        """
+        Stop the given model, or iterable of models, being votable.
+        """
+        if isinstance(model_or_iterable, models.base.ModelBase):
+            model_or_iterable = [model_or_iterable]
+        self._lock.acquire()
+        try:
+            for model in model_or_iterable:
+                if model not in self._models:
+                    raise NotRegistered('The model %s is not registered '
+                                        'for voting.' % model.__name__)
+                self._models.remove(model)
+            self.clear_cache()
+        finally:
+            self._lock.release()
+
+    def clear_cache(self):
+        """
+        Forget resolved content type ids; they will be resolved again
+        on the next lookup.
+        """
+        self._lock.acquire()
+        try:
+            self._ctype_ids = {}
+            self._by_ctype_id = {}
+            self._populated = False
+        finally:
+            self._lock.release()
+
+    def populate(self):
+        """
+        Load models listed in ``settings.VOTING_MODELS`` and resolve the
+        content type ids of all registered models in one go.
+        """
+        if self._populated:
+            return
+        self._lock.acquire()
+        try:
+            if self._populated:
+                return
+            for label in getattr(settings, 'VOTING_MODELS', ()):
+                app_label, model_name = label.split('.')
+                model = models.get_model(app_label, model_name)
+                if model is None:
+                    raise NotRegistered('VOTING_MODELS refers to %r, which '
+                                        'is not an installed model.' % label)
+                self._models.add(model)
+            ctype_ids = {}
+            by_ctype_id = {}
+            for model in self._models:
+                ctype_id = ContentType.objects.get_for_model(model).id
+                ctype_ids[model] = ctype_id
+                by_ctype_id[ctype_id] = model
+            self._ctype_ids = ctype_ids
+            self._by_ctype_id = by_ctype_id
+            self._populated = True
+        finally:
+            self._lock.release()
+
+    def get_models(self):
+        """
+        Get a list of the registered model classes, ordered by label.
+        """
+        self.populate()
+        return sorted(self._ctype_ids, key=lambda model: (
+            model._meta.app_label, model._meta.object_name))
+
+    def is_registered(self, model):
+        self.populate()
+        return _concrete_model(model) in self._ctype_ids
+
+    def get_content_type_id(self, model):
+        """
+        Get the content type id for the given model class or instance.
+
+        Raises ``NotRegistered`` for unregistered models, without making
+        any query, unless ``settings.VOTING_ALLOW_UNREGISTERED`` is
+        ``True``, in which case they fall back to ``ContentType``'s own
+        lookup.
+        """
+        self.populate()
+        model = _concrete_model(model)
+        try:
+            return self._ctype_ids[model]
+        except KeyError:
+            if not getattr(settings, 'VOTING_ALLOW_UNREGISTERED', False):
+                raise NotRegistered('The model %s is not registered for '
+                                    'voting.' % model.__name__)
+            return ContentType.objects.get_for_model(model).id
+
+    def get_model(self, content_type_id):
+        """
+        Get the registered model class for the given content type id.
+
+        Raises ``NotRegistered`` if no registered model has that
+        content type id.
+        """
+        self.populate()
+        try:
+            return self._by_ctype_id[int(content_type_id)]
+        except (KeyError, ValueError, TypeError):
+            raise NotRegistered('Content type %r is not registered for '
+                                'voting.' % (content_type_id,))
+
+    def resolve(self, content_type_id):
+        """
+        Get a ``(model, manager)`` tuple for the given content type id.
+        """
+        model = self.get_model(content_type_id)
+        return model, model._default_manager
+
+    def check(self, model):
+        """
+        Raise ``NotRegistered`` unless the given model class or instance
+        is registered for voting.
+        """
+        if not self.is_registered(model):
+            raise NotRegistered('The model %s is not registered for voting.'
+                                % _concrete_model(model).__name__)
+
+def _concrete_model(model):
+    if not isinstance(model, models.base.ModelBase):
+        model = model.__class__
+    if model._deferred:
+        model = model._meta.proxy_for_model
+    return model
+
+site = VotingRegistry()
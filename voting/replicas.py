@@ -0,0 +1,109 @@
+"""
+Routing of vote reads to a read replica.
+
+If ``settings.VOTING_READ_DATABASE`` names a database alias, reads made
+through ``VoteManager`` go to that database, except for the reads of
+users who recorded a vote within the last
+``settings.VOTING_STICKY_SECONDS`` seconds, which stay on the primary
+so those users never see counts which don't include their own vote.
+Reads made without a user by the thread which recorded the vote stay
+on the primary for as long, or until ``clear_current_user`` is called.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+
+PINNED_KEY = 'voting:pinned:%s'
+PINNED_COOKIE = 'voting_pinned'
+
+_local = threading.local()
+
+def _user_id(user):
+    if user is None:
+        return None
+    if hasattr(user, 'is_authenticated'):
+        if not user.is_authenticated():
+            return None
+        return user.pk
+    return user
+
+def pin_user(user):
+    """
+    Send the given user's vote reads to the primary database for the
+    next ``settings.VOTING_STICKY_SECONDS`` seconds.
+    """
+    user_id = _user_id(user)
+    if user_id is not None and get_replica_database() is not None:
+        cache.set(PINNED_KEY % user_id, True, get_sticky_seconds())
+        _local.pinned_until = time.time() + get_sticky_seconds()
+
+def is_pinned(user):
+    user_id = _user_id(user)
+    return user_id is not None and bool(cache.get(PINNED_KEY % user_id))
+
+def is_thread_pinned():
+    """
+    Whether the current thread recorded a vote within the last
+    ``settings.VOTING_STICKY_SECONDS`` seconds, or its user is pinned.
+    """
+    return (getattr(_local, 'pinned_until', 0) > time.time() or
+            is_pinned(getattr(_local, 'user_id', None)))
+
+def get_sticky_seconds():
+    return getattr(settings, 'VOTING_STICKY_SECONDS', 5)
+
+def set_current_user(user):
+    """
+    Make ``user`` the user whose stickiness applies to reads made by the
+    current thread without an explicit user.
+    """
+    _local.user_id = _user_id(user)
+
+def clear_current_user():
+    _local.user_id = None
+    _local.pinned_until = 0
+
+def get_replica_database():
+    return getattr(settings, 'VOTING_READ_DATABASE', None)
+
+def get_read_database(model, user=None):
+    """
+    Get the alias of the database to read ``model`` from on behalf of
+    ``user``, or of the current thread's user if no user is given.
+    """
+    replica = get_replica_database()
+    if replica is None:
+        return router.db_for_read(model)
+    if (user is None and is_thread_pinned()) or is_pinned(user):
+        return router.db_for_write(model)
+    return replica
+
+
+class VotingRouter(object):
+    """
+    A database router which sends reads of the voting app's models to
+    ``settings.VOTING_READ_DATABASE``, honouring read-your-writes
+    stickiness for the current thread's user. Writes are left to the
+    other routers, or the default database.
+    """
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'voting':
+            return None
+        replica = get_replica_database()
+        if replica is None or is_thread_pinned():
+            return None
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_syncdb(self, db, model):
+        if model._meta.app_label == 'voting' and db == get_replica_database():
+            return False
+        return None
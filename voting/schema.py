@@ -0,0 +1,186 @@
+"""
+Upgrades for vote tables created by earlier versions of the voting app.
+
+``syncdb`` creates missing tables but never alters existing ones, so a
+``votes`` table from before votes were timestamped lacks the
+``created`` and ``updated`` columns. ``upgrade_votes`` adds them as
+nullable columns, fills them in batches of rows, then makes them
+``NOT NULL`` and indexes them as ``syncdb`` would have. The
+``upgrade_votes`` management command runs it, or prints the SQL for
+applying by hand.
+
+Django can't declare indexes on more than one column, so those listed
+in ``voting.models.COMPOSITE_INDEXES`` are created here: by ``syncdb``
+along with their tables, and by ``upgrade_votes`` on existing tables.
+"""
+import sys
+
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.db.backends.util import truncate_name
+
+TIMESTAMP_COLUMNS = ('created', 'updated')
+
+def get_missing_columns(model, using=None):
+    """
+    Get the names of the timestamp columns missing from ``model``'s
+    table.
+    """
+    if using is None:
+        using = router.db_for_write(model)
+    connection = connections[using]
+    cursor = connection.cursor()
+    existing = [row[0] for row in connection.introspection.get_table_description(
+        cursor, model._meta.db_table)]
+    return [name for name in TIMESTAMP_COLUMNS if name not in existing]
+
+def get_upgrade_sql(model, columns, using=None):
+    """
+    Get ``(add, fill, finish)`` lists of SQL statements adding the given
+    timestamp columns to ``model``'s table. ``fill`` statements take
+    the timestamp to fill in as their parameter.
+    """
+    if using is None:
+        using = router.db_for_write(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    add, fill, finish = [], [], []
+    for name in columns:
+        field = model._meta.get_field(name)
+        column = qn(field.column)
+        db_type = field.db_type(connection=connection)
+        add.append('ALTER TABLE %s ADD COLUMN %s %s NULL' % (
+            table, column, db_type))
+        fill.append('UPDATE %s SET %s = %%s WHERE %s IS NULL' % (
+            table, column, column))
+        if connection.vendor == 'postgresql':
+            finish.append('ALTER TABLE %s ALTER COLUMN %s SET NOT NULL' % (
+                table, column))
+        elif connection.vendor == 'mysql':
+            finish.append('ALTER TABLE %s MODIFY %s %s NOT NULL' % (
+                table, column, db_type))
+        # SQLite can't add constraints to existing columns; the column
+        # stays nullable there.
+        finish.extend([statement.rstrip(';') for statement in
+                       connection.creation.sql_indexes_for_field(
+                           model, field, no_style())])
+    return add, fill, finish
+
+def upgrade_votes(model, timestamp, batch_size=10000, using=None,
+                  progress=None):
+    """
+    Add any missing timestamp columns to ``model``'s table, filling them
+    with ``timestamp`` a batch of ``batch_size`` rows per transaction,
+    so the table is never locked for long. Returns the names of the
+    columns added.
+
+    ``progress``, if given, is called with the last id filled after each
+    batch.
+    """
+    if using is None:
+        using = router.db_for_write(model)
+    columns = get_missing_columns(model, using)
+    if not columns:
+        return []
+    add, fill, finish = get_upgrade_sql(model, columns, using)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    value = connection.ops.value_to_db_datetime(timestamp)
+    fill = ['%s AND %s > %%s AND %s <= %%s' % (statement, qn('id'), qn('id'))
+            for statement in fill]
+    with transaction.commit_on_success(using=using):
+        cursor = connection.cursor()
+        for statement in add:
+            cursor.execute(statement)
+        cursor.execute('SELECT MAX(%s) FROM %s' % (
+            qn('id'), qn(model._meta.db_table)))
+        max_id = cursor.fetchone()[0] or 0
+    last_id = 0
+    while last_id < max_id:
+        with transaction.commit_on_success(using=using):
+            cursor = connection.cursor()
+            for statement in fill:
+                cursor.execute(statement, [value, last_id,
+                                           last_id + batch_size])
+        last_id += batch_size
+        if progress is not None:
+            progress(min(last_id, max_id))
+    with transaction.commit_on_success(using=using):
+        cursor = connection.cursor()
+        # Catch votes added by the old code since the columns were added.
+        for statement in fill:
+            cursor.execute(statement, [value, max_id, sys.maxint])
+        for statement in finish:
+            cursor.execute(statement)
+    return columns
+
+def get_index_sql(model, using=None):
+    """
+    Get ``(name, statement)`` tuples creating the composite indexes
+    listed for ``model`` in ``voting.models.COMPOSITE_INDEXES``.
+    """
+    from voting.models import COMPOSITE_INDEXES
+    if using is None:
+        using = router.db_for_write(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    indexes = []
+    for field_names in COMPOSITE_INDEXES.get(model, ()):
+        columns = [model._meta.get_field(name).column for name in field_names]
+        name = truncate_name('%s_%s' % (table, '_'.join(columns)),
+                             connection.ops.max_name_length())
+        indexes.append((name, 'CREATE INDEX %s ON %s (%s)' % (
+            qn(name), qn(table), ', '.join([qn(column)
+                                            for column in columns]))))
+    return indexes
+
+def _index_exists(connection, table, name):
+    cursor = connection.cursor()
+    if connection.vendor == 'postgresql':
+        cursor.execute('SELECT 1 FROM pg_indexes WHERE indexname = %s',
+                       [name])
+    elif connection.vendor == 'mysql':
+        cursor.execute('SHOW INDEX FROM %s WHERE Key_name = %%s'
+                       % connection.ops.quote_name(table), [name])
+    else:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' "
+                       "AND name = %s", [name])
+    return cursor.fetchone() is not None
+
+def get_missing_indexes(model, using=None):
+    """
+    Get ``(name, statement)`` tuples for the composite indexes missing
+    from ``model``'s table.
+    """
+    if using is None:
+        using = router.db_for_write(model)
+    connection = connections[using]
+    return [(name, statement) for name, statement
+            in get_index_sql(model, using)
+            if not _index_exists(connection, model._meta.db_table, name)]
+
+def create_indexes(model, using=None):
+    """
+    Create the composite indexes missing from ``model``'s table,
+    returning their names.
+    """
+    if using is None:
+        using = router.db_for_write(model)
+    missing = get_missing_indexes(model, using)
+    with transaction.commit_on_success(using=using):
+        cursor = connections[using].cursor()
+        for name, statement in missing:
+            cursor.execute(statement)
+    return [name for name, statement in missing]
+
+def create_indexes_on_syncdb(sender, created_models, db=None, **kwargs):
+    """
+    Create the composite indexes of the models whose tables ``syncdb``
+    created.
+    """
+    from voting.models import COMPOSITE_INDEXES
+    for model in created_models:
+        if model in COMPOSITE_INDEXES:
+            create_indexes(model, db)
@@ -0,0 +1,172 @@
+"""
+Columnar binary snapshots of votes, for offline jobs.
+
+A snapshot stores one fixed-width, little-endian array per column:
+
+    ===================  =======  ====================================
+    Column               Type     Contents
+    ===================  =======  ====================================
+    ``content_type_id``  int32
+    ``object_id``        uint32
+    ``user_id``          uint32
+    ``vote``             int8     ``+1`` or ``-1``
+    ``created``          int64    Seconds since the UNIX epoch
+    ===================  =======  ====================================
+
+after a small header holding the magic string ``VOTESNAP``, the format
+version, the number of votes and the name, type and byte offset of
+each column. Columns start on 8 byte boundaries.
+
+Writing snapshots needs nothing beyond the standard library. Reading
+them with ``load_snapshot`` memory-maps the file and exposes each
+column as a NumPy array backed directly by the mapped pages, so loading
+takes the same time whatever the size of the snapshot, only the pages
+a job touches are read, and processes reading the same snapshot share
+them through the page cache.
+"""
+import calendar
+import os
+import shutil
+import struct
+import tempfile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAGIC = 'VOTESNAP'
+VERSION = 1
+
+# (name, NumPy type, struct format) for each column, in file order.
+COLUMNS = (
+    ('content_type_id', '<i4', 'i'),
+    ('object_id', '<u4', 'I'),
+    ('user_id', '<u4', 'I'),
+    ('vote', '<i1', 'b'),
+    ('created', '<i8', 'q'),
+)
+
+HEADER = struct.Struct('<8sHHQ')
+COLUMN_HEADER = struct.Struct('<16s4sQ')
+
+def _check_dependencies():
+    if numpy is None:
+        raise ImportError('Reading vote snapshots requires NumPy.')
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+def _timestamp(value):
+    """
+    Convert a datetime to seconds since the UNIX epoch. Naive datetimes
+    are taken as they are, as if they were in UTC.
+    """
+    if value.tzinfo is not None:
+        return calendar.timegm(value.utctimetuple())
+    return calendar.timegm(value.timetuple())
+
+def write_snapshot(path, rows, chunk_size=10000):
+    """
+    Write a snapshot of votes to ``path`` from an iterable of ``(id,
+    content_type_id, object_id, user_id, vote, created)`` rows, as
+    yielded by ``Vote.objects.iter_votes``, and return the number of
+    votes written.
+
+    Each column is spooled to a temporary file while rows are read, so
+    memory use stays flat. The snapshot is written under a temporary
+    name and renamed into place, so processes which have the previous
+    snapshot at ``path`` mapped keep reading it undisturbed.
+    """
+    spools = [tempfile.TemporaryFile() for column in COLUMNS]
+    count = 0
+    try:
+        chunk = []
+        for row in rows:
+            chunk.append(row[1:5] + (_timestamp(row[5]),))
+            if len(chunk) >= chunk_size:
+                _spool(spools, chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            _spool(spools, chunk)
+            count += len(chunk)
+
+        offset = _align(HEADER.size + COLUMN_HEADER.size * len(COLUMNS))
+        layout = []
+        for name, dtype, format in COLUMNS:
+            layout.append((name, dtype, offset))
+            offset = _align(offset + count * struct.calcsize('<' + format))
+
+        partial = '%s.tmp%d' % (path, os.getpid())
+        output = open(partial, 'wb')
+        try:
+            output.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS), count))
+            for name, dtype, column_offset in layout:
+                output.write(COLUMN_HEADER.pack(name, dtype, column_offset))
+            for spool, (name, dtype, column_offset) in zip(spools, layout):
+                output.write('\0' * (column_offset - output.tell()))
+                spool.seek(0)
+                shutil.copyfileobj(spool, output)
+        finally:
+            output.close()
+        os.rename(partial, path)
+    finally:
+        for spool in spools:
+            spool.close()
+    return count
+
+def _spool(spools, chunk):
+    for spool, values, (name, dtype, format) in zip(spools, zip(*chunk),
+                                                    COLUMNS):
+        spool.write(struct.pack('<%d%s' % (len(values), format), *values))
+
+def export_snapshot(path, content_type_ids=None, since=None, until=None,
+                    chunk_size=10000, using=None):
+    """
+    Write a snapshot of the votes on the given content types, or all
+    votes, first cast from ``since`` until ``until``.
+    """
+    from voting.models import Vote
+    rows = Vote.objects.db_manager(using).iter_votes(
+        content_type_ids=content_type_ids, since=since, until=until,
+        chunk_size=chunk_size)
+    return write_snapshot(path, rows, chunk_size)
+
+class Snapshot(object):
+    """
+    A memory-mapped vote snapshot, with a read-only NumPy array for
+    each column: ``content_type_id``, ``object_id``, ``user_id``,
+    ``vote`` and ``created``, which holds ``datetime64[s]`` values.
+    """
+    def __init__(self, path):
+        _check_dependencies()
+        self.path = path
+        self._map = numpy.memmap(path, dtype=numpy.uint8, mode='r')
+        header = self._map[:HEADER.size].tostring()
+        if len(header) < HEADER.size:
+            raise ValueError('%s is not a vote snapshot.' % path)
+        magic, version, num_columns, count = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError('%s is not a vote snapshot.' % path)
+        if version != VERSION:
+            raise ValueError('%s has unsupported snapshot version %d.'
+                             % (path, version))
+        self.count = count
+        for index in range(num_columns):
+            start = HEADER.size + index * COLUMN_HEADER.size
+            name, dtype, offset = COLUMN_HEADER.unpack(
+                self._map[start:start + COLUMN_HEADER.size].tostring())
+            dtype = numpy.dtype(dtype.rstrip('\0'))
+            column = self._map[offset:offset + count * dtype.itemsize]
+            setattr(self, name.rstrip('\0'), column.view(dtype))
+        self.created = self.created.view('<M8[s]')
+
+    def __len__(self):
+        return self.count
+
+def load_snapshot(path):
+    """
+    Memory-map the vote snapshot at ``path`` as a ``Snapshot``.
+    """
+    return Snapshot(path)
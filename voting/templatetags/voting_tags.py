@@ -1,8 +1,8 @@
 from django import template
 from django.utils.html import escape
-from django.contrib.contenttypes.models import ContentType
 from django.core.urlresolvers import reverse
 
+from voting import registry
 from voting.models import Vote
 
 
@@ -31,7 +31,7 @@ class VotersForObjectNode(template.Node):
     def render(self, context):
         try:
             object = template.resolve_variable(self.object, context)
-            content_type = ContentType.objects.get_for_model(object).pk
+            content_type = registry.site.get_content_type_id(object)
         except template.VariableDoesNotExist:
             return ''
         context[self.context_var] = reverse('get_voters_info', kwargs={'content_type_id': content_type, 'object_id': object.pk })
@@ -47,7 +47,7 @@ class VotersIncForObjectNode(template.Node):
     def render(self, context):
         try:
             object = template.resolve_variable(self.object, context)
-            content_type = ContentType.objects.get_for_model(object).pk
+            content_type = registry.site.get_content_type_id(object)
         except template.VariableDoesNotExist:
             return ''
         context[self.context_var] = reverse('get_voters_info_inc', kwargs={'content_type_id': content_type, 
@@ -69,6 +69,19 @@ class ScoresForObjectsNode(template.Node):
         context[self.context_var] = Vote.objects.get_scores_in_bulk(objects)
         return ''
 
+class RecentVotersForObjectsNode(template.Node):
+    def __init__(self, objects, context_var):
+        self.objects = objects
+        self.context_var = context_var
+
+    def render(self, context):
+        try:
+            objects = template.resolve_variable(self.objects, context)
+        except template.VariableDoesNotExist:
+            return ''
+        context[self.context_var] = Vote.objects.get_recent_voters_in_bulk(objects)
+        return ''
+
 class VoteByUserNode(template.Node):
     def __init__(self, user, object, context_var):
         self.user = user
@@ -184,6 +197,24 @@ def do_scores_for_objects(parser, token):
         raise template.TemplateSyntaxError("second argument to '%s' tag must be 'as'" % bits[0])
     return ScoresForObjectsNode(bits[1], bits[3])
 
+def do_recent_voters_for_objects(parser, token):
+    """
+    Retrieves the most recent upvoters of a list of objects as a
+    dictionary keyed with object ids and stores it in a context
+    variable. Each value is a list of dictionaries with ``id`` and
+    ``username`` keys, most recent first.
+
+    Example usage::
+
+        {% recent_voters_for_objects widget_list as recent_dict %}
+    """
+    bits = token.contents.split()
+    if len(bits) != 4:
+        raise template.TemplateSyntaxError("'%s' tag takes exactly three arguments" % bits[0])
+    if bits[2] != 'as':
+        raise template.TemplateSyntaxError("second argument to '%s' tag must be 'as'" % bits[0])
+    return RecentVotersForObjectsNode(bits[1], bits[3])
+
 def do_vote_by_user(parser, token):
     """
     Retrieves the ``Vote`` cast by a user on a particular object and
@@ -247,6 +278,7 @@ register.tag('score_for_object', do_score_for_object)
 register.tag('voters_for_object', do_voters_for_object)
 register.tag('voters_inc_for_object', do_voters_inc_for_object)
 register.tag('scores_for_objects', do_scores_for_objects)
+register.tag('recent_voters_for_objects', do_recent_voters_for_objects)
 register.tag('vote_by_user', do_vote_by_user)
 register.tag('votes_by_user', do_votes_by_user)
 register.tag('dict_entry_for_item', do_dict_entry_for_item)
@@ -1,3 +1,4 @@
+from django.contrib.auth.models import User
 from django.db import models
 
 class Item(models.Model):
@@ -8,3 +9,39 @@ class Item(models.Model):
 
     class Meta:
         ordering = ['name']
+
+class Photo(models.Model):
+    title = models.CharField(max_length=50)
+    user = models.ForeignKey(User, null=True)
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        ordering = ['title']
+
+class Author(models.Model):
+    name = models.CharField(max_length=50)
+    num_likes = models.IntegerField(default=0)
+    num_dislikes = models.IntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+class Post(models.Model):
+    title = models.CharField(max_length=50)
+    user = models.ForeignKey(Author)
+
+    def __str__(self):
+        return self.title
+
+class Follow(models.Model):
+    follower = models.ForeignKey(User, related_name='following_set')
+    followee = models.ForeignKey(User, related_name='follower_set')
+
+    class Meta:
+        unique_together = (('follower', 'followee'),)
+
+def get_followees(user):
+    return Follow.objects.filter(follower=user).values_list('followee',
+                                                            flat=True)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 DIRNAME = os.path.dirname(__file__)
 
@@ -19,9 +20,41 @@ DATABASE_NAME = os.path.join(DIRNAME, 'database.db')
 #DATABASE_HOST = 'localhost'
 #DATABASE_PORT = '5432'
 
+# A second alias mirroring the first stands in for a read replica.
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.%s' % DATABASE_ENGINE,
+        'NAME': DATABASE_NAME,
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.%s' % DATABASE_ENGINE,
+        'NAME': DATABASE_NAME,
+        'TEST_MIRROR': 'default',
+    },
+}
+
+# Vote versions must live in a cache shared between processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': tempfile.mkdtemp(),
+    },
+}
+
 INSTALLED_APPS = (
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'voting',
     'voting.tests',
 )
+
+VOTING_MODELS = (
+    'tests.Item',
+    'tests.Photo',
+)
+
+VOTING_PARTITIONS = (
+    'tests.Photo',
+)
+
+VOTING_FOLLOWEES = 'voting.tests.models.get_followees'
@@ -16,24 +16,35 @@ r"""
 >>> Vote.objects.get_score(i1)
 {'score': 0, 'num_votes': 0}
 >>> Vote.objects.record_vote(i1, users[0], +1)
+0
 >>> Vote.objects.get_score(i1)
 {'score': 1, 'num_votes': 1}
 >>> Vote.objects.record_vote(i1, users[0], -1)
+1
 >>> Vote.objects.get_score(i1)
 {'score': -1, 'num_votes': 1}
 >>> Vote.objects.record_vote(i1, users[0], 0)
+-1
 >>> Vote.objects.get_score(i1)
 {'score': 0, 'num_votes': 0}
 >>> for user in users:
 ...     Vote.objects.record_vote(i1, user, +1)
+0
+0
+0
+0
 >>> Vote.objects.get_score(i1)
 {'score': 4, 'num_votes': 4}
 >>> for user in users[:2]:
 ...     Vote.objects.record_vote(i1, user, 0)
+1
+1
 >>> Vote.objects.get_score(i1)
 {'score': 2, 'num_votes': 2}
 >>> for user in users[:2]:
 ...     Vote.objects.record_vote(i1, user, -1)
+0
+0
 >>> Vote.objects.get_score(i1)
 {'score': 0, 'num_votes': 4}
 
@@ -48,8 +59,11 @@ ValueError: Invalid vote (must be +1/0/-1)
 >>> i3 = Item.objects.create(name='test3')
 >>> i4 = Item.objects.create(name='test4')
 >>> Vote.objects.record_vote(i2, users[0], +1)
+0
 >>> Vote.objects.record_vote(i3, users[0], -1)
+0
 >>> Vote.objects.record_vote(i4, users[0], 0)
+0
 >>> vote = Vote.objects.get_for_user(i2, users[0])
 >>> (vote.vote, vote.is_upvote(), vote.is_downvote())
 (1, True, False)
@@ -70,12 +84,30 @@ True
 ...     Vote.objects.record_vote(i2, user, +1)
 ...     Vote.objects.record_vote(i3, user, +1)
 ...     Vote.objects.record_vote(i4, user, +1)
+0
+0
+0
+0
+0
+0
+0
+0
+0
 >>> list(Vote.objects.get_top(Item))
 [(<Item: test2>, 4), (<Item: test4>, 3), (<Item: test3>, 2)]
 >>> for user in users[1:]:
 ...     Vote.objects.record_vote(i2, user, -1)
 ...     Vote.objects.record_vote(i3, user, -1)
 ...     Vote.objects.record_vote(i4, user, -1)
+1
+1
+1
+1
+1
+1
+1
+1
+1
 >>> list(Vote.objects.get_bottom(Item))
 [(<Item: test3>, -4), (<Item: test4>, -3), (<Item: test2>, -2)]
 
@@ -83,4 +115,936 @@ True
 {1: {'score': 0, 'num_votes': 4}, 2: {'score': -2, 'num_votes': 4}, 3: {'score': -4, 'num_votes': 4}, 4: {'score': -3, 'num_votes': 3}}
 >>> Vote.objects.get_scores_in_bulk([])
 {}
+
+# Bulk retrieval by content type and object id ###############################
+
+>>> from django.contrib.contenttypes.models import ContentType
+>>> ctype_id = ContentType.objects.get_for_model(Item).id
+>>> scores = Vote.objects.get_scores_for_pairs([(ctype_id, i1.id), (ctype_id, i4.id), (ctype_id, 99)])
+>>> [(pair[1], scores[pair]['score'], scores[pair]['num_votes']) for pair in sorted(scores)]
+[(1, 0, 4), (4, -3, 3), (99, 0, 0)]
+>>> votes = Vote.objects.get_for_user_for_pairs([(ctype_id, i1.id), (ctype_id, i4.id)], users[1])
+>>> [(pair[1], vote) for pair, vote in sorted(votes.items())]
+[(1, -1), (4, -1)]
+
+# Time windows ###############################################################
+
+>>> import datetime
+>>> from voting.models import VoteBucket
+>>> from voting.utils import now
+>>> hour_ago = now() - datetime.timedelta(hours=1)
+>>> i5 = Item.objects.create(name='test5')
+>>> for user in users[:3]:
+...     Vote.objects.record_vote(i5, user, +1)
+0
+0
+0
+>>> score = Vote.objects.get_score(i5, since=hour_ago)
+>>> score['score'], score['num_votes']
+(3, 3)
+>>> Vote.objects.get_score(i5, until=hour_ago)['num_votes']
+0
+>>> Vote.objects.record_vote(i5, users[0], -1)
+1
+>>> Vote.objects.record_vote(i5, users[1], 0)
+1
+>>> score = Vote.objects.get_score(i5, since=hour_ago)
+>>> score['score'], score['num_votes']
+(0, 2)
+>>> list(Vote.objects.get_top(Item, since=hour_ago))
+[]
+>>> list(Vote.objects.get_bottom(Item, since=hour_ago))
+[(<Item: test3>, -4), (<Item: test4>, -3), (<Item: test2>, -2)]
+>>> scores = Vote.objects.get_scores_in_bulk([i1, i5], since=hour_ago)
+>>> [(id, scores[id]['num_votes']) for id in sorted(scores)]
+[(1, 4), (5, 2)]
+
+>>> day = datetime.datetime(2012, 1, 10)
+>>> VoteBucket.objects.record_deltas({
+...     (ctype_id, i5.id, day - datetime.timedelta(days=3)): (2, 2),
+...     (ctype_id, i5.id, day + datetime.timedelta(hours=5)): (-1, 1),
+... })
+>>> Vote.objects.get_score(i5, since=day - datetime.timedelta(days=4), until=day)['score']
+2
+>>> Vote.objects.get_score(i5, since=day, until=day + datetime.timedelta(hours=5))['score']
+0
+>>> Vote.objects.get_score(i5, since=day + datetime.timedelta(minutes=30), until=day + datetime.timedelta(days=1))['score']
+-1
+>>> VoteBucket.objects.window(day - datetime.timedelta(days=4), day + datetime.timedelta(days=1)).filter(object_id=i5.id).values_list('period', flat=True)
+[u'd', u'd']
+
+>>> from django.core.management import call_command
+>>> call_command('rebuild_vote_buckets', 'tests.Item')
+Rebuilt buckets from 17 votes.
+>>> score = Vote.objects.get_score(i5, since=hour_ago)
+>>> score['score'], score['num_votes']
+(0, 2)
+>>> Vote.objects.get_score(i5, until=day)['num_votes']
+0
+
+Buckets are rebuilt a range of objects at a time.
+
+>>> call_command('rebuild_vote_buckets', chunk_size=2)
+Rebuilt buckets from 17 votes.
+>>> score = Vote.objects.get_score(i5, since=hour_ago)
+>>> score['score'], score['num_votes']
+(0, 2)
+
+# Bulk writes and streaming ##################################################
+
+>>> i6 = Item.objects.create(name='test6')
+>>> Vote.objects.record_votes_in_bulk([
+...     (ctype_id, i6.id, users[0].id, +1),
+...     (ctype_id, i6.id, users[1].id, -1),
+...     (ctype_id, i6.id, users[1].id, +1),
+...     (ctype_id, i5.id, users[2].id, 0),
+...     (ctype_id, i6.id, users[2].id, 0),
+... ])
+[(0, 1), (0, -1), (-1, 1), (1, 0), (0, 0)]
+>>> score = Vote.objects.get_score(i6)
+>>> score['score'], score['num_votes']
+(2, 2)
+>>> score = Vote.objects.get_score(i6, since=hour_ago)
+>>> score['score'], score['num_votes']
+(2, 2)
+>>> Vote.objects.get_score(i5)['num_votes']
+1
+>>> Vote.objects.record_votes_in_bulk([(ctype_id, i6.id, users[0].id, 2)])
+Traceback (most recent call last):
+    ...
+ValueError: Invalid vote (must be +1/0/-1)
+
+Only votes which change are written; votes re-sent with the same value
+and other votes of the same users and objects keep their ``updated``.
+
+>>> def stamps():
+...     return dict(((v.object_id, v.user_id), (v.vote, v.updated)) for v in Vote.objects.filter(content_type__pk=ctype_id, object_id__in=[i5.id, i6.id]))
+>>> before = stamps()
+>>> Vote.objects.record_votes_in_bulk([(ctype_id, i6.id, users[0].id, +1), (ctype_id, i5.id, users[0].id, +1), (ctype_id, i5.id, users[1].id, 0)])
+[(1, 1), (-1, 1), (0, 0)]
+>>> after = stamps()
+>>> [key == (i5.id, users[0].id) for key in after if after[key] != before[key]]
+[True]
+>>> Vote.objects.record_vote(i5, users[0], -1)
+1
+
+>>> rows = list(Vote.objects.iter_votes(content_type_ids=[ctype_id], user=users[0], chunk_size=2))
+>>> [(row[2], row[4]) for row in rows]
+[(1, -1), (2, 1), (3, -1), (5, -1), (6, 1)]
+>>> [row[2] for row in Vote.objects.iter_votes(user=users[0], after_id=rows[2][0])]
+[5, 6]
+
+>>> import os, tempfile
+>>> handle, path = tempfile.mkstemp(suffix='.jsonl.gz')
+>>> call_command('export_votes', 'tests.Item', format='jsonl', output=path, gzip=True)
+>>> Vote.objects.filter(object_id=i6.id).delete()
+>>> call_command('import_votes', path, format='jsonl')
+Imported 18 votes, 2 of which changed existing data.
+>>> score = Vote.objects.get_score(i6)
+>>> score['score'], score['num_votes']
+(2, 2)
+>>> os.close(handle); os.remove(path)
+
+# Cleanup of votes on deleted objects ########################################
+
+>>> from voting.cleanup import find_orphaned_votes, purge_votes_on_delete
+>>> from voting.models import ArchivedVote
+>>> i7 = Item.objects.create(name='test7')
+>>> for user in users:
+...     Vote.objects.record_vote(i7, user, +1)
+0
+0
+0
+0
+>>> i7_id = i7.id
+>>> Item.objects.filter(id=i7_id).delete()
+>>> len(find_orphaned_votes(Item))
+4
+>>> call_command('cleanup_votes', dry_run=True)
+tests.Item: 4 orphaned votes
+tests.Photo: 0 orphaned votes
+4 orphaned votes found.
+>>> call_command('cleanup_votes', 'tests.Item', archive=True, batch_size=3)
+tests.Item: 4 orphaned votes
+4 orphaned votes archived.
+>>> Vote.objects.filter(object_id=i7_id).count(), ArchivedVote.objects.filter(object_id=i7_id).count()
+(0, 4)
+>>> VoteBucket.objects.filter(object_id=i7_id).count()
+0
+
+>>> Vote.objects.record_vote(i6, users[3], -1)
+0
+>>> purge_votes_on_delete(Item, i6)
+>>> Vote.objects.filter(object_id=i6.id).count()
+0
+
+# Read replica routing #######################################################
+
+>>> from django.conf import settings
+>>> from voting import replicas
+>>> Vote.objects.reader().db
+'default'
+>>> settings.VOTING_READ_DATABASE = 'replica'
+>>> Vote.objects.reader().db, Vote.objects.writer().db
+('replica', 'default')
+>>> Vote.objects.record_vote(i1, users[3], +1)
+1
+>>> Vote.objects.reader(users[3]).db, Vote.objects.reader(users[2]).db
+('default', 'replica')
+>>> replicas.set_current_user(users[3])
+>>> Vote.objects.reader().db
+'default'
+>>> replicas.clear_current_user()
+
+Without the middleware, the thread which recorded a vote only reads
+from the primary until the user's stickiness runs out.
+
+>>> import time
+>>> settings.VOTING_STICKY_SECONDS = 1
+>>> Vote.objects.record_vote(i1, users[3], +1)
+1
+>>> Vote.objects.reader().db
+'default'
+>>> time.sleep(1.1)
+>>> Vote.objects.reader().db
+'replica'
+>>> del settings.VOTING_STICKY_SECONDS
+
+The middleware only looks the user up for requests carrying the cookie
+set by a request which voted.
+
+>>> from django.http import HttpResponse
+>>> from django.test.client import RequestFactory
+>>> from django.utils.functional import SimpleLazyObject
+>>> from voting.middleware import VotingReplicaMiddleware
+>>> middleware = VotingReplicaMiddleware()
+>>> request = RequestFactory().get('/')
+>>> request.user = SimpleLazyObject(lambda: 1 / 0)
+>>> middleware.process_request(request)
+>>> Vote.objects.reader().db
+'replica'
+>>> Vote.objects.record_vote(i1, users[2], +1)
+1
+>>> Vote.objects.reader().db
+'default'
+>>> response = middleware.process_response(request, HttpResponse())
+>>> response.cookies[replicas.PINNED_COOKIE].value, Vote.objects.reader().db
+('1', 'replica')
+>>> request.COOKIES[replicas.PINNED_COOKIE] = '1'
+>>> request.user = users[2]
+>>> middleware.process_request(request)
+>>> Vote.objects.reader().db
+'default'
+>>> response = middleware.process_response(request, HttpResponse())
+>>> del settings.VOTING_READ_DATABASE
+
+# Plugins ####################################################################
+
+>>> import sys
+>>> import voting.views
+>>> [name for name in ('mezzanine', 'actstream', 'imagestore', 'userProfile', 'follow') if name in sys.modules]
+[]
+>>> from voting import plugins
+>>> plugins.get_plugins()
+[]
+
+# Write-behind buffering #####################################################
+
+>>> from voting import buffer
+>>> settings.VOTING_WRITE_BEHIND = True
+>>> i8 = Item.objects.create(name='test8')
+>>> for user in users[:3]:
+...     Vote.objects.record_vote(i8, user, -1)
+0
+0
+0
+>>> Vote.objects.record_vote(i8, users[0], 0)
+-1
+>>> VoteBucket.objects.filter(object_id=i8.id).count()
+0
+>>> len(buffer.get_buffer())
+2
+>>> score = Vote.objects.get_score(i8, since=hour_ago)
+>>> score['score'], score['num_votes']
+(-2, 2)
+>>> Vote.objects.get_scores_in_bulk([i8], since=hour_ago)[i8.id]['score']
+-2
+>>> list(Vote.objects.get_bottom(Item, limit=4, since=hour_ago))
+[(<Item: test3>, -4), (<Item: test4>, -3), (<Item: test2>, -2), (<Item: test8>, -2)]
+>>> buffer.get_buffer().flush()
+2
+>>> score = Vote.objects.get_score(i8, since=hour_ago)
+>>> score['score'], score['num_votes']
+(-2, 2)
+>>> del settings.VOTING_WRITE_BEHIND
+
+Changes being flushed stay pending until their transaction commits,
+and are put back if it fails.
+
+>>> from django.db import DatabaseError
+>>> from voting.managers import VoteBucketManager
+>>> seen = []
+>>> def failing_apply(self, deltas):
+...     seen.append(pending_buffer.pending(ctype_id))
+...     raise DatabaseError('failed')
+>>> apply_bucket_deltas = VoteBucketManager.apply_bucket_deltas
+>>> VoteBucketManager.apply_bucket_deltas = failing_apply
+>>> pending_buffer = buffer.DeltaBuffer(interval=3600)
+>>> pending_buffer.add({(ctype_id, i8.id, 'd', None): (1, 1)})
+>>> pending_buffer.flush()
+Traceback (most recent call last):
+    ...
+DatabaseError: failed
+>>> seen == [pending_buffer.pending(ctype_id)] == [{(ctype_id, i8.id, 'd', None): (1, 1)}]
+True
+>>> VoteBucketManager.apply_bucket_deltas = apply_bucket_deltas
+>>> pending_buffer._deltas.clear()
+>>> pending_buffer.close()
+
+A full buffer is flushed by its background thread, rather than in the
+transaction of the vote which filled it.
+
+>>> import threading
+>>> flushed, done = [], threading.Event()
+>>> def fake_flush():
+...     flushed.append(threading.current_thread())
+...     done.set()
+>>> full_buffer = buffer.DeltaBuffer(interval=3600, size=1)
+>>> full_buffer.flush = fake_flush
+>>> full_buffer.add({(ctype_id, i8.id, 'd', None): (1, 1)})
+>>> done.wait(5)
+True
+>>> len(flushed), flushed[0] is threading.current_thread()
+(1, False)
+
+# Registry ###################################################################
+
+>>> from voting import registry
+>>> registry.site.get_model(ctype_id)
+<class 'voting.tests.models.Item'>
+>>> registry.site.is_registered(i1), registry.site.is_registered(users[0])
+(True, False)
+>>> user_ctype_id = ContentType.objects.get_for_model(User).id
+>>> registry.site.get_content_type_id(users[0])
+Traceback (most recent call last):
+    ...
+NotRegistered: The model User is not registered for voting.
+>>> Vote.objects.record_vote(users[1], users[0], +1)
+Traceback (most recent call last):
+    ...
+NotRegistered: The model User is not registered for voting.
+>>> settings.VOTING_ALLOW_UNREGISTERED = True
+>>> registry.site.get_content_type_id(users[0]) == user_ctype_id
+True
+>>> del settings.VOTING_ALLOW_UNREGISTERED
+>>> registry.site.resolve(user_ctype_id)
+Traceback (most recent call last):
+    ...
+NotRegistered: Content type ... is not registered for voting.
+>>> registry.site.register(Item)
+Traceback (most recent call last):
+    ...
+AlreadyRegistered: The model Item is already registered for voting.
+
+>>> from voting.utils import parse_object_pairs
+>>> parse_object_pairs('3:1, 3:2,3:1,')
+[(3, 1), (3, 2)]
+>>> parse_object_pairs('3:1,3:2', limit=1)
+Traceback (most recent call last):
+    ...
+ValueError: Too many items (maximum is 1)
+>>> parse_object_pairs('3:1,3:2,junk', limit=2)
+Traceback (most recent call last):
+    ...
+ValueError: Too many items (maximum is 2)
+>>> parse_object_pairs('3:1,3:2,, ', limit=2)
+[(3, 1), (3, 2)]
+
+# Recent voters ##############################################################
+
+>>> i9 = Item.objects.create(name='test9')
+>>> for user in users[:3]:
+...     Vote.objects.record_vote(i9, user, +1)
+0
+0
+0
+>>> def recent(obj):
+...     print ' '.join([voter['username'] for voter in Vote.objects.get_recent_voters_in_bulk([obj])[obj.id]])
+>>> recent(i9)
+u3 u2 u1
+>>> Vote.objects.record_vote(i9, users[3], +1)
+0
+>>> recent(i9)
+u4 u3 u2
+
+Previews are stored with the sequence number they are current for,
+and are rebuilt once it has moved on.
+
+>>> from django.core.cache import cache
+>>> key = 'voting:recent:%s:%s' % (ctype_id, i9.id)
+>>> version, preview = cache.get(key)
+>>> cache.set(key, (version, [(0, 'stale')]))
+>>> recent(i9)
+stale
+>>> cache.set(key, (version - 1, [(0, 'stale')]))
+>>> recent(i9)
+u4 u3 u2
+
+Recording a vote updates a current preview in place, unless it removes
+an upvoter from a full preview.
+
+>>> Vote.objects.record_vote(i9, users[3], -1)
+1
+>>> cache.get(key)[0] == version
+True
+>>> recent(i9)
+u3 u2 u1
+>>> Vote.objects.record_vote(i9, users[3], +1)
+-1
+>>> cache.get(key) == (version + 2, [(users[3].id, u'u4'), (users[2].id, u'u3'), (users[1].id, u'u2')])
+True
+>>> Vote.objects.record_vote(i9, users[3], -1)
+1
+>>> recent(i9)
+u3 u2 u1
+>>> Vote.objects.record_vote(i9, users[1], 0)
+1
+>>> recent(i9)
+u3 u1
+>>> Vote.objects.record_vote(i9, users[1], +1)
+0
+>>> recent(i9)
+u2 u3 u1
+>>> Vote.objects.get_recent_voters_in_bulk([i9, i1])[i1.id]
+[...]
+>>> from django.template import Context, Template
+>>> Template('{% load voting_tags %}{% recent_voters_for_objects items as recent %}{% dict_entry_for_item item from recent as voters %}{% for voter in voters %}{{ voter.username }} {% endfor %}').render(Context({'items': [i9], 'item': i9}))
+u'u2 u3 u1 '
+
+# Objects voted on by a user #################################################
+
+>>> fan = User.objects.create_user('fan', 'fan@test.com', 'test')
+>>> x1, x2, x3 = [Item.objects.create(name=name) for name in ('x1', 'x2', 'x3')]
+>>> for item, vote in ((x3, +1), (x2, -1), (x1, +1), (i1, +1)):
+...     Vote.objects.record_vote(item, fan, vote)
+0
+0
+0
+0
+>>> x1.delete()
+>>> page = Vote.objects.get_objects_voted_by(fan, limit=2, Model=Item)
+>>> [v.object for v in page]
+[<Item: test1>]
+>>> [v.object for v in Vote.objects.get_objects_voted_by(fan, before=(page[-1].created, page[-1].id), Model=Item)]
+[<Item: x3>]
+>>> [(v.object, v.vote) for v in Vote.objects.get_objects_voted_by(fan, vote=None, Model=Item)]
+[(<Item: test1>, 1), (<Item: x2>, -1), (<Item: x3>, 1)]
+
+Without a Model, the pages of every vote table are merged.
+
+>>> from voting.tests.models import Photo
+>>> fan_photo = Photo.objects.create(title='fan photo')
+>>> Vote.objects.record_vote(fan_photo, fan, +1)
+0
+>>> page = Vote.objects.get_objects_voted_by(fan, limit=2)
+>>> [v.object for v in page]
+[<Photo: fan photo>, <Item: test1>]
+>>> [v.object for v in Vote.objects.get_objects_voted_by(fan, before=(page[-1].created, page[-1].id))]
+[<Item: x3>]
+>>> Vote.objects.record_vote(fan_photo, fan, 0)
+1
+>>> fan_photo.delete()
+
+# Bulk vote view #############################################################
+
+>>> from django.test.client import RequestFactory
+>>> from django.utils import simplejson
+>>> from voting.views import xmlhttprequest_votes_in_bulk
+>>> y1, y2 = Item.objects.create(name='y1'), Item.objects.create(name='y2')
+>>> def bulk_vote(votes, user=users[0]):
+...     request = RequestFactory().post('/', {'votes': votes})
+...     request.user = user
+...     return simplejson.loads(xmlhttprequest_votes_in_bulk(request).content)
+>>> Vote.objects.record_vote(y2, users[1], +1)
+0
+>>> response = bulk_vote('%(c)s:%(y1)s:up,%(c)s:%(y2)s:down,%(c)s:999999:up,%(c)s:%(y1)s:clear,%(c)s:%(y1)s:up' % {'c': ctype_id, 'y1': y1.id, 'y2': y2.id})
+>>> [(r['success'], r.get('vote'), r.get('changed')) for r in response['results']]
+[(True, 1, True), (True, -1, True), (False, None, None), (True, 0, True), (True, 1, True)]
+>>> sorted(response['scores'].values())
+[[0, 2], [1, 1]]
+>>> Vote.objects.get_for_user(y2, users[0]).vote
+-1
+>>> bulk_vote('%s:%s:sideways' % (ctype_id, y1.id))['success']
+False
+>>> from voting.views import MAX_BULK_OBJECTS
+>>> bulk_vote(','.join(['%s:%s:up' % (ctype_id, y1.id)] * (MAX_BULK_OBJECTS + 1)))['success']
+False
+>>> user_ctype_id = ContentType.objects.get_for_model(User).id
+>>> bulk_vote('%s:%s:up' % (user_ctype_id, users[1].id))['error_message']
+u'Content type ... is not registered for voting.'
+
+# Bulk scores view ###########################################################
+
+Last-Modified is left out while the newest vote is from the current
+second, as a vote later in that second wouldn't change it.
+
+>>> import time
+>>> from voting.views import xmlhttprequest_scores_in_bulk
+>>> def bulk_scores(**headers):
+...     request = RequestFactory().get('/', {'objects': '%s:%s' % (ctype_id, y1.id)}, **headers)
+...     request.user = users[0]
+...     return xmlhttprequest_scores_in_bulk(request)
+>>> Vote.objects.record_vote(y1, users[1], +1)
+0
+>>> response = bulk_scores()
+>>> response.status_code, response.has_header('ETag'), response.has_header('Last-Modified')
+(200, True, False)
+>>> bulk_scores(HTTP_IF_NONE_MATCH=response['ETag']).status_code
+304
+>>> cache.set('voting:version:%s:%s' % (ctype_id, y1.id), time.time() - 10)
+>>> response = bulk_scores()
+>>> response.has_header('Last-Modified')
+True
+>>> bulk_scores(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code
+304
+>>> Vote.objects.record_vote(y1, users[1], 0)
+1
+>>> bulk_scores(HTTP_IF_MODIFIED_SINCE=response['Last-Modified'], HTTP_IF_NONE_MATCH=response['ETag']).status_code
+200
+
+Versions kept in a per-process cache would miss other processes' votes.
+
+>>> from django.core.cache import get_cache
+>>> from voting import utils
+>>> shared_cache, utils.cache = utils.cache, get_cache('django.core.cache.backends.locmem.LocMemCache')
+>>> bulk_scores()
+Traceback (most recent call last):
+    ...
+ImproperlyConfigured: Conditional GET of vote scores requires a cache backend shared between processes, not LocMemCache.
+>>> utils.cache = shared_cache
+
+# Partitions #################################################################
+
+Votes on photos are kept in a table of their own.
+
+>>> from voting.models import PARTITION_MODELS
+>>> from voting.tests.models import Photo
+>>> PhotoVote = PARTITION_MODELS['tests.Photo']
+>>> PhotoVote._meta.db_table
+'votes_tests_photo'
+>>> p1, p2 = Photo.objects.create(title='p1'), Photo.objects.create(title='p2')
+>>> photo_ctype_id = ContentType.objects.get_for_model(Photo).id
+>>> Vote.objects.for_content_type(photo_ctype_id).model is PhotoVote
+True
+>>> Vote.objects.record_vote(p1, users[0], +1)
+0
+>>> Vote.objects.record_vote(p1, users[1], +1)
+0
+>>> Vote.objects.record_votes_in_bulk([(photo_ctype_id, p2.id, users[0].id, -1), (ctype_id, i1.id, users[0].id, 0), (photo_ctype_id, p1.id, users[1].id, -1)])
+[(0, -1), (-1, 0), (1, -1)]
+>>> Vote.objects.filter(content_type__pk=photo_ctype_id).count(), PhotoVote.objects.count()
+(0, 3)
+>>> score = Vote.objects.get_score(p1)
+>>> score['score'], score['num_votes']
+(0, 2)
+>>> Vote.objects.get_scores_in_bulk([p1, p2])[p2.id]['score']
+-1
+>>> list(Vote.objects.get_top(Photo)), list(Vote.objects.get_bottom(Photo))
+([], [(<Photo: p2>, -1)])
+>>> Vote.objects.get_for_user(p2, users[0]).vote
+-1
+>>> sorted(Vote.objects.get_for_user_in_bulk([p1, p2], users[0]))
+[1, 2]
+>>> Vote.objects.get_scores_for_pairs([(photo_ctype_id, p1.id)])[(photo_ctype_id, p1.id)]['num_votes']
+2
+>>> [row[2:5] for row in Vote.objects.iter_votes(content_type_ids=[photo_ctype_id])]
+[(1, 1, 1), (1, 2, -1), (2, 1, -1)]
+>>> [(v.object, v.vote) for v in Vote.objects.get_objects_voted_by(users[0], vote=None, Model=Photo)]
+[(<Photo: p2>, -1), (<Photo: p1>, 1)]
+
+Votes can be moved between tables with the partition_votes command.
+
+>>> call_command('partition_votes', reverse=True)
+tests.Photo: 3 votes moved from votes_tests_photo to votes
+>>> Vote.objects.filter(content_type__pk=photo_ctype_id).count(), PhotoVote.objects.count()
+(3, 0)
+>>> call_command('partition_votes', 'tests.Photo', batch_size=2)
+tests.Photo: 3 votes moved from votes to votes_tests_photo
+>>> Vote.objects.get_score(p1)['num_votes']
+2
+
+Votes cast on a partitioned model before its votes are moved are
+merged, keeping the more recent vote.
+
+>>> call_command('partition_votes', reverse=True)
+tests.Photo: 3 votes moved from votes_tests_photo to votes
+>>> Vote.objects.record_vote(p1, users[0], -1)
+0
+>>> call_command('partition_votes', 'tests.Photo')
+tests.Photo: 3 votes moved from votes to votes_tests_photo
+>>> PhotoVote.objects.filter(object_id=p1.id).values_list('user', 'vote').order_by('user')
+[(1, -1), (2, -1)]
+>>> from django.db.models import Sum
+>>> VoteBucket.objects.filter(content_type__pk=photo_ctype_id, object_id=p1.id, period='d').aggregate(Sum('score'), Sum('num_votes'))
+{'score__sum': -2, 'num_votes__sum': 2}
+>>> Vote.objects.record_vote(p1, users[0], +1)
+-1
+
+# Admin ######################################################################
+
+>>> from voting.admin import EstimatedCountPaginator
+>>> EstimatedCountPaginator(Vote.objects.all(), 10).count == Vote.objects.count()
+True
+
+# Followed voters ############################################################
+
+>>> from voting.tests.models import Follow
+>>> viewer = User.objects.create_user('viewer', '', 'test')
+>>> for user in users[:3]:
+...     _ = Follow.objects.create(follower=viewer, followee=user)
+>>> page = [i1, i2, i9]
+>>> followed = Vote.objects.get_followed_voters_in_bulk(page, viewer)
+>>> [(followed[item.id]['count'], sorted([v['username'] for v in followed[item.id]['voters']])) for item in page]
+[(1, [u'u3']), (1, [u'u1']), (3, [u'u1', u'u2', u'u3'])]
+>>> followed = Vote.objects.get_followed_voters_in_bulk(page, viewer, limit=1)
+>>> followed[i9.id]['count'], len(followed[i9.id]['voters'])
+(3, 1)
+
+Followee ids can be cached instead of joined in SQL.
+
+>>> settings.VOTING_FOLLOWEES_CACHE_TIMEOUT = 60
+>>> from voting import following
+>>> following.get_followees(viewer) == frozenset([u.id for u in users[:3]])
+True
+>>> Vote.objects.get_followed_voters_in_bulk(page, viewer)[i9.id]['count']
+3
+>>> following.clear_followees(viewer)
+>>> del settings.VOTING_FOLLOWEES_CACHE_TIMEOUT
+>>> Vote.objects.get_followed_voters_in_bulk(page, viewer, followees=set())[i1.id]
+{'count': 0, 'voters': []}
+
+# Counter audits #############################################################
+
+>>> from voting import audit
+>>> from voting.tests.models import Author, Post
+>>> registry.site.register(Post)
+>>> ann, bob = Author.objects.create(name='ann'), Author.objects.create(name='bob')
+>>> post_a, post_b = Post.objects.create(title='a', user=ann), Post.objects.create(title='b', user=bob)
+>>> for user in users[:3]:
+...     Vote.objects.record_vote(post_a, user, +1)
+0
+0
+0
+>>> Vote.objects.record_vote(post_b, users[0], -1)
+0
+>>> Vote.objects.record_vote(post_b, users[1], +1)
+0
+>>> Author.objects.filter(pk=bob.pk).update(num_likes=1, num_dislikes=1)
+1
+>>> [(model, field.name) for model, field in audit.get_counted_models()[Author]]
+[(<class 'voting.tests.models.Post'>, 'user')]
+>>> list(audit.iter_counter_diffs(Author, chunk_size=1))
+[(1, 1, [(1, 0, 3, 0, 0)]), (2, 1, [])]
+>>> call_command('audit_vote_counters', chunk_size=1, repair=True)
+tests.Author 1: likes 0 -> 3, dislikes 0 -> 0
+tests.Author: 2 checked, 1 differ, 1 repaired
+>>> Author.objects.values_list('num_likes', 'num_dislikes').order_by('pk')
+[(3, 0), (1, 1)]
+
+Counters kept by the plugin then stay in step with the votes, as votes
+are changed and cleared.
+
+>>> from voting.plugins import counters
+>>> counters.vote_changed(users[0], post_b, +1, Vote.objects.record_vote(post_b, users[0], +1))
+>>> counters.vote_changed(users[1], post_b, 0, Vote.objects.record_vote(post_b, users[1], 0))
+>>> counters.vote_changed(users[2], post_a, -1, Vote.objects.record_vote(post_a, users[2], -1))
+>>> Author.objects.values_list('num_likes', 'num_dislikes').order_by('pk')
+[(2, 1), (1, 0)]
+>>> call_command('audit_vote_counters')
+tests.Author: 2 checked, 0 differ
+
+Audits resume from a checkpoint.
+
+>>> import json, os, tempfile
+>>> checkpoint = os.path.join(tempfile.mkdtemp(), 'audit.json')
+>>> json.dump({'tests.Author': ann.pk}, open(checkpoint, 'w'))
+>>> Author.objects.filter(pk=ann.pk).update(num_likes=0)
+1
+>>> call_command('audit_vote_counters', checkpoint=checkpoint)
+tests.Author: 1 checked, 0 differ
+>>> os.path.exists(checkpoint)
+False
+>>> registry.site.unregister(Post)
+
+# Unique voters ##############################################################
+
+HyperLogLog sketches count distinct values within their error bounds,
+and merge to count the union of what was added to each.
+
+>>> from voting import analytics
+>>> first, second = analytics.HyperLogLog(), analytics.HyperLogLog()
+>>> first.update(xrange(20000))
+>>> second.update(xrange(10000, 40000))
+>>> abs(first.count() - 20000) < 20000 * 0.05
+True
+>>> first.merge(second)
+>>> abs(first.count() - 40000) < 40000 * 0.05
+True
+>>> analytics.HyperLogLog.from_bytes(first.to_bytes()).count() == first.count()
+True
+>>> len(first.to_text()) < 8000
+True
+>>> sketch = analytics.HyperLogLog()
+>>> sketch.count()
+0
+>>> sketch.update([1, 2, 3, 3, 2, 1])
+>>> sketch.count()
+3
+>>> sketch.merge(analytics.HyperLogLog(precision=10))
+Traceback (most recent call last):
+    ...
+ValueError: Cannot merge sketches of different precision.
+
+Sketches per content type and per author are built from the votes
+cast or changed each day.
+
+>>> p3 = Photo.objects.create(title='p3', user=users[3])
+>>> p4 = Photo.objects.create(title='p4', user=users[3])
+>>> Vote.objects.record_vote(p3, users[0], +1)
+0
+>>> Vote.objects.record_vote(p4, users[0], -1)
+0
+>>> Vote.objects.record_votes_in_bulk([(photo_ctype_id, p3.id, users[1].id, +1), (photo_ctype_id, p1.id, users[2].id, +1)])
+[(0, 1), (0, 1)]
+>>> from voting.models import VoterSketch
+>>> VoterSketch.objects.count()
+0
+>>> call_command('build_voter_sketches', verbosity=0)
+>>> today = now().date()
+>>> tomorrow = today + datetime.timedelta(days=1)
+>>> analytics.count_voters(Photo, today, tomorrow)
+3
+>>> analytics.build_sketches(today, tomorrow, chunk_size=2) == VoterSketch.objects.count()
+True
+>>> analytics.count_voters(Photo, today, tomorrow)
+3
+>>> analytics.count_author_voters(users[3], today, tomorrow)
+2
+>>> analytics.count_author_voters(users[3], tomorrow)
+0
+>>> analytics.voter_series(Photo, today - datetime.timedelta(days=7), tomorrow, days=7)
+[(datetime.date(...), 0), (datetime.date(...), 3)]
+"""
+
+from voting import ranking, recommend, snapshot
+
+__test__ = {}
+
+if ranking.numpy is not None:
+    __test__['ranking'] = r"""
+>>> import datetime
+>>> from django.contrib.auth.models import User
+>>> from django.core.management import call_command
+>>> from voting.models import Vote, VoteRanking
+>>> from voting.tests.models import Item
+
+>>> [round(bound, 4) for bound in ranking.wilson_lower_bound([0, 1, 10, 100], [0, 0, 0, 10])]
+[0.0, 0.2065, 0.7225, 0.8407]
+>>> at = datetime.datetime(2012, 1, 2)
+>>> first_votes = ranking._datetime64([datetime.datetime(2012, 1, 2), '2012-01-01 22:00:00'])
+>>> scores = ranking.compute_rankings([3, 3], [1, 1], first_votes, at, gravity=1)
+>>> scores['score'].tolist(), scores['ratio'].tolist(), scores['decayed'].tolist()
+([2, 2], [0.75, 0.75], [1.0, 0.5])
+
+>>> voters = [User.objects.create_user('r%d' % i, '', 'test') for i in range(4)]
+>>> popular, mixed, cleared = [Item.objects.create(name=name) for name in ('popular', 'mixed', 'cleared')]
+>>> for voter in voters:
+...     Vote.objects.record_vote(popular, voter, +1)
+...     Vote.objects.record_vote(mixed, voter, voter.username in ('r0', 'r1') and +1 or -1)
+0
+0
+0
+0
+0
+0
+0
+0
+>>> Vote.objects.record_vote(cleared, voters[0], +1)
+0
+>>> call_command('rank_votes', 'tests.Item', chunk_size=2, batch_size=1, verbosity=0)
+>>> Vote.objects.record_vote(cleared, voters[0], 0)
+1
+>>> ranking.rerank(Item, chunk_size=2) >= 2
+True
+>>> rankings = VoteRanking.objects.filter(object_id__in=[popular.id, mixed.id, cleared.id])
+>>> sorted([(r.object_id == popular.id, r.num_up, r.num_down, r.score, r.ratio) for r in rankings])
+[(False, 2, 2, 0, 0.5), (True, 4, 0, 4, 1.0)]
+>>> ranked = [item for item, wilson in VoteRanking.objects.get_ranked(Item, limit=100)]
+>>> ranked.index(popular) < ranked.index(mixed)
+True
+>>> list(VoteRanking.objects.get_ranked(Item, by='hotness'))
+Traceback (most recent call last):
+    ...
+ValueError: Unknown ranking 'hotness'; expected one of score, ratio, wilson, decayed.
+"""
+
+if recommend.numpy is not None and recommend.sparse is not None:
+    __test__['also_liked'] = r"""
+>>> import datetime, shutil, tempfile
+>>> from django.conf import settings
+>>> from django.contrib.auth.models import User
+>>> from voting.models import AlsoLiked, Vote
+>>> from voting.tests.models import Item
+
+>>> a, b, c = [Item.objects.create(name=name) for name in ('a', 'b', 'c')]
+>>> fans = [User.objects.create_user(name, '', 'test') for name in ('f1', 'f2', 'f3')]
+>>> Vote.objects.record_vote(a, fans[0], +1)
+0
+>>> Vote.objects.record_vote(b, fans[0], +1)
+0
+>>> for item in (a, b, c):
+...     Vote.objects.record_vote(item, fans[1], +1)
+0
+0
+0
+>>> Vote.objects.record_vote(c, fans[2], -1)
+0
+>>> settings.VOTING_ALSO_LIKED_DIR = tempfile.mkdtemp()
+>>> index = recommend.AlsoLikedIndex(Item, k=2)
+>>> index.build() >= 3
+True
+>>> list(AlsoLiked.objects.get_also_liked(a))
+[(<Item: b>, 2), (<Item: c>, 1)]
+>>> list(AlsoLiked.objects.get_also_liked(c, limit=1))
+[(<Item: a>, 1)]
+
+Incremental updates only reindex the objects whose co-occurrences changed.
+
+>>> Vote.objects.record_vote(b, fans[2], +1)
+0
+>>> Vote.objects.record_vote(a, User.objects.create_user('f4', '', 'test'), +1)
+0
+>>> index.update()
+0
+>>> d = Item.objects.create(name='d')
+>>> Vote.objects.record_vote(d, fans[2], +1)
+0
+>>> index.update()
+2
+>>> list(AlsoLiked.objects.get_also_liked(d))
+[(<Item: b>, 1)]
+>>> list(AlsoLiked.objects.get_also_liked(b))
+[(<Item: a>, 2), (<Item: c>, 1)]
+>>> c.delete()
+>>> list(AlsoLiked.objects.get_also_liked(b))
+[(<Item: a>, 2)]
+
+Changed votes are found by their ``updated`` time, so a downvote turned
+into an upvote is counted.
+
+>>> e = Item.objects.create(name='e')
+>>> f5 = User.objects.create_user('f5', '', 'test')
+>>> Vote.objects.record_vote(e, f5, -1)
+0
+>>> Vote.objects.record_vote(b, f5, +1)
+0
+>>> index.update()
+0
+>>> Vote.objects.record_vote(e, f5, +1)
+-1
+>>> index.update()
+2
+>>> list(AlsoLiked.objects.get_also_liked(e))
+[(<Item: b>, 1)]
+>>> Vote.objects.record_vote(e, f5, -1)
+1
+>>> index.update()
+2
+>>> list(AlsoLiked.objects.get_also_liked(e))
+[]
+>>> index.update(max_age=datetime.timedelta(0)) >= 4
+True
+>>> shutil.rmtree(settings.VOTING_ALSO_LIKED_DIR)
+>>> del settings.VOTING_ALSO_LIKED_DIR
+"""
+
+if snapshot.numpy is not None:
+    __test__['snapshot'] = r"""
+>>> import os, tempfile
+>>> from django.core.management import call_command
+>>> from voting.models import Vote
+
+>>> path = os.path.join(tempfile.mkdtemp(), 'votes.snap')
+>>> call_command('snapshot_votes', output=path, verbosity=0)
+>>> votes = snapshot.load_snapshot(path)
+>>> rows = list(Vote.objects.iter_votes())
+>>> len(votes) == len(rows) > 0
+True
+>>> zip(votes.content_type_id, votes.object_id, votes.user_id, votes.vote) == [row[1:5] for row in rows]
+True
+>>> votes.created.dtype, votes.created[0] == snapshot.numpy.datetime64(rows[0][5].replace(microsecond=0))
+(dtype('<M8[s]'), True)
+>>> votes.vote.flags.writeable
+False
+>>> int((votes.vote == 1).sum()) == len([row for row in rows if row[4] == 1])
+True
+>>> snapshot.write_snapshot(path, []), len(snapshot.load_snapshot(path))
+(0, 0)
+>>> snapshot.load_snapshot(__file__)
+Traceback (most recent call last):
+    ...
+ValueError: ... is not a vote snapshot.
+>>> os.remove(path)
+"""
+
+__test__['upgrade'] = r"""
+>>> import datetime
+>>> from django.core.management import call_command
+>>> from django.db import connection, transaction
+>>> from voting import schema
+>>> from voting.models import Vote
+
+Composite indexes are created along with the tables.
+
+>>> from voting.models import VoteRanking
+>>> schema.get_missing_indexes(Vote), schema.get_missing_indexes(VoteRanking)
+([], [])
+>>> [name for name, statement in schema.get_index_sql(VoteRanking)]
+['vote_rankings_content_type_id_score', 'vote_rankings_content_type_id_wilson', 'vote_rankings_content_type_id_decayed']
+
+Vote tables from before votes were timestamped are upgraded in place.
+
+>>> from django.core.management.color import no_style
+>>> def execute(*statements):
+...     cursor = connection.cursor()
+...     for statement in statements:
+...         cursor.execute(statement)
+...     transaction.commit_unless_managed()
+>>> execute('CREATE TABLE votes_current AS SELECT * FROM votes', 'DROP TABLE votes',
+...         'CREATE TABLE votes (id integer NOT NULL PRIMARY KEY, user_id integer NOT NULL, content_type_id integer NOT NULL, object_id integer unsigned NOT NULL, vote smallint NOT NULL)',
+...         'INSERT INTO votes SELECT id, user_id, content_type_id, object_id, vote FROM votes_current ORDER BY id LIMIT 3')
+>>> schema.get_missing_columns(Vote)
+['created', 'updated']
+>>> add, fill, finish = schema.get_upgrade_sql(Vote, ['created'])
+>>> add, fill
+(['ALTER TABLE "votes" ADD COLUMN "created" datetime NULL'], ['UPDATE "votes" SET "created" = %s WHERE "created" IS NULL'])
+>>> at = datetime.datetime(2012, 1, 1)
+>>> schema.upgrade_votes(Vote, at, batch_size=2)
+['created', 'updated']
+>>> schema.get_missing_columns(Vote)
+[]
+>>> set(Vote.objects.values_list('created', 'updated')) == set([(at, at)])
+True
+>>> Vote.objects.count()
+3
+>>> call_command('upgrade_votes')
+votes: added votes_content_type_id_object_id
+votes_tests_photo: up to date
+vote_rankings: up to date
+>>> call_command('upgrade_votes', verbosity=0)
+>>> execute('DROP TABLE votes', *(connection.creation.sql_create_model(Vote, no_style())[0] +
+...         connection.creation.sql_indexes_for_model(Vote, no_style())))
+>>> execute('INSERT INTO votes SELECT * FROM votes_current', 'DROP TABLE votes_current')
+>>> schema.create_indexes(Vote)
+['votes_content_type_id_object_id']
 """
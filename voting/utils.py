@@ -0,0 +1,117 @@
+import datetime
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from django.utils.timezone import now
+except ImportError:
+    now = datetime.datetime.now
+
+VERSION_KEY = 'voting:version:%s:%s'
+
+def _version_key(content_type_id, object_id):
+    return VERSION_KEY % (content_type_id, object_id)
+
+def bump_vote_version(content_type_id, object_id):
+    """
+    Mark the votes on the given object as changed, invalidating any
+    conditional GET validators which were computed from its version.
+    """
+    cache.set(_version_key(content_type_id, object_id), time.time())
+
+def check_version_cache():
+    """
+    Raise ``ImproperlyConfigured`` if the cache backend isn't shared
+    between processes, as validators computed from vote versions would
+    then miss the votes recorded by other processes.
+    """
+    from django.core.cache.backends.dummy import DummyCache
+    from django.core.cache.backends.locmem import LocMemCache
+    if isinstance(cache, (DummyCache, LocMemCache)):
+        raise ImproperlyConfigured(
+            'Conditional GET of vote scores requires a cache backend '
+            'shared between processes, not %s.' % cache.__class__.__name__)
+
+def get_vote_versions(pairs):
+    """
+    Get a dictionary mapping ``(content_type_id, object_id)`` pairs to
+    the time their votes last changed, as a UNIX timestamp.
+
+    Objects which have no recorded version are stamped with the
+    current time, so the first request for them is never answered with
+    a stale validator. Versions are read with one ``get_many`` and
+    stamped with one ``set_many``.
+    """
+    keys = dict([(_version_key(*pair), pair) for pair in pairs])
+    found = cache.get_many(keys.keys())
+    now = time.time()
+    # Overwriting a version bumped meanwhile is harmless: the stamp is a
+    # value no earlier validator was computed from.
+    missing = dict([(key, now) for key in keys if key not in found])
+    if missing:
+        cache.set_many(missing)
+        found.update(missing)
+    return dict([(pair, found[key]) for key, pair in keys.items()])
+
+def split_items(value, limit=None):
+    """
+    Split a comma separated list into its non-empty items, stripped of
+    whitespace.
+
+    Raises ``ValueError`` if more than ``limit`` items are given. The
+    string is split at most ``limit`` times, so the limit is checked
+    before any item is parsed and long lists cost no more than
+    ``limit`` items.
+    """
+    if limit is None:
+        bits = value.split(',')
+    else:
+        bits = value.split(',', limit)
+        if len(bits) > limit:
+            # The rest of the string, after ``limit`` items.
+            if bits.pop().strip(' ,'):
+                raise ValueError('Too many items (maximum is %d)' % limit)
+    return [bit.strip() for bit in bits if bit.strip()]
+
+def parse_object_pairs(value, limit=None):
+    """
+    Parse a comma separated list of ``content_type_id:object_id``
+    strings into a list of integer pairs, preserving order and
+    dropping duplicates.
+
+    Raises ``ValueError`` if any item is malformed or more than
+    ``limit`` items are given, as checked by ``split_items``.
+    """
+    pairs = []
+    seen = set()
+    for bit in split_items(value, limit):
+        content_type_id, object_id = bit.split(':')
+        pair = (int(content_type_id), int(object_id))
+        if pair not in seen:
+            seen.add(pair)
+            pairs.append(pair)
+    return pairs
+
+def floor_hour(value):
+    """
+    Truncate a datetime to the start of its hour.
+    """
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def floor_day(value):
+    """
+    Truncate a datetime to the start of its day.
+    """
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def ceil_day(value):
+    """
+    Round a datetime up to the start of the next day, unless it already
+    falls on a day boundary.
+    """
+    day = floor_day(value)
+    if day < value:
+        day += datetime.timedelta(days=1)
+    return day
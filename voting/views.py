@@ -1,31 +1,32 @@
-from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
 from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.contrib.auth.views import redirect_to_login
 from django.template import loader, RequestContext
 from django.template.loader import render_to_string
 from django.utils import simplejson
-from django.contrib.comments.models import Comment
 from django.utils.translation import ugettext_lazy as _
 from django.shortcuts import render_to_response, get_object_or_404
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.core.urlresolvers import reverse
+from django.views.decorators.http import condition
 
-from mezzanine.generic.models import ThreadedComment, Review
-from mezzanine.blog.models import BlogPost
-
+from voting import plugins, registry
 from voting.models import Vote
-from actstream import action, actions
-from actstream.models import Action
-from imagestore.models import Album, Image
-from userProfile.models import GenericWish, BroadcastWish, BroadcastDeal
-from follow.models import Follow
+from voting.utils import check_version_cache, get_vote_versions, \
+    parse_object_pairs, split_items
 
+import datetime
+import hashlib
 import json
+import time
 
 VOTE_DIRECTIONS = (('up', 1), ('down', -1), ('clear', 0))
 
+# Maximum number of objects which may be requested from
+# ``xmlhttprequest_scores_in_bulk`` at once.
+MAX_BULK_OBJECTS = getattr(settings, 'VOTING_MAX_BULK_OBJECTS', 100)
+
 def vote_on_object(request, model, direction, post_vote_redirect=None,
         object_id=None, slug=None, slug_field=None, template_name=None,
         template_loader=loader, extra_context=None, context_processors=None,
@@ -146,6 +147,10 @@ def xmlhttprequest_vote_on_object(request, model, direction,
     if not request.user.is_authenticated():
         return json_error_response('Not authenticated.')
 
+    if not registry.site.is_registered(model):
+        return json_error_response(
+            'Voting is not enabled for %s.' % model._meta.verbose_name)
+
     try:
         vote = dict(VOTE_DIRECTIONS)[direction]
     except KeyError:
@@ -175,165 +180,217 @@ def xmlhttprequest_vote_on_object(request, model, direction,
             'score': Vote.objects.get_score(obj),
         }))
     else:
-        preVote = Vote.objects.get_score(obj)
-        Vote.objects.record_vote(obj, request.user, vote)
-        postVote = Vote.objects.get_score(obj)
-        if preVote != postVote:
-            if vote==1:
-                if model.__name__=='Album':
-                    action.send(request.user, verb=settings.ALBUM_LIKE_WISH, target=obj, batch_time_minutes=30, is_batchable=True)
-                if model.__name__=='ThreadedComment' and isinstance(Comment.objects.get(id=obj.id).content_object, Review):
-                    action.send(request.user, verb=settings.REVIEW_COMMENT_LIKE_VERB, action_object=obj, target=Comment.objects.get(id=obj.id).content_object, batch_time_minutes=30, is_batchable=True)
-                if model.__name__=='Review' and isinstance(Comment.objects.get(id=obj.id).content_object, BlogPost):
-                    action.send(request.user, verb=settings.REVIEW_LIKE_VERB, target=obj,  batch_time_minutes=30, is_batchable=True)
-                if model.__name__=='Image':
-                    action.send(request.user, verb=settings.PHOTO_LIKE_VERB, target=obj, batch_time_minutes=30, is_batchable=True)
-                if model.__name__=='BroadcastWish':
-                    action.send(request.user, verb=settings.WISH_LIKE_VERB, target=obj, batch_time_minutes=30, is_batchable=True)
-                    actions.follow(request.user, obj, send_action=False, actor_only=False)
-                    Follow.objects.get_or_create(request.user, obj) 
-                if model.__name__=='BroadcastDeal':
-                    action.send(request.user, verb=settings.DEAL_LIKE_VERB, target=obj, batch_time_minutes=30, is_batchable=True)
-                    actions.follow(request.user, obj, send_action=False, actor_only=False)
-                    Follow.objects.get_or_create(request.user, obj) 
-                if model.__name__=='GenericWish':
-                    action.send(request.user, verb=settings.POST_LIKE_VERB, target=obj, batch_time_minutes=30, is_batchable=True)
-                    actions.follow(request.user, obj, send_action=False, actor_only=False)
-                    Follow.objects.get_or_create(request.user, obj)                    
-                if model.__name__ == "ThreadedComment" and isinstance(Comment.objects.get(id=obj.id).content_object, Album):
-                    action.send(request.user, verb=settings.ALBUM_COMMENT_LIKE_VERB, action_object=obj, target=Comment.objects.get(id=obj.id).content_object, batch_time_minutes=30, is_batchable=True)
-                if model.__name__ == "ThreadedComment" and isinstance(Comment.objects.get(id=obj.id).content_object, Image):
-                    action.send(request.user, verb=settings.IMAGE_COMMENT_LIKE_VERB, action_object=obj, target=Comment.objects.get(id=obj.id).content_object, batch_time_minutes=30, is_batchable=True)
-                if model.__name__ == "ThreadedComment" and type(Comment.objects.get(id=obj.id).content_object) == GenericWish:
-                    action.send(request.user, verb=settings.POST_COMMENT_LIKE_VERB, action_object=obj, target=Comment.objects.get(id=obj.id).content_object, batch_time_minutes=30, is_batchable=True) 
-                if model.__name__ == "ThreadedComment" and type(Comment.objects.get(id=obj.id).content_object) == BroadcastWish:
-                    contentObject = Comment.objects.get(id=obj.id).content_object
-                    action.send(request.user, verb=settings.WISH_COMMENT_LIKE_VERB, action_object=obj, target=contentObject, batch_time_minutes=30, is_batchable=True)
-                    actions.follow(request.user, contentObject, send_action=False, actor_only=False) 
-                    Follow.objects.get_or_create(request.user, contentObject)
-                if model.__name__ == "ThreadedComment" and type(Comment.objects.get(id=obj.id).content_object) == BroadcastDeal:
-                    contentObject = Comment.objects.get(id=obj.id).content_object
-                    action.send(request.user, verb=settings.DEAL_COMMENT_LIKE_VERB, action_object=obj, target=contentObject, batch_time_minutes=30, is_batchable=True)
-                    actions.follow(request.user, contentObject, send_action=False, actor_only=False) 
-                    Follow.objects.get_or_create(request.user, contentObject)                
-
-                if obj.user and obj.user.is_authenticated():
-                    obj.user.num_likes = obj.user.num_likes + 1
-                    obj.user.save()
-            elif vote==-1 or vote==0:
-                if model.__name__=='Album':
-                    #action.send(request.user, verb=_('disliked the album'), target=obj)
-                    ctype = ContentType.objects.get_for_model(request.user)
-                    target_content_type = ContentType.objects.get_for_model(obj)
-                    Action.objects.all().filter(actor_content_type=ctype, actor_object_id=request.user.id, verb=settings.ALBUM_LIKE_WISH, target_content_type=target_content_type, target_object_id = obj.id ).delete() 
-                if model.__name__=='ThreadedComment' and isinstance(Comment.objects.get(id=obj.id).content_object, Review):
-                    #action.send(request.user, verb=_('disliked the comment on the review'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)   
-                    target = Comment.objects.get(id=obj.id).content_object
-                    ctype = ContentType.objects.get_for_model(request.user)
-                    target_content_type = ContentType.objects.get_for_model(target)
-                    action_object_content_type = ContentType.objects.get_for_model(obj)
-                    Action.objects.all().filter(actor_content_type=ctype, actor_object_id=request.user.id, verb=settings.REVIEW_COMMENT_LIKE_VERB, action_object_content_type=action_object_content_type, action_object_object_id=obj.id, target_content_type=target_content_type, target_object_id = target.id ).delete()
-                if model.__name__=='Review':
-                    #action.send(request.user, verb=_('disliked the review on'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)  
-                    ctype = ContentType.objects.get_for_model(request.user)
-                    target_content_type = ContentType.objects.get_for_model(obj)
-                    Action.objects.all().filter(actor_content_type=ctype, actor_object_id=request.user.id, verb=settings.REVIEW_LIKE_VERB, target_content_type=target_content_type, target_object_id = obj.id ).delete()                 
-                if model.__name__=='Image':
-                    #action.send(request.user, verb=_('disliked the photo'), target=obj)
-                    ctype = ContentType.objects.get_for_model(request.user)
-                    target_content_type = ContentType.objects.get_for_model(obj)
-                    Action.objects.all().filter(actor_content_type=ctype, actor_object_id=request.user.id, verb=settings.PHOTO_LIKE_VERB, target_content_type=target_content_type, target_object_id = obj.id ).delete() 
-                if model.__name__=='BroadcastWish':
-                    #action.send(request.user, verb=_('disliked the photo'), target=obj)
-                    ctype = ContentType.objects.get_for_model(request.user)
-                    target_content_type = ContentType.objects.get_for_model(obj)
-                    Action.objects.all().filter(actor_content_type=ctype, actor_object_id=request.user.id, verb=settings.WISH_LIKE_VERB, target_content_type=target_content_type, target_object_id = obj.id ).delete() 
-                    actions.unfollow(request.user, obj, send_action=False)
-                    follow = Follow.objects.get_follows(obj).filter(user=request.user)
-                    if follow:
-                        follow.delete()                
-                if model.__name__=='BroadcastDeal':
-                    #action.send(request.user, verb=_('disliked the photo'), target=obj)
-                    ctype = ContentType.objects.get_for_model(request.user)
-                    target_content_type = ContentType.objects.get_for_model(obj)
-                    Action.objects.all().filter(actor_content_type=ctype, actor_object_id=request.user.id, verb=settings.DEAL_LIKE_VERB, target_content_type=target_content_type, target_object_id = obj.id ).delete()                     
-                    actions.unfollow(request.user, obj, send_action=False)
-                    follow = Follow.objects.get_follows(obj).filter(user=request.user)
-                    if follow:
-                        follow.delete()                
-                if model.__name__=='GenericWish':
-                    ctype = ContentType.objects.get_for_model(request.user)
-                    target_content_type = ContentType.objects.get_for_model(obj)
-                    Action.objects.all().filter(actor_content_type=ctype, actor_object_id=request.user.id, verb=settings.POST_LIKE_VERB, target_content_type=target_content_type, target_object_id = obj.id ).delete()                     
-                    
-                    actions.unfollow(request.user, obj, send_action=False)
-                    follow = Follow.objects.get_follows(obj).filter(user=request.user)
-                    if follow:
-                        follow.delete()
-
-                if model.__name__ == "ThreadedComment" and isinstance(Comment.objects.get(id=obj.id).content_object, Album):
-                    #action.send(request.user, verb=_('disliked the comment on the album'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)
-                    target = Comment.objects.get(id=obj.id).content_object
-                    ctype = ContentType.objects.get_for_model(request.user)
-                    target_content_type = ContentType.objects.get_for_model(target)
-                    action_object_content_type = ContentType.objects.get_for_model(obj)
-                    Action.objects.all().filter(actor_content_type=ctype, actor_object_id=request.user.id, verb=settings.ALBUM_COMMENT_LIKE_VERB, action_object_content_type=action_object_content_type, action_object_object_id=obj.id, target_content_type=target_content_type, target_object_id = target.id ).delete()                 
-                if model.__name__ == "ThreadedComment" and isinstance(Comment.objects.get(id=obj.id).content_object, Image):
-                    #action.send(request.user, verb=_('disliked the comment on the image'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)
-                    target = Comment.objects.get(id=obj.id).content_object
-                    ctype = ContentType.objects.get_for_model(request.user)
-                    target_content_type = ContentType.objects.get_for_model(target)
-                    action_object_content_type = ContentType.objects.get_for_model(obj)
-                    Action.objects.all().filter(actor_content_type=ctype, actor_object_id=request.user.id, verb=settings.IMAGE_COMMENT_LIKE_VERB, action_object_content_type=action_object_content_type, action_object_object_id=obj.id, target_content_type=target_content_type, target_object_id = target.id ).delete()                 
-                if model.__name__ == "ThreadedComment" and type(Comment.objects.get(id=obj.id).content_object) ==  GenericWish:
-                    #action.send(request.user, verb=_('disliked the comment on the image'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)
-                    target = Comment.objects.get(id=obj.id).content_object
-                    ctype = ContentType.objects.get_for_model(request.user)
-                    target_content_type = ContentType.objects.get_for_model(target)
-                    action_object_content_type = ContentType.objects.get_for_model(obj)
-                    Action.objects.all().filter(actor_content_type=ctype, actor_object_id=request.user.id, verb=settings.POST_COMMENT_LIKE_VERB, action_object_content_type=action_object_content_type, action_object_object_id=obj.id, target_content_type=target_content_type, target_object_id = target.id ).delete() 
-                    actions.unfollow(request.user, target, send_action=False)
-                    follow = Follow.objects.get_follows(target).filter(user=request.user)
-                    if follow:
-                        follow.delete()                
-                if model.__name__ == "ThreadedComment" and type(Comment.objects.get(id=obj.id).content_object) == BroadcastWish:
-                    #action.send(request.user, verb=_('disliked the comment on the image'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)
-                    target = Comment.objects.get(id=obj.id).content_object
-                    ctype = ContentType.objects.get_for_model(request.user)
-                    target_content_type = ContentType.objects.get_for_model(target)
-                    action_object_content_type = ContentType.objects.get_for_model(obj)
-                    Action.objects.all().filter(actor_content_type=ctype, actor_object_id=request.user.id, verb=settings.WISH_COMMENT_LIKE_VERB, action_object_content_type=action_object_content_type, action_object_object_id=obj.id, target_content_type=target_content_type, target_object_id = target.id ).delete() 
-                    actions.unfollow(request.user, target, send_action=False)
-                    follow = Follow.objects.get_follows(target).filter(user=request.user)
-                    if follow:
-                        follow.delete() 
-                if model.__name__ == "ThreadedComment" and type(Comment.objects.get(id=obj.id).content_object) == BroadcastDeal:
-                    #action.send(request.user, verb=_('disliked the comment on the image'), action_object=obj, target=Comment.objects.get(id=obj.id).content_object)
-                    target = Comment.objects.get(id=obj.id).content_object
-                    ctype = ContentType.objects.get_for_model(request.user)
-                    target_content_type = ContentType.objects.get_for_model(target)
-                    action_object_content_type = ContentType.objects.get_for_model(obj)
-                    Action.objects.all().filter(actor_content_type=ctype, actor_object_id=request.user.id, verb=settings.DEAL_COMMENT_LIKE_VERB, action_object_content_type=action_object_content_type, action_object_object_id=obj.id, target_content_type=target_content_type, target_object_id = target.id ).delete() 
-                    follow = Follow.objects.get_follows(target).filter(user=request.user)
-                    if follow:
-                        follow.delete() 
-
-                if obj.user and obj.user.is_authenticated() and vote==-1: 
-                    obj.user.num_dislikes = obj.user.num_dislikes + 1 
-                    obj.user.save()
-                if vote==0:
-                    if obj.user and obj.user.is_authenticated():
-                        obj.user.num_likes = obj.user.num_likes - 1
-                        obj.user.save() 
+        old_vote = Vote.objects.record_vote(obj, request.user, vote)
+        if old_vote != vote:
+            plugins.vote_changed(request.user, obj, vote, old_vote)
 
         return HttpResponse(simplejson.dumps({
             'success': True,
             'score': Vote.objects.get_score(obj),
         }))
 
+def _bulk_pairs(request):
+    """
+    Parse and memoize the ``objects`` parameter of a bulk score
+    request, returning ``None`` if it is malformed.
+    """
+    if not hasattr(request, '_voting_pairs'):
+        try:
+            request._voting_pairs = parse_object_pairs(
+                request.GET.get('objects', ''), MAX_BULK_OBJECTS)
+        except ValueError:
+            request._voting_pairs = None
+    return request._voting_pairs
+
+def _bulk_versions(request):
+    if not hasattr(request, '_voting_versions'):
+        check_version_cache()
+        request._voting_versions = get_vote_versions(_bulk_pairs(request) or [])
+    return request._voting_versions
+
+def _bulk_scores_etag(request):
+    pairs = _bulk_pairs(request)
+    if pairs is None:
+        return None
+    versions = _bulk_versions(request)
+    key = '%s|%s' % (request.user.id, ','.join(
+        ['%s:%s:%r' % (c, o, versions[(c, o)]) for c, o in pairs]))
+    return hashlib.md5(key).hexdigest()
+
+def _bulk_scores_last_modified(request):
+    versions = _bulk_versions(request)
+    if not versions:
+        return None
+    newest = max(versions.values())
+    # Last-Modified has one-second resolution, so votes later in the
+    # same second would go unnoticed; leave it to the ETag until then.
+    if int(newest) >= int(time.time()):
+        return None
+    return datetime.datetime.utcfromtimestamp(newest)
+
+@condition(etag_func=_bulk_scores_etag,
+           last_modified_func=_bulk_scores_last_modified)
+def xmlhttprequest_scores_in_bulk(request):
+    """
+    Retrieves scores for a page of objects, along with the requesting
+    user's votes on them, for use via XMLHttpRequest.
+
+    Objects are given as an ``objects`` GET parameter holding a comma
+    separated list of ``content_type_id:object_id`` items. Responses
+    carry an ``ETag`` derived from the objects' vote versions, and a
+    ``Last-Modified`` header once the newest version is over a second
+    old, so unchanged pages may be answered with ``304 Not Modified``.
+
+    Properties of the resulting JSON object:
+        success
+            ``true`` if the request was successfully processed,
+            ``false`` otherwise.
+        scores
+            Maps each ``"content_type_id:object_id"`` key to a
+            ``[score, num_votes]`` array.
+        votes
+            Maps keys to the user's vote (``1`` or ``-1``), for the
+            objects the user has voted on.
+        error_message
+            Contains an error message if the request was not
+            successfully processed.
+    """
+    pairs = _bulk_pairs(request)
+    if pairs is None:
+        return json_error_response('\'objects\' must be a list of at most '
+                                   '%d content_type_id:object_id items.'
+                                   % MAX_BULK_OBJECTS)
+    for content_type_id, object_id in pairs:
+        try:
+            registry.site.get_model(content_type_id)
+        except registry.NotRegistered, e:
+            return json_error_response(str(e))
+    scores = Vote.objects.get_scores_for_pairs(pairs)
+    votes = Vote.objects.get_for_user_for_pairs(pairs, request.user)
+    return HttpResponse(simplejson.dumps({
+        'success': True,
+        'scores': dict([('%s:%s' % pair, [score['score'], score['num_votes']])
+                        for pair, score in scores.items()]),
+        'votes': dict([('%s:%s' % pair, vote)
+                       for pair, vote in votes.items()]),
+    }, separators=(',', ':')), mimetype='application/json')
+
+def _parse_vote_items(value):
+    """
+    Parse a comma separated list of
+    ``content_type_id:object_id:direction`` strings into a list of
+    ``(content_type_id, object_id, vote)`` tuples, in order.
+
+    Raises ``ValueError`` if any item is malformed or more than
+    ``MAX_BULK_OBJECTS`` items are given, and ``KeyError`` if a
+    direction is unknown.
+    """
+    items = []
+    for bit in split_items(value, MAX_BULK_OBJECTS):
+        content_type_id, object_id, direction = bit.split(':')
+        items.append((int(content_type_id), int(object_id),
+                      dict(VOTE_DIRECTIONS)[direction]))
+    return items
+
+def xmlhttprequest_votes_in_bulk(request):
+    """
+    Records a batch of votes by the requesting user, for use via
+    XMLHttpRequest - for example by clients which queue votes while
+    offline.
+
+    Votes are given as a ``votes`` POST parameter holding a comma
+    separated list of ``content_type_id:object_id:direction`` items,
+    where direction is ``up``, ``down`` or ``clear``. Items are applied
+    in order, in a single transaction, and side effects run once for
+    each object whose vote changed.
+
+    Properties of the resulting JSON object:
+        success
+            ``true`` if the request was successfully processed,
+            ``false`` otherwise.
+        results
+            One object per item, in order, with ``object`` (the
+            ``"content_type_id:object_id"`` key), ``success``, and
+            either ``vote`` and ``changed`` or ``error_message``.
+        scores
+            Maps the key of each object voted on to its updated
+            ``[score, num_votes]``.
+        error_message
+            Contains an error message if the request was not
+            successfully processed.
+    """
+    if not request.user.is_authenticated():
+        return json_error_response('Not authenticated.')
+    if request.method != 'POST':
+        return json_error_response(
+            'XMLHttpRequest votes can only be made using POST.')
+    try:
+        items = _parse_vote_items(request.POST.get('votes', ''))
+    except (ValueError, KeyError):
+        return json_error_response('\'votes\' must be a list of at most %d '
+                                   'content_type_id:object_id:direction '
+                                   'items.' % MAX_BULK_OBJECTS)
+
+    # Look up the objects voted on with one query per content type.
+    object_ids_by_type = {}
+    for content_type_id, object_id, vote in items:
+        object_ids_by_type.setdefault(content_type_id, set()).add(object_id)
+    objects = {}
+    for content_type_id, object_ids in object_ids_by_type.items():
+        try:
+            model, manager = registry.site.resolve(content_type_id)
+        except registry.NotRegistered, e:
+            return json_error_response(str(e))
+        for object_id, obj in manager.in_bulk(object_ids).items():
+            objects[(content_type_id, object_id)] = obj
+
+    valid = [item for item in items if item[:2] in objects]
+    changes = Vote.objects.record_votes_in_bulk(
+        [(content_type_id, object_id, request.user.id, vote)
+         for content_type_id, object_id, vote in valid])
+
+    results, first_votes, last_votes = [], {}, {}
+    changes = iter(changes)
+    for content_type_id, object_id, vote in items:
+        pair = (content_type_id, object_id)
+        key = '%s:%s' % pair
+        if pair not in objects:
+            results.append({'object': key, 'success': False,
+                            'error_message': 'No such object.'})
+            continue
+        old_vote, new_vote = changes.next()
+        first_votes.setdefault(pair, old_vote)
+        last_votes[pair] = new_vote
+        results.append({'object': key, 'success': True, 'vote': new_vote,
+                        'changed': old_vote != new_vote})
+    for pair, vote in last_votes.items():
+        if first_votes[pair] != vote:
+            plugins.vote_changed(request.user, objects[pair], vote,
+                                 first_votes[pair])
+
+    scores = Vote.objects.reader(request.user).get_scores_for_pairs(
+        last_votes.keys())
+    return HttpResponse(simplejson.dumps({
+        'success': True,
+        'results': results,
+        'scores': dict([('%s:%s' % pair, [score['score'], score['num_votes']])
+                        for pair, score in scores.items()]),
+    }, separators=(',', ':')), mimetype='application/json')
+
+def _get_votable_object_or_404(content_type_id, object_id):
+    """
+    Look up an object by content type id and primary key, raising
+    ``Http404`` without touching the database if its model is not
+    registered for voting.
+    """
+    try:
+        model, manager = registry.site.resolve(content_type_id)
+    except registry.NotRegistered:
+        raise Http404
+    return get_object_or_404(manager, pk=object_id)
+
 def get_voters_info(request, content_type_id, object_id):
-    ctype = get_object_or_404(ContentType, pk=content_type_id)
-    object = get_object_or_404(ctype.model_class(), pk=object_id)
+    object = _get_votable_object_or_404(content_type_id, object_id)
     if request.is_ajax():
         return render_to_response("friend_list_all.html", {
             "friends": Vote.objects.get_voters(object),
@@ -344,8 +401,7 @@ def get_voters_info(request, content_type_id, object_id):
         }, context_instance=RequestContext(request))
 
 def get_voters_info_inc(request, content_type_id, object_id, sIndex=0, lIndex=0):
-    ctype = get_object_or_404(ContentType, pk=content_type_id)
-    object = get_object_or_404(ctype.model_class(), pk=object_id)
+    object = _get_votable_object_or_404(content_type_id, object_id)
     
     s = (int)(""+sIndex)
     l = (int)(""+lIndex)